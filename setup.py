@@ -36,11 +36,15 @@ setup(
     name='djerba',
     version=__version__,
     scripts=[
+        'src/bin/build_provenance_index.py',
         'src/bin/djerba.py',
+        'src/bin/djerba_benchmark_perf.py',
         'src/bin/generate_ini.py',
+        'src/bin/migrate_oncokb_cache.py',
         'src/bin/mini_djerba.py',
         'src/bin/update_oncokb_cache.py',
-        'src/bin/validate_plugin_json.py'
+        'src/bin/validate_plugin_json.py',
+        'src/bin/write_provenance_subsets.py'
     ],
     packages=find_packages(where=package_root),
     package_dir={'' : package_root},
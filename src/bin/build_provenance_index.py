@@ -0,0 +1,48 @@
+#! /usr/bin/env python3
+
+"""Build an indexed store from the file provenance report, for fast lookup by donor"""
+
+import argparse
+import sys
+
+sys.path.pop(0) # do not import from script directory
+
+from djerba.util.logger import logger
+from djerba.util.provenance_store import provenance_store
+from djerba.util.validator import path_validator
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='build_provenance_index.py: Build an indexed store from the file provenance report (FPR). '+\
+        'Djerba uses the store in place of the FPR if it is current, ie. the FPR has not changed since the store was built.',
+    )
+    parser.add_argument('-d', '--debug', action='store_true', help='More verbose logging')
+    parser.add_argument('-f', '--force', action='store_true', help='Rebuild the store, even if it is current')
+    parser.add_argument('-i', '--input', metavar='PATH', required=True, help='Path to gzipped FPR input')
+    parser.add_argument('-l', '--log-path', metavar='PATH', help='Output file for log messages; defaults to STDERR')
+    parser.add_argument('-o', '--out', metavar='PATH', help='Output path for the store; defaults to ${DJERBA_PROVENANCE_INDEX} if set, otherwise ${INPUT}'+provenance_store.INDEX_SUFFIX)
+    parser.add_argument('-q', '--quiet', action='store_true', help='Logging for error messages only')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose logging')
+    return parser
+
+if __name__ == '__main__':
+    parser = get_parser()
+    if len(sys.argv) == 1:
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+    args = parser.parse_args()
+    log_level = logger.get_args_log_level(args)
+    validator = path_validator(log_level)
+    validator.validate_input_file(args.input)
+    if args.log_path:
+        validator.validate_output_file(args.log_path)
+    if args.out:
+        out_path = args.out
+    else:
+        out_path = provenance_store.get_default_index_path(args.input)
+    validator.validate_output_file(out_path)
+    store = provenance_store(out_path, log_level, args.log_path)
+    if store.is_current(args.input) and not args.force:
+        store.logger.info("Provenance index {0} is current, will not rebuild".format(out_path))
+    else:
+        store.build(args.input)
@@ -3,12 +3,14 @@
 """Main script to run Djerba and produce CGI reports"""
 
 import argparse
+import logging
 import sys
 
 sys.path.pop(0) # do not import from script directory
 from djerba.core.main import main, arg_processor, DjerbaInvalidNameError
 from djerba.version import get_djerba_version
 from djerba.util.activity import activity_tracker, DjerbaActivityTrackerError
+from djerba.util.startup_profiler import startup_profiler
 import djerba.util.constants as constants
 
 def get_parser():
@@ -22,6 +24,7 @@ def get_parser():
     parser.add_argument('-q', '--quiet', action='store_true', help='Logging for error messages only')
     parser.add_argument('-l', '--log-path', help='Output file for log messages; defaults to STDERR')
     parser.add_argument('--version', action='store_true', help='Print the version number and exit')
+    parser.add_argument('--profile-startup', action='store_true', help='Run with Python import time profiling, and print a summary to STDERR')
     subparsers = parser.add_subparsers(title='subcommands', help='sub-command help', dest='subparser_name')
     setup_parser = subparsers.add_parser(constants.SETUP, help='setup for a Djerba report')
     setup_parser.add_argument('-a', '--assay', metavar='NAME', required=True, help='Name of assay (case-insensitive)')
@@ -48,6 +51,20 @@ def get_parser():
     report_parser.add_argument('-w', '--work-dir', metavar='PATH', help='Path to workspace directory; optional, defaults to value of --out-dir')
     report_parser.add_argument('-p', '--pdf', action='store_true', help='Generate PDF output from HTML')
     report_parser.add_argument('--no-archive', action='store_true', help='Do not archive the JSON report file')
+    batch_parser = subparsers.add_parser(constants.BATCH, help='run reports for multiple INI files in one process; output HTML; optionally output PDF')
+    batch_parser.add_argument('-i', '--input', metavar='PATH', required=True, help='Directory of INI files, or manifest file with one INI path per line')
+    batch_parser.add_argument('-o', '--out-dir', metavar='DIR', required=True, help='Directory for output; each report is written to a subdirectory named for its INI file')
+    batch_parser.add_argument('-n', '--workers', metavar='INT', type=int, default=1, help='Number of reports to run concurrently; default 1')
+    batch_parser.add_argument('-p', '--pdf', action='store_true', help='Generate PDF output from HTML')
+    batch_parser.add_argument('--no-archive', action='store_true', help='Do not archive the JSON report files')
+    oncokb_cache_parser = subparsers.add_parser(constants.ONCOKB_CACHE, help='Inspect and maintain the OncoKB annotation cache')
+    cache_subparsers = oncokb_cache_parser.add_subparsers(title='actions', help='action help', dest='action')
+    check_parser = cache_subparsers.add_parser(constants.CHECK, help='report cache hit rate for inputs in report directories; optionally pre-warm the cache')
+    check_parser.add_argument('-c', '--cache-dir', metavar='DIR', required=True, help='Base directory of the OncoKB cache')
+    check_parser.add_argument('-r', '--report-dir', metavar='DIR', nargs='+', required=True, help='Report directories with MAF/CNA/fusion inputs for OncoKB annotation, as written by plugin preprocessing')
+    check_parser.add_argument('-t', '--oncotree-code', metavar='CODE', help='OncoTree code for all report directories; defaults to the code in oncokb_clinical_info.txt in each directory')
+    check_parser.add_argument('-o', '--out', metavar='PATH', help='Output path for tab-separated hit rates; defaults to STDOUT')
+    check_parser.add_argument('-p', '--prewarm', action='store_true', help='Annotate inputs not found in the cache with the OncoKB web API, and add them to the cache. Requires the ONCOKB_TOKEN environment variable.')
     update_parser = subparsers.add_parser(constants.UPDATE, help='Update an existing JSON report file; optionally render HTML/PDF')
     group = update_parser.add_mutually_exclusive_group(required=True)
     group.add_argument('-i', '--ini', metavar='PATH', help='INI config file with plugins to update')
@@ -69,6 +86,17 @@ if __name__ == '__main__':
     if args.version:
         print("Djerba core version {0}".format(get_djerba_version()))
         sys.exit(0)
+    if args.profile_startup:
+        # run again in a subprocess, with import time profiling
+        command = [__file__]
+        command.extend([x for x in sys.argv[1:] if x != '--profile-startup'])
+        profiler = startup_profiler(log_level=logging.CRITICAL)
+        result, records, other = profiler.run(command)
+        print(result.stdout, end='')
+        for line in other:
+            print(line, file=sys.stderr)
+        print(profiler.summarize(records), file=sys.stderr)
+        sys.exit(result.returncode)
     try:
         ap = arg_processor(args)
         try:
@@ -0,0 +1,113 @@
+#! /usr/bin/env python3
+
+"""Benchmark performance of Djerba components on synthetic inputs"""
+
+import argparse
+import sys
+import tempfile
+from argparse import RawTextHelpFormatter
+
+sys.path.pop(0) # do not import from script directory
+
+from djerba.util.logger import logger
+from djerba.util.validator import path_validator
+
+FUSION = 'fusion'
+LOH = 'loh'
+MAF = 'maf'
+MAKO = 'mako'
+ONCOKB_CACHE = 'oncokb-cache'
+
+def get_parser():
+    """Construct the parser for command-line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Benchmark performance of Djerba components on synthetic inputs.\n- Each subcommand writes a tab-separated table of results to STDOUT.\n- Synthetic inputs are written to, and removed from, the working directory.',
+        epilog='For details, run any subcommand with -h/--help',
+        formatter_class=RawTextHelpFormatter
+    )
+    parser.add_argument('-w', '--work-dir', metavar='PATH', help='Working directory; defaults to a temporary directory')
+    parser.add_argument('-d', '--debug', action='store_true', help='More verbose logging')
+    parser.add_argument('-l', '--log-path', metavar='PATH', help='Output file for log messages; defaults to STDERR')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode; logging errors only')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose logging')
+    subparsers = parser.add_subparsers(title='subcommands', help='sub-command help', dest='subparser_name')
+    fusion_parser = subparsers.add_parser(FUSION, help='processing of MAVIS and Arriba fusion calls', description='Benchmark processing of synthetic MAVIS and Arriba fusion calls, as in the fusion plugin; OncoKB annotation is omitted.\n- Results: MAVIS calls, fusions written, wall-clock seconds, CPU seconds, increase in peak RSS (KB), calls per second.', formatter_class=RawTextHelpFormatter)
+    fusion_parser.add_argument('-n', '--calls', metavar='INT', type=int, nargs='+', default=[10000, 100000], help='Number(s) of MAVIS calls; default 10000 and 100000')
+    fusion_parser.add_argument('-g', '--genes', metavar='INT', type=int, default=2000, help='Number of distinct gene names; default 2000')
+    loh_parser = subparsers.add_parser(LOH, help='gene-level LOH lookup in PURPLE segments', description='Benchmark lookup of minimum MACN and CN of segments overlapping each gene, as in the wgts.cnv_purple plugin.\n- Results: segments, genes, gene/segment overlaps, wall-clock seconds, CPU seconds, increase in peak RSS (KB).', formatter_class=RawTextHelpFormatter)
+    loh_parser.add_argument('-s', '--segments', metavar='INT', type=int, nargs='+', default=[1000, 10000, 100000], help='Number(s) of segments; default 1000, 10000 and 100000')
+    maf_parser = subparsers.add_parser(MAF, help='filtering of WGS MAF files', description='Benchmark filtering of synthetic WGS MAF files, as in the wgts.snv_indel plugin.\n- Results: rows, rows kept, wall-clock seconds, CPU seconds, increase in peak RSS (KB), rows per second.', formatter_class=RawTextHelpFormatter)
+    maf_parser.add_argument('-r', '--rows', metavar='INT', type=int, nargs='+', default=[100000, 1000000], help='Number(s) of MAF rows; default 100000 and 1000000')
+    maf_parser.add_argument('-c', '--columns', metavar='INT', type=int, default=130, help='Number of MAF columns; default 130')
+    mako_parser = subparsers.add_parser(MAKO, help='lookup and compilation of Mako templates', description='Benchmark lookup and compilation of the Mako templates rendered in a WGTS report: document headers and footers, and WGTS plugins and mergers.\n- Results: mode, reports, templates per report, wall-clock seconds, CPU seconds, increase in peak RSS (KB), milliseconds per report.\n- Modes: uncached (new lookup for each template), cold (first report in a process), memory (later reports in a process), module_directory (first report in a process, with compiled modules on disk).', formatter_class=RawTextHelpFormatter)
+    mako_parser.add_argument('-r', '--reports', metavar='INT', type=int, default=20, help='Number of reports for uncached and memory modes; default 20')
+    cache_parser = subparsers.add_parser(ONCOKB_CACHE, help='annotation of MAF files from the OncoKB cache', description='Benchmark annotation of synthetic MAF files from the OncoKB cache.\n- Results: rows, wall-clock seconds, CPU seconds, increase in peak RSS (KB), rows per second.', formatter_class=RawTextHelpFormatter)
+    cache_parser.add_argument('-r', '--rows', metavar='INT', type=int, nargs='+', default=[100000, 1000000], help='Number(s) of MAF rows; default 100000 and 1000000')
+    cache_parser.add_argument('-c', '--columns', metavar='INT', type=int, default=20, help='Number of MAF columns before annotation; default 20')
+    cache_parser.add_argument('-f', '--hit-fraction', metavar='FLOAT', type=float, default=0.1, help='Fraction of rows with annotations in the cache; default 0.1')
+    cache_parser.add_argument('-k', '--compare-keys', action='store_true', help='Instead of annotation, compare time to compute legacy and versioned MAF cache keys. Results: rows, columns, key scheme, wall-clock seconds, rows per second.')
+    cache_parser.add_argument('-s', '--stress-writers', metavar='INT', type=int, help='Instead of annotation, stress test concurrent cache updates with this many writer processes; --rows is the number of rows per writer. Results: writers, rows per writer, annotations expected, annotations found, wall-clock seconds.')
+    return parser
+
+def main(args):
+    log_level = logger.get_log_level(args.debug, args.verbose, args.quiet)
+    validator = path_validator(log_level)
+    if args.log_path:
+        validator.validate_output_file(args.log_path)
+    if args.work_dir:
+        validator.validate_output_dir(args.work_dir)
+        run_benchmark(args, args.work_dir, log_level)
+    else:
+        with tempfile.TemporaryDirectory(prefix='djerba_benchmark_') as work_dir:
+            run_benchmark(args, work_dir, log_level)
+
+def run_benchmark(args, work_dir, log_level):
+    # import only the benchmark which is run; some are slow to import
+    if args.subparser_name == FUSION:
+        from djerba.util.benchmark.fusion_preprocess import fusion_preprocess_benchmark
+        benchmark = fusion_preprocess_benchmark(work_dir, args.genes, log_level, args.log_path)
+        results = benchmark.run(args.calls)
+        header = benchmark.RESULT_HEADER
+    elif args.subparser_name == LOH:
+        from djerba.util.benchmark.loh_overlaps import loh_overlap_benchmark
+        benchmark = loh_overlap_benchmark(work_dir, log_level, args.log_path)
+        results = benchmark.run(args.segments)
+        header = benchmark.RESULT_HEADER
+    elif args.subparser_name == MAF:
+        from djerba.util.benchmark.maf_preprocess import maf_preprocess_benchmark
+        benchmark = maf_preprocess_benchmark(work_dir, args.columns, log_level, args.log_path)
+        results = benchmark.run(args.rows)
+        header = benchmark.RESULT_HEADER
+    elif args.subparser_name == MAKO:
+        from djerba.util.benchmark.mako_render import mako_render_benchmark
+        benchmark = mako_render_benchmark(work_dir, log_level, args.log_path)
+        results = benchmark.run(args.reports)
+        header = benchmark.RESULT_HEADER
+    elif args.subparser_name == ONCOKB_CACHE:
+        from djerba.util.benchmark.oncokb_cache import oncokb_cache_benchmark
+        benchmark = oncokb_cache_benchmark(
+            work_dir, args.columns, args.hit_fraction, log_level, args.log_path
+        )
+        if args.stress_writers:
+            results = benchmark.stress_update(args.stress_writers, args.rows)
+            header = benchmark.STRESS_RESULT_HEADER
+        elif args.compare_keys:
+            results = benchmark.compare_keys(args.rows)
+            header = benchmark.KEYS_RESULT_HEADER
+        else:
+            results = benchmark.run(args.rows)
+            header = benchmark.RESULT_HEADER
+    print("\t".join(header))
+    for result in results:
+        print("\t".join([str(x) for x in result]))
+
+if __name__ == '__main__':
+    parser = get_parser()
+    if len(sys.argv) == 1:
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+    args = parser.parse_args()
+    if args.subparser_name == None:
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+    main(args)
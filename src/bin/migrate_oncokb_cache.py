@@ -0,0 +1,57 @@
+#! /usr/bin/env python3
+
+"""Migrate legacy JSON OncoKB cache files to the indexed cache store"""
+
+import argparse
+import os
+import sys
+from argparse import RawTextHelpFormatter
+
+sys.path.pop(0) # do not import from script directory
+
+from djerba.util.logger import logger
+from djerba.util.oncokb.cache_store import oncokb_cache_store
+from djerba.util.validator import path_validator
+import djerba.util.oncokb.constants as oncokb_constants
+
+def get_parser():
+    """Construct the parser for command-line arguments"""
+    parser = argparse.ArgumentParser(
+        description='Migrate Djerba\'s JSON cache files for OncoKB data to an indexed store.\n- Searches the cache directory and its OncoTree subdirectories for JSON cache files.\n- Writes a store file {0} in each directory where JSON files are found.\n- JSON cache files are not modified.'.format(oncokb_constants.CACHE_STORE),
+        epilog='Run with -h/--help for additional information',
+        formatter_class=RawTextHelpFormatter
+    )
+    parser.add_argument('-c', '--cache-dir', metavar='PATH', help='Base directory of the OncoKB cache', required=True)
+    parser.add_argument('-f', '--force', action='store_true', help='Import JSON files into an existing store; existing annotations with the same key are replaced')
+    parser.add_argument('-d', '--debug', action='store_true', help='More verbose logging')
+    parser.add_argument('-l', '--log-path', metavar='PATH', help='Output file for log messages; defaults to STDERR')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode; logging errors only')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose logging')
+    return parser
+
+def main(args):
+    log_level = logger.get_log_level(args.debug, args.verbose, args.quiet)
+    validator = path_validator(log_level)
+    if args.log_path:
+        validator.validate_output_file(args.log_path)
+    validator.validate_output_dir(args.cache_dir)
+    json_names = set(oncokb_cache_store.JSON_FILENAMES.values())
+    for dir_path, dir_names, file_names in os.walk(args.cache_dir):
+        if json_names.isdisjoint(file_names):
+            continue
+        store_path = os.path.join(dir_path, oncokb_constants.CACHE_STORE)
+        store = oncokb_cache_store(store_path, log_level, args.log_path)
+        if store.exists() and not args.force:
+            msg = "Cache store {0} already migrated, omitting migration; ".format(store_path)+\
+                "run with --force to import JSON files anyway"
+            store.logger.warning(msg)
+        else:
+            totals = store.migrate(dir_path, args.force)
+            print("{0}\t{1}".format(store_path, totals))
+
+if __name__ == '__main__':
+    parser = get_parser()
+    if len(sys.argv) == 1:
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+    main(parser.parse_args())
@@ -8,18 +8,18 @@ from argparse import RawTextHelpFormatter
 
 sys.path.pop(0) # do not import from script directory
 
-from djerba.extract.oncokb.cache import oncokb_cache
+from djerba.util.oncokb.cache import oncokb_cache
 from djerba.util.logger import logger
 from djerba.util.validator import path_validator
 
 def get_parser():
     """Construct the parser for command-line arguments"""
     parser = argparse.ArgumentParser(
-        description='Update Djerba\'s JSON cache files for OncoKB data.\n- This script is for convenience/demonstration purposes; for production use, see the --update-cache and --apply-cache options to djerba.py.\n- This script is *not* aware of the OncoTree code, and simply writes to the given cache directory.',
+        description='Update Djerba\'s cache for OncoKB data.\n- This script is for convenience/demonstration purposes; for production use, see the --update-cache and --apply-cache options to djerba.py.\n- This script is *not* aware of the OncoTree code, and simply writes to the given cache directory.',
         epilog='Run with -h/--help for additional information',
         formatter_class=RawTextHelpFormatter
     )
-    parser.add_argument('-c', '--cache-dir', metavar='PATH', help='Directory for output of JSON cache files; should *include* the OncoTree subdirectory, if any', required=True)
+    parser.add_argument('-c', '--cache-dir', metavar='PATH', help='Directory for the OncoKB cache store; should *include* the OncoTree subdirectory, if any', required=True)
     parser.add_argument('-i', '--input-dir', metavar='PATH', help='Djerba report directory; must be created with --no-cleanup', required=True)
     parser.add_argument('-d', '--debug', action='store_true', help='More verbose logging')
     parser.add_argument('-l', '--log-path', metavar='PATH', help='Output file for log messages; defaults to STDERR')
@@ -0,0 +1,55 @@
+#! /usr/bin/env python3
+
+"""Write provenance subsets for a batch of reports, reading the file provenance report once"""
+
+import argparse
+import csv
+import sys
+
+sys.path.pop(0) # do not import from script directory
+
+from djerba.helpers.provenance_helper.helper import write_provenance_subsets
+from djerba.util.logger import logger
+from djerba.util.validator import path_validator
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description='write_provenance_subsets.py: Write the provenance subset file for '+\
+        'multiple Djerba workspaces, with a single read of the file provenance report (FPR). '+\
+        'The provenance helper will then use the subset instead of reading the FPR.',
+    )
+    parser.add_argument('-d', '--debug', action='store_true', help='More verbose logging')
+    parser.add_argument('-f', '--force', action='store_true', help='Overwrite existing subset files')
+    parser.add_argument('-i', '--input', metavar='PATH', required=True, help='Path to gzipped FPR input')
+    parser.add_argument('-l', '--log-path', metavar='PATH', help='Output file for log messages; defaults to STDERR')
+    parser.add_argument('-m', '--manifest', metavar='PATH', required=True, help='Tab-delimited file with columns: project, donor, workspace directory. Lines starting with # are ignored.')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Logging for error messages only')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Verbose logging')
+    return parser
+
+def read_manifest(manifest_path):
+    targets = []
+    with open(manifest_path) as manifest_file:
+        for row in csv.reader(manifest_file, delimiter="\t"):
+            if len(row) == 0 or row[0].startswith('#'):
+                continue
+            elif len(row) != 3:
+                msg = "Expected 3 columns in manifest {0}, found {1}".format(manifest_path, row)
+                raise ValueError(msg)
+            targets.append(tuple(row))
+    return targets
+
+if __name__ == '__main__':
+    parser = get_parser()
+    if len(sys.argv) == 1:
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+    args = parser.parse_args()
+    log_level = logger.get_args_log_level(args)
+    validator = path_validator(log_level)
+    validator.validate_input_file(args.input)
+    validator.validate_input_file(args.manifest)
+    if args.log_path:
+        validator.validate_output_file(args.log_path)
+    targets = read_manifest(args.manifest)
+    write_provenance_subsets(args.input, targets, args.force, log_level, args.log_path)
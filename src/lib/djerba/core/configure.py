@@ -390,6 +390,10 @@ class core_configurer(configurable):
         self.set_ini_default(cc.REPORT_VERSION, 1)
         self.set_ini_default(cc.INPUT_PARAMS_FILE, cc.DEFAULT_INPUT_PARAMS)
         self.set_ini_default(cc.DOCUMENT_CONFIG, cc.DEFAULT_DOCUMENT_CONFIG)
+        self.set_ini_default(cc.CONFIGURE_WORKERS, 1)
+        self.set_ini_default(cc.EXTRACT_WORKERS, 1)
+        self.set_ini_default(cc.TIMING_SUMMARY, False)
+        self.set_ini_default(cc.ONCOKB_CLIENT, False)
 
     def set_priority_defaults(self, priority):
         for key in cc.PRIORITY_KEYS:
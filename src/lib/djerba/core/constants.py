@@ -62,6 +62,11 @@ HTML_CACHE = 'html_cache'
 COMPONENT_START = 'DJERBA_COMPONENT_START'
 COMPONENT_END = 'DJERBA_COMPONENT_END'
 CORE_VERSION = 'core_version'
+EXTRACT_WORKERS = 'extract_workers'
+CONFIGURE_WORKERS = 'configure_workers'
+TIMING_SUMMARY = 'timing_summary'
+TIMINGS = 'timings'
+ONCOKB_CLIENT = 'oncokb_client'
 
 # keys for sample ID file written by provenance helper
 # TODO remove duplicate versions from provenance helper main
@@ -119,6 +124,7 @@ WHIZBAM_PATTERN_ROOT='/.mounts/labs/prod/whizbam'
 
 # component versions/URLs
 COMPONENT_FILENAME = 'component_info.json'
+TIMINGS_FILENAME = 'timings.json'
 UNDEFINED_VERSION = 'version_not_defined'
 UNDEFINED_URL = 'url_not_defined'
 VERSION_KEY = 'version'
@@ -6,7 +6,6 @@ import configparser
 import json
 import logging
 import os
-import requests
 import string
 import time
 import djerba.core.constants as cc
@@ -47,6 +46,7 @@ class database(logger):
         return args[cc.DATABASE_NAME], url
 
     def get_revision_and_url(self, report_id, url):
+        import requests # slow to import, so only import when needed
         url_with_id = posixjoin(url, report_id)
         result = requests.head(url_with_id)
         status = result.status_code
@@ -66,6 +66,7 @@ class database(logger):
         Upload the report data structure to couchdb
         Full upload URL is intentionally not logged, as it contains the DB username/password
         """
+        import requests
 
         original_report_id = report_data[cc.CORE][cc.REPORT_ID]
 
@@ -32,6 +32,10 @@ The DJERBA_PACKAGES environment variable lists allowed top-level package names
 - Top-level package names are resolved from left to right
 - Djerba attempts to import from each package name in order
 - Failure to find a named component in any top-level package raises an error
+
+Imported and validated modules are cached for all loaders in the process, by top-level
+packages, module type, and component name. So the package hierarchy is only searched
+once for each component; cache statistics include an estimate of the time saved.
 """
 
 import importlib
@@ -39,6 +43,8 @@ import inspect
 import logging
 import os
 import re
+import threading
+import time
 from abc import ABC
 from djerba.core.base import base as core_base
 from djerba.plugins.base import plugin_base
@@ -56,12 +62,30 @@ class loader_base(core_base, ABC):
     DJERBA_PACKAGES = 'DJERBA_PACKAGES'
     DJERBA_PACKAGES_DEFAULT = ['djerba', ]
 
+    # process-wide cache of validated modules, shared by all loader instances
+    # values are (module, time in seconds to import and validate)
+    _module_cache = {}
+    _cache_lock = threading.Lock()
+    _cache_stats = {'hits': 0, 'misses': 0, 'seconds_saved': 0.0}
+
     def __init__(self, log_level=logging.INFO, log_path=None):
         self.log_level = log_level
         self.log_path = log_path
         self.logger = self.get_logger(log_level, __name__, log_path)
         self.packages = self.resolve_top_packages()
 
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._module_cache.clear()
+            cls._cache_stats.update({'hits': 0, 'misses': 0, 'seconds_saved': 0.0})
+
+    @classmethod
+    def get_cache_stats(cls):
+        """Return counts of cache hits/misses, and estimated time saved by cache hits"""
+        with cls._cache_lock:
+            return dict(cls._cache_stats)
+
     def get_common_args(self, module_name, module):
         """Get the constructor args common to all component types"""
         module_dir = os.path.abspath(os.path.dirname(module.__file__))
@@ -122,6 +146,26 @@ class loader_base(core_base, ABC):
             raise DjerbaLoadError(msg)
         return module
 
+    def get_module(self, module_type, name):
+        """Import and validate a module, or get it from the cache"""
+        key = (tuple(self.packages), module_type, name)
+        with self._cache_lock:
+            cached = self._module_cache.get(key)
+            if cached:
+                self._cache_stats['hits'] += 1
+                self._cache_stats['seconds_saved'] += cached[1]
+        if cached:
+            self.logger.debug("Found {0} {1} in module cache".format(module_type, name))
+            return cached[0]
+        start = time.perf_counter()
+        module = self.import_module(module_type, name)
+        self.validate_module(module, module_type, name)
+        elapsed = time.perf_counter() - start
+        with self._cache_lock:
+            self._module_cache[key] = (module, elapsed)
+            self._cache_stats['misses'] += 1
+        return module
+
     def instantiate_main(self, module, args):
         # do some error checking and return an instance of the main class
         try:
@@ -214,18 +258,16 @@ class core_config_loader(loader_base):
 class merger_loader(loader_base):
 
     def load(self, module_name):
-        # import, validate, and make an instance of a merger
-        module = self.import_module(self.MERGER, module_name)
-        self.validate_module(module, self.MERGER, module_name)
+        # import and validate (if not cached), and make an instance of a merger
+        module = self.get_module(self.MERGER, module_name)
         args = self.get_common_args(module_name, module)
         return self.instantiate_main(module, args)
 
 class plugin_loader(loader_base):
 
     def load(self, module_name, workspace):
-        # import, validate, and make an instance of a plugin with a workspace
-        module = self.import_module(self.PLUGIN, module_name)
-        self.validate_module(module, self.PLUGIN, module_name)
+        # import and validate (if not cached), and make an instance of a plugin with a workspace
+        module = self.get_module(self.PLUGIN, module_name)
         args = self.get_common_args(module_name, module)
         args[core_constants.WORKSPACE] = workspace
         return self.instantiate_main(module, args)
@@ -233,9 +275,8 @@ class plugin_loader(loader_base):
 class helper_loader(loader_base):
 
     def load(self, module_name, workspace):
-        # import, validate, and make an instance of a helper with a workspace
-        module = self.import_module(self.HELPER, module_name)
-        self.validate_module(module, self.HELPER, module_name)
+        # import and validate (if not cached), and make an instance of a helper with a workspace
+        module = self.get_module(self.HELPER, module_name)
         args = self.get_common_args(module_name, module)
         args[core_constants.WORKSPACE] = workspace
         return self.instantiate_main(module, args)
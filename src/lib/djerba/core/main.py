@@ -4,14 +4,16 @@ Main class to:
 - Import and run plugins
 - Merge and output results
 """
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from configparser import ConfigParser
 import json
 import logging
-import pdfkit
 import os
 import re
+import sys
+import threading
+import time
 from glob import glob
-from PyPDF2 import PdfMerger
 import djerba.util.ini_fields as ini
 from djerba.core.base import base as core_base
 from djerba.core.database import database
@@ -26,6 +28,7 @@ from djerba.core.loaders import \
 from djerba.core.workspace import workspace
 from djerba.util.args import arg_processor_base
 from djerba.util.logger import logger
+from djerba.util.timing import measure, WALL_SECONDS
 from djerba.util.validator import path_validator
 from djerba.version import get_djerba_version
 import djerba.core.constants as cc
@@ -55,6 +58,22 @@ class main_base(core_base):
         self.plugin_loader = plugin_loader(self.log_level, self.log_path)
         self.merger_loader = merger_loader(self.log_level, self.log_path)
         self.helper_loader = helper_loader(self.log_level, self.log_path)
+        # component instances are reused across configure/extract/render, for a workspace
+        self.components = {}
+        self.component_reuse = 0
+        # time/memory used by each component, for each step
+        self.timings = {}
+        self.timings_lock = threading.Lock()
+
+    def _set_work_dir(self, work_dir):
+        """Change the workspace; loaders and validators are kept, eg. for batch mode"""
+        self.work_dir = work_dir
+        self.workspace = workspace(work_dir, self.log_level, self.log_path)
+        self.components = {}
+        self.component_reuse = 0
+        # timings are for the components of one report, so do not carry over to the next
+        with self.timings_lock:
+            self.timings = {}
 
     def _get_render_priority(self, plugin_data):
         return plugin_data[cc.PRIORITIES][cc.RENDER]
@@ -66,16 +85,61 @@ class main_base(core_base):
         self._validate_html_cache_input(data)
         return list(data[cc.HTML_CACHE].keys())
 
+    def _get_dependency_graph(self, depends_key, config, components, priorities):
+        """
+        Get dependencies for concurrent configure/extract, as a dictionary of sets of names
+        A component depends on all components with a lower priority, and on any components
+        in its depends_configure/depends_extract list. So components with equal priority,
+        and no declared dependency between them, may be run concurrently.
+        """
+        dependencies = {}
+        for name in priorities.keys():
+            if config.has_option(name, depends_key):
+                depends_str = config.get(name, depends_key)
+            else:
+                depends_str = components[name].get_reserved_default(depends_key)
+            depends = set(self._parse_comma_separated_list(depends_str))
+            for other in priorities.keys():
+                if priorities[other] < priorities[name]:
+                    depends.add(other)
+            dependencies[name] = depends
+        return dependencies
+
+    def _get_workers(self, workers_key, config):
+        if config.has_option(ini.CORE, workers_key):
+            workers = config.getint(ini.CORE, workers_key)
+        else:
+            workers = 1
+        if workers < 1:
+            msg = "{0} must be a positive integer; got {1}".format(workers_key, workers)
+            self.logger.error(msg)
+            raise ValueError(msg)
+        return workers
+
     def _load_component(self, name):
-        if name == ini.CORE:
-            component = self.core_config_loader.load(self.workspace)
+        if name in self.components:
+            self.component_reuse += 1
+        elif name == ini.CORE:
+            self.components[name] = self.core_config_loader.load(self.workspace)
         elif self._is_helper_name(name):
-            component = self.helper_loader.load(name, self.workspace)
+            self.components[name] = self.helper_loader.load(name, self.workspace)
         elif self._is_merger_name(name):
-            component = self.merger_loader.load(name)
+            self.components[name] = self.merger_loader.load(name)
         else:
-            component = self.plugin_loader.load(name, self.workspace)
-        return component
+            self.components[name] = self.plugin_loader.load(name, self.workspace)
+        return self.components[name]
+
+    def _log_loader_stats(self):
+        stats = self.plugin_loader.get_cache_stats()
+        msg = "Component loading: reused {0} instances; ".format(self.component_reuse)+\
+            "module cache {0} hits, {1} misses, {2:.3f}s saved".format(
+                stats['hits'], stats['misses'], stats['seconds_saved'])
+        self.logger.debug(msg)
+
+    def _record_timing(self, name, step, timing):
+        self.logger.debug("Timing for {0} {1}: {2}".format(name, step, timing))
+        with self.timings_lock:
+            self.timings.setdefault(name, {})[step] = timing
 
     def _resolve_configure_dependencies(self, config, components, ordered_names):
         self._resolve_ini_deps(cc.DEPENDS_CONFIGURE, config, components, ordered_names)
@@ -133,9 +197,82 @@ class main_base(core_base):
             self.logger.warning("No inputs found for merger: {0}".format(merger_name))
         else:
             self.logger.debug("{0} inputs found for merger: {1}".format(total, merger_name))
-        merger = self.merger_loader.load(merger_name)
+        merger = self._load_component(merger_name)
         self.logger.debug("Loaded merger {0} for rendering".format(merger_name))
-        return merger.render(merger_inputs)
+        html, timing = measure(merger.render, merger_inputs)
+        self._record_timing(merger_name, cc.RENDER, timing)
+        return html
+
+    def _run_in_dependency_order(self, ordered_names, dependencies, submit, finish=None):
+        """
+        Run concurrent tasks; each task is submitted when its dependencies have finished
+        submit(name) submits the task for the named component, and returns a Future
+        finish(name, result), if given, is called in this thread when a task has finished
+        Returns a dictionary of task results, indexed by component name
+        """
+        results = {}
+        pending = list(ordered_names)
+        running = {}
+        while len(pending) > 0 or len(running) > 0:
+            # submit in priority order, for consistent logging
+            for name in [x for x in pending if dependencies[x].issubset(results.keys())]:
+                pending.remove(name)
+                self.logger.debug('Submitting component {0}'.format(name))
+                running[submit(name)] = name
+            if len(running) == 0:
+                msg = "Cannot resolve dependencies for components: {0}".format(pending)
+                self.logger.error(msg)
+                raise DjerbaDependencyError(msg)
+            done, not_done = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name] = future.result() # raises any error from the task
+                self.logger.debug('Finished component {0}'.format(name))
+                if finish:
+                    finish(name, results[name])
+        return results
+
+    def _run_parallel_configure(self, config_in, components, ordered_names, dependencies, workers):
+        """
+        Run configuration in a pool of threads
+        Each component is configured on a copy of config_in, which includes the configured
+        sections of all its dependencies; config_in is only updated in the calling thread
+        Returns a dictionary of configured sections, indexed by component name
+        """
+        def configure_component(name, config):
+            component = components[name]
+            component.validate_minimal_config(config)
+            config_tmp, timing = measure(component.configure, config)
+            self._record_timing(name, cc.CONFIGURE, timing)
+            component.validate_full_config(config_tmp)
+            return config_tmp[name]
+        def finish(name, section):
+            config_in[name] = section # update config_in to support dependencies
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            def submit(name):
+                config_copy = ConfigParser()
+                config_copy.read_dict(
+                    {x: dict(config_in.items(x, raw=True)) for x in config_in.sections()}
+                )
+                return executor.submit(configure_component, name, config_copy)
+            results = self._run_in_dependency_order(ordered_names, dependencies, submit, finish)
+        return results
+
+    def _run_parallel_extract(self, config, ordered_names, dependencies, workers):
+        """
+        Run extraction in a pool of worker processes
+        Returns a dictionary of extracted data, indexed by component name
+        """
+        config_sections = {s: dict(config.items(s, raw=True)) for s in config.sections()}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            def submit(name):
+                args = [name, config_sections, self.work_dir, self.log_level, self.log_path]
+                return executor.submit(_extract_component, *args)
+            results = self._run_in_dependency_order(ordered_names, dependencies, submit)
+        for name in ordered_names:
+            results[name], timing = results[name]
+            self._record_timing(name, cc.EXTRACT, timing)
+        return results
 
     def _validate_html_cache_input(self, data):
         if not cc.HTML_CACHE in data:
@@ -165,16 +302,31 @@ class main_base(core_base):
         self.write_component_info(ordered_names, components)
         self.logger.debug('Generating core data structure')
         data = extraction_setup(self.log_level, self.log_path).run(config)
-        self.logger.debug('Running extraction for plugins and mergers in priority order')
-        order = 0
+        workers = self._get_workers(cc.EXTRACT_WORKERS, config)
+        if workers > 1:
+            self.logger.debug('Running parallel extraction with {0} workers'.format(workers))
+            for name in ordered_names:
+                components[name].validate_full_config(config)
+            dependencies = self._get_dependency_graph(
+                cc.DEPENDS_EXTRACT, config, components, priorities
+            )
+            results = self._run_parallel_extract(config, ordered_names, dependencies, workers)
+        else:
+            self.logger.debug('Running extraction for plugins and mergers in priority order')
+            results = {}
+            order = 0
+            for name in ordered_names:
+                order += 1
+                component = components[name]
+                self.logger.debug('Extracting component {0} in order {1}'.format(name, order))
+                component.validate_full_config(config)
+                results[name], timing = measure(component.extract, config)
+                self._record_timing(name, cc.EXTRACT, timing)
+        # results are added in priority order, for consistent output
         for name in ordered_names:
-            order += 1
-            component = components[name]
-            self.logger.debug('Extracting component {0} in order {1}'.format(name, order))
-            component.validate_full_config(config)
-            component_data = components[name].extract(config)
             if not self._is_helper_name(name):
                 # only plugins and mergers, not helpers, write data in the JSON document
+                component_data = results[name]
                 self.json_validator.validate_data(component_data)
                 data[self.PLUGINS][name] = component_data
         # 3. Render the HTML; encode and store in data structure
@@ -185,6 +337,9 @@ class main_base(core_base):
             # cache HTML for each report type -- clinical, research, etc.
             encoded = self.html_cache.encode_to_base64(rendered[cc.DOCUMENTS][prefix])
             data[cc.HTML_CACHE][prefix] = encoded
+        if config.has_option(ini.CORE, cc.TIMING_SUMMARY) and \
+           config.getboolean(ini.CORE, cc.TIMING_SUMMARY):
+            data[cc.CORE][cc.TIMINGS] = self.get_timing_summary()
         self.logger.debug('Finished running extraction')
         return data
 
@@ -202,8 +357,9 @@ class main_base(core_base):
         self.logger.debug('Rendering plugin HTML')
         for plugin_name in data[self.PLUGINS]:
             plugin_data = data[self.PLUGINS][plugin_name]
-            plugin = self.plugin_loader.load(plugin_name, self.workspace)
-            html_raw = plugin.render(plugin_data)
+            plugin = self._load_component(plugin_name)
+            html_raw, timing = measure(plugin.render, plugin_data)
+            self._record_timing(plugin_name, cc.RENDER, timing)
             html[plugin_name] = self.html_cache.wrap_html(plugin_name, html_raw)
             self.logger.debug("Ran plugin '{0}' for rendering".format(plugin_name))
             priorities[plugin_name] = self._get_render_priority(plugin_data)
@@ -220,7 +376,9 @@ class main_base(core_base):
         output_data = h_rend.run(html, priorities, attributes)
         # 3. Write output files, if any
         if out_dir:
+            # PDFs for each document are rendered concurrently
             p_rend = pdf_renderer(self.log_level, self.log_path)
+            pdf_futures = {}
             for prefix in output_data[cc.DOCUMENTS].keys():
                 html_path = os.path.join(out_dir, prefix+'.html')
                 with open(html_path, 'w', encoding=cc.TEXT_ENCODING) as out_file:
@@ -229,14 +387,19 @@ class main_base(core_base):
                 if pdf:
                     pdf_path = os.path.join(out_dir, prefix+'.pdf')
                     footer = output_data[cc.PDF_FOOTERS][prefix]
-                    p_rend.render_file(html_path, pdf_path, footer)
-                    self.logger.info("Wrote PDF output to {0}".format(pdf_path))
+                    pdf_futures[prefix] = p_rend.submit(html_path, pdf_path, footer)
             merge_list = output_data[cc.MERGE_LIST]
             if pdf and len(merge_list)>1:
                 merge_in = [os.path.join(out_dir, x+'.pdf') for x in merge_list]
                 merge_out = os.path.join(out_dir, output_data[cc.MERGED_FILENAME])
-                p_rend.merge_pdfs(merge_in, merge_out)
+                merge_futures = [pdf_futures[x] for x in merge_list]
+                p_rend.merge_pdfs(merge_in, merge_out, merge_futures)
                 self.logger.info("Wrote merged PDF output to {0}".format(merge_out))
+            for (prefix, future) in pdf_futures.items():
+                pdf_path = future.result() # raises any rendering error
+                self.logger.info("Wrote PDF output to {0}".format(pdf_path))
+        self._log_loader_stats()
+        self.write_timings()
         self.logger.info('Finished Djerba render step')
         return output_data
 
@@ -266,22 +429,37 @@ class main_base(core_base):
         self._resolve_configure_dependencies(config_in, components, ordered_names)
         # 2. Validate and run configuration for each component; store in config_out
         config_out = ConfigParser()
-        order = 0
-        for name in ordered_names:
-            order += 1
-            component = components[name]
-            priority = priorities[name]
-            msg = 'Configuring {0}, priority {1}, order {2}'.format(name, priority, order)
-            self.logger.debug(msg)
-            component.validate_minimal_config(config_in)
-            config_tmp = component.configure(config_in)
-            component.validate_full_config(config_tmp)
-            config_in[name] = config_tmp[name] # update config_in to support dependencies
-            config_out[name] = config_tmp[name]
+        workers = self._get_workers(cc.CONFIGURE_WORKERS, config_in)
+        if workers > 1:
+            self.logger.debug('Running parallel configuration with {0} workers'.format(workers))
+            dependencies = self._get_dependency_graph(
+                cc.DEPENDS_CONFIGURE, config_in, components, priorities
+            )
+            sections = self._run_parallel_configure(
+                config_in, components, ordered_names, dependencies, workers
+            )
+            # sections are added in priority order, for consistent output
+            for name in ordered_names:
+                config_out[name] = sections[name]
+        else:
+            order = 0
+            for name in ordered_names:
+                order += 1
+                component = components[name]
+                priority = priorities[name]
+                msg = 'Configuring {0}, priority {1}, order {2}'.format(name, priority, order)
+                self.logger.debug(msg)
+                component.validate_minimal_config(config_in)
+                config_tmp, timing = measure(component.configure, config_in)
+                self._record_timing(name, cc.CONFIGURE, timing)
+                component.validate_full_config(config_tmp)
+                config_in[name] = config_tmp[name] # update config_in to support dependencies
+                config_out[name] = config_tmp[name]
         if config_path_out:
             self.logger.debug('Writing INI output to {0}'.format(config_path_out))
             with open(config_path_out, 'w', encoding=cc.TEXT_ENCODING) as out_file:
                 config_out.write(out_file)
+        self.write_timings()
         self.logger.info('Finished Djerba config step')
         return config_out
 
@@ -330,7 +508,7 @@ class main_base(core_base):
             data[self.PLUGINS][plugin_name] = new_data[self.PLUGINS][plugin_name]
             data[constants.CONFIG][plugin_name] = new_data[constants.CONFIG][plugin_name]
             # load the plugin and render HTML for cache update
-            plugin = self.plugin_loader.load(plugin_name, self.workspace)
+            plugin = self._load_component(plugin_name)
             raw_html = plugin.render(new_data[self.PLUGINS][plugin_name])
             new_html[plugin_name] = self.html_cache.wrap_html(plugin_name, raw_html)
             self.logger.debug('Updated JSON for plugin {0}'.format(plugin_name))
@@ -350,6 +528,30 @@ class main_base(core_base):
             data = json.loads(in_file.read())
         return self.update_report_data(new_data, data, force)
 
+    def get_timing_summary(self):
+        """Wall-clock seconds for each component and step; for the report JSON"""
+        with self.timings_lock:
+            summary = {
+                name: {step: timing[WALL_SECONDS] for (step, timing) in steps.items()}
+                for (name, steps) in self.timings.items()
+            }
+        return summary
+
+    def write_timings(self):
+        """
+        Write timings for each component and step to a JSON file in the workspace
+        Timings from earlier steps, eg. configure in a separate run, are kept
+        """
+        if self.workspace.has_file(cc.TIMINGS_FILENAME):
+            timings = self.workspace.read_json(cc.TIMINGS_FILENAME)
+        else:
+            timings = {}
+        with self.timings_lock:
+            for (name, steps) in self.timings.items():
+                timings.setdefault(name, {}).update(steps)
+        self.workspace.write_json(cc.TIMINGS_FILENAME, timings)
+        self.logger.debug("Wrote timings to workspace: {0}".format(cc.TIMINGS_FILENAME))
+
     def write_component_info(self, ordered_names, components):
         # Write component names/versions/URLs to a JSON file
         # "components" input is a dictionary of plugin/helper/merger objects already loaded
@@ -370,10 +572,79 @@ class main_base(core_base):
 
 
 
+def _extract_component(name, config_sections, work_dir, log_level, log_path):
+    """
+    Load a component and run its extract method; module-level for use in a worker process
+    Returns the extracted data, and timing measurements
+    """
+    config = ConfigParser()
+    config.read_dict(config_sections)
+    component = main_base(work_dir, log_level, log_path)._load_component(name)
+    return measure(component.extract, config)
+
 class main(main_base):
 
     """Main class for Djerba core"""
 
+    BATCH_SUMMARY_FILENAME = 'batch_summary.tsv'
+    BATCH_SUMMARY_HEADER = ['#ini_path', 'out_dir', 'status', 'seconds', 'error']
+    BATCH_OK = 'OK'
+    BATCH_FAILED = 'FAILED'
+
+    def batch(self, input_path, out_dir, pdf=False, archive=False, workers=1):
+        """
+        Run reports for multiple INI files, in a single Djerba process
+        Input is a directory of INI files, or a manifest listing one INI path per line
+        Output for each report is written to a subdirectory of out_dir, named for the INI
+        Workers are reused across reports, so imports, loaders and validators are not repeated
+        Writes a summary with status and run time for each report
+        """
+        self.logger.info('Starting Djerba batch mode')
+        ini_paths = self.read_batch_inputs(input_path)
+        report_dirs = []
+        for ini_path in ini_paths:
+            name = re.sub(r'\.ini$', '', os.path.basename(ini_path))
+            report_dir = os.path.join(out_dir, name)
+            if report_dir in report_dirs:
+                msg = "Duplicate report name '{0}' in batch inputs".format(name)
+                self.logger.error(msg)
+                raise DjerbaBatchError(msg)
+            report_dirs.append(report_dir)
+        for report_dir in report_dirs:
+            os.makedirs(report_dir, exist_ok=True)
+        msg = "Running {0} reports with {1} worker(s)".format(len(ini_paths), workers)
+        self.logger.info(msg)
+        if workers > 1:
+            args = [pdf, archive, self.log_level, self.log_path]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(_run_batch_report, ini_path, report_dir, *args)
+                    for (ini_path, report_dir) in zip(ini_paths, report_dirs)
+                ]
+                results = [future.result() for future in futures]
+        else:
+            work_dir = self.work_dir
+            results = [
+                self.run_batch_report(ini_path, report_dir, pdf, archive)
+                for (ini_path, report_dir) in zip(ini_paths, report_dirs)
+            ]
+            self._set_work_dir(work_dir)
+        summary_path = os.path.join(out_dir, self.BATCH_SUMMARY_FILENAME)
+        with open(summary_path, 'w', encoding=cc.TEXT_ENCODING) as out_file:
+            print("\t".join(self.BATCH_SUMMARY_HEADER), file=out_file)
+            for result in results:
+                print("\t".join([str(x) for x in result]), file=out_file)
+        failed = len([x for x in results if x[2] == self.BATCH_FAILED])
+        msg = "Finished Djerba batch mode: {0} of {1} reports OK, summary in {2}".format(
+            len(results)-failed, len(results), summary_path)
+        self.logger.info(msg)
+        if failed > 0:
+            msg = "{0} of {1} reports failed in batch mode; see {2}".format(
+                failed, len(results), summary_path)
+            self.logger.error(msg)
+            raise DjerbaBatchError(msg)
+        return results
+
     def configure(self, config_path_in, config_path_out=None):
         """
         Run the Djerba configure step, with an INI path as input
@@ -434,12 +705,67 @@ class main(main_base):
         # run the main rendering operation
         return self.base_render(data, out_dir, pdf)
 
+    def read_batch_inputs(self, input_path):
+        """Read INI paths from a directory, or from a manifest file"""
+        if os.path.isdir(input_path):
+            ini_paths = sorted(glob(os.path.join(input_path, '*.ini')))
+        else:
+            self.path_validator.validate_input_file(input_path)
+            manifest_dir = os.path.dirname(os.path.abspath(input_path))
+            ini_paths = []
+            with open(input_path, encoding=cc.TEXT_ENCODING) as in_file:
+                for line in in_file:
+                    line = line.strip()
+                    if line == '' or line.startswith('#'):
+                        continue
+                    # relative paths are with respect to the manifest directory
+                    ini_paths.append(os.path.join(manifest_dir, line))
+        if len(ini_paths) == 0:
+            msg = "No INI files found for batch input {0}".format(input_path)
+            self.logger.error(msg)
+            raise DjerbaBatchError(msg)
+        for ini_path in ini_paths:
+            self.path_validator.validate_input_file(ini_path)
+        self.logger.debug("Found {0} INI files for batch input".format(len(ini_paths)))
+        return ini_paths
+
     def read_ini_path(self, ini_path):
         self.path_validator.validate_input_file(ini_path)
         config = ConfigParser()
         config.read(ini_path)
         return config
 
+    def report(self, ini_path, out_dir, pdf=False, archive=False):
+        """Run the configure, extract and render steps"""
+        ini_path_out = os.path.join(out_dir, 'full_config.ini')
+        json_path = None # write JSON to default workspace location
+        config = self.configure(ini_path, ini_path_out)
+        # upload to archive at the extract step, not the render step
+        data = self.extract(config, json_path, archive)
+        self.render(data, out_dir, pdf, archive=False)
+        return data
+
+    def run_batch_report(self, ini_path, out_dir, pdf=False, archive=False):
+        """
+        Run a report in batch mode, using out_dir as the workspace
+        Errors are logged, not raised, so other reports in the batch can continue
+        Returns a list of summary fields: INI path, output directory, status, time, error
+        """
+        self._set_work_dir(out_dir)
+        start = time.time()
+        try:
+            self.report(ini_path, out_dir, pdf, archive)
+            status = self.BATCH_OK
+            error = ''
+        except Exception as err:
+            status = self.BATCH_FAILED
+            error = "{0}: {1}".format(type(err).__name__, err).replace("\n", ' ')
+            msg = "Batch report for {0} failed: {1}".format(ini_path, error)
+            self.logger.error(msg)
+        seconds = '{0:.3f}'.format(time.time()-start)
+        self.logger.info("Batch report for {0}: {1} in {2}s".format(ini_path, status, seconds))
+        return [ini_path, out_dir, status, seconds, error]
+
     def run(self, args):
         # run from command-line args
         # path validation was done in command-line script
@@ -472,13 +798,13 @@ class main(main_base):
         elif mode == constants.REPORT:
             ini_path = ap.get_ini_path()
             out_dir = ap.get_out_dir()
-            ini_path_out = os.path.join(out_dir, 'full_config.ini')
-            json_path = None # write JSON to default workspace location
             archive = ap.is_archive_enabled()
-            config = self.configure(ini_path, ini_path_out)
-            # upload to archive at the extract step, not the render step
-            data = self.extract(config, json_path, archive)
-            self.render(data, ap.get_out_dir(), ap.is_pdf_enabled(), archive=False)
+            self.report(ini_path, out_dir, ap.is_pdf_enabled(), archive)
+        elif mode == constants.BATCH:
+            input_path = ap.get_input_path()
+            out_dir = ap.get_out_dir()
+            archive = ap.is_archive_enabled()
+            self.batch(input_path, out_dir, ap.is_pdf_enabled(), archive, ap.get_workers())
         elif mode == constants.UPDATE:
             ini_path = ap.get_ini_path()
             if ini_path == None:
@@ -493,11 +819,25 @@ class main(main_base):
             pdf = ap.is_pdf_enabled()
             force = ap.is_forced()
             self.update(config_path, jp, out_dir, archive, pdf, summary_only, force)
+        elif mode == constants.ONCOKB_CACHE:
+            self.run_oncokb_cache(ap)
         else:
             msg = "Mode '{0}' is not defined in Djerba core.main!".format(mode)
             self.logger.error(msg)
             raise RuntimeError(msg)
 
+    def run_oncokb_cache(self, ap):
+        # cache utilities are not needed for report generation, so only import when needed
+        from djerba.util.oncokb.cache_checker import oncokb_cache_checker
+        checker = oncokb_cache_checker(ap.get_cache_dir(), self.log_level, self.log_path)
+        results = checker.check(ap.get_report_dirs(), ap.get_oncotree_code(), ap.is_prewarm_enabled())
+        out_path = ap.get_out_path()
+        if out_path:
+            with open(out_path, 'w') as out_file:
+                checker.write_results(results, out_file)
+        else:
+            checker.write_results(results, sys.stdout)
+
     def setup(self, assay, ini_path, compact, pre_populate=None):
         components_by_assay = {
             'WGTS': [
@@ -633,7 +973,7 @@ class main(main_base):
         for plugin_name in data[self.PLUGINS]:
             # load each plugin and redact PHI (if any)
             plugin_data = data[self.PLUGINS][plugin_name]
-            plugin = self.plugin_loader.load(plugin_name, self.workspace)
+            plugin = self._load_component(plugin_name)
             data[self.PLUGINS][plugin_name] = plugin.redact(plugin_data)
         uploaded, report_id = database(self.log_level, self.log_path).upload_data(data)
         if uploaded:
@@ -660,27 +1000,58 @@ class main(main_base):
         self.logger.debug(template.format(total, config_path, prepop_path))
 
 
+# worker processes in batch mode reuse a main object, and its loaders/validators
+_batch_main = None
+
+def _run_batch_report(ini_path, out_dir, pdf, archive, log_level, log_path):
+    """Run a batch mode report; module-level for use in a worker process"""
+    global _batch_main
+    if _batch_main is None:
+        _batch_main = main(out_dir, log_level, log_path)
+    return _batch_main.run_batch_report(ini_path, out_dir, pdf, archive)
+
 class arg_processor(arg_processor_base):
     # class to process command-line args for creating a main object
 
+    def get_action(self):
+        return self._get_arg('action')
+
     def get_assay(self):
         return self._get_arg('assay')
 
+    def get_cache_dir(self):
+        return self._get_arg('cache_dir')
+
     def get_compact(self):
         return self._get_arg('compact')
 
     def get_ini_path(self):
         return self._get_arg('ini')
 
+    def get_input_path(self):
+        return self._get_arg('input')
+
     def get_ini_out_path(self):
         return self._get_arg('ini_out')
 
+    def get_oncotree_code(self):
+        return self._get_arg('oncotree_code')
+
+    def get_out_path(self):
+        return self._get_arg('out')
+
     def get_pre_populate(self):
         return self._get_arg('pre_populate')
 
+    def get_report_dirs(self):
+        return self._get_arg('report_dir')
+
     def get_summary_path(self):
         return self._get_arg('summary')
 
+    def get_workers(self):
+        return self._get_arg('workers')
+
     def get_work_dir(self):
         if hasattr(self.args, 'work_dir'):
             # if work_dir is defined and non-empty, use it
@@ -703,6 +1074,9 @@ class arg_processor(arg_processor_base):
         # use to auto-populate INI in 'setup' mode
         return not self._get_arg('no_cleanup')
 
+    def is_prewarm_enabled(self):
+        return self._get_arg('prewarm')
+
     def validate_args(self, args):
         """
         Check we can read/write paths in command-line arguments
@@ -741,6 +1115,27 @@ class arg_processor(arg_processor_base):
             v.validate_output_dir(args.out_dir)
             if args.work_dir != None: # work_dir is optional in report mode
                 v.validate_output_dir(args.work_dir)
+        elif args.subparser_name == constants.BATCH:
+            if os.path.isdir(args.input):
+                v.validate_input_dir(args.input)
+            else:
+                v.validate_input_file(args.input)
+            v.validate_output_dir(args.out_dir)
+            if args.workers < 1:
+                msg = "Number of batch workers must be at least 1; got {0}".format(args.workers)
+                self.logger.error(msg)
+                raise ValueError(msg)
+        elif args.subparser_name == constants.ONCOKB_CACHE:
+            if args.action == constants.CHECK:
+                v.validate_output_dir(args.cache_dir)
+                for report_dir in args.report_dir:
+                    v.validate_input_dir(report_dir)
+                if args.out != None:
+                    v.validate_output_file(args.out)
+            else:
+                msg = "No valid action given for {0}; ".format(constants.ONCOKB_CACHE)+\
+                    "run with -h/--help for valid actions"
+                raise DjerbaInvalidNameError(msg)
         elif args.subparser_name == None:
             msg = "No subcommand name given; run with -h/--help for valid names"
             raise DjerbaInvalidNameError(msg)
@@ -749,6 +1144,9 @@ class arg_processor(arg_processor_base):
             raise DjerbaInvalidNameError("Unknown subcommand: " + args.subparser_name)
         self.logger.info("Command-line path validation finished.")
 
+class DjerbaBatchError(Exception):
+    pass
+
 class DjerbaDependencyError(Exception):
     pass
 
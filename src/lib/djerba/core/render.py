@@ -6,9 +6,9 @@ Includes merge/deduplicate for shared tables, eg. gene info
 import json
 import logging
 import os
-import pdfkit
+import threading
 import traceback
-from PyPDF2 import PdfMerger
+from concurrent.futures import ThreadPoolExecutor
 import djerba.core.constants as cc
 from djerba.util.date import get_todays_date
 from djerba.util.environment import directory_finder, DjerbaEnvDirError
@@ -147,10 +147,40 @@ class pdf_renderer(logger):
     RESEARCH_SUFFIX = '.research.pdf'
     RESEARCH_FOOTER_TEXT = 'For Research Use Only'
 
+    # Each conversion runs in a wkhtmltopdf subprocess, so threads are enough for concurrency
+    # The thread pool and pdfkit configuration are shared by all instances in the process,
+    # so they are reused across documents, and across reports in batch mode
+    WORKERS = 4
+    _executor = None
+    _executor_pid = None
+    _configuration = None
+    _lock = threading.Lock()
+
     def __init__(self, log_level=logging.WARNING, log_path=None):
         super().__init__()
         self.logger = self.get_logger(log_level, __name__, log_path)
 
+    @classmethod
+    def _get_configuration(cls):
+        # pdfkit runs 'which wkhtmltopdf' for every conversion unless given a configuration
+        import pdfkit # slow to import, so only import when needed
+        with cls._lock:
+            if cls._configuration is None:
+                cls._configuration = pdfkit.configuration()
+            return cls._configuration
+
+    @classmethod
+    def _get_executor(cls):
+        with cls._lock:
+            # threads are not inherited by a forked process, eg. a batch mode worker
+            if cls._executor is None or cls._executor_pid != os.getpid():
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=cls.WORKERS,
+                    thread_name_prefix='djerba_pdf'
+                )
+                cls._executor_pid = os.getpid()
+            return cls._executor
+
     # Running the PDF renderer requires the wkhtmltopdf binary on the PATH
     # This can be done by loading the wkhtmltopdf environment module:
     # https://gitlab.oicr.on.ca/ResearchIT/modulator/-/blob/master/code/gsi/70_wkhtmltopdf.yaml
@@ -164,10 +194,18 @@ class pdf_renderer(logger):
     # An alternative solution would be changing the HTML generation to omit unnecessary Javascript
 
     @staticmethod
-    def merge_pdfs(pdf_path_list, out_path):
+    def merge_pdfs(pdf_path_list, out_path, futures=None):
+        """
+        Merge PDFs in the given order
+        If futures from submit() are given, each input is appended as soon as it is finished,
+        so merging overlaps with rendering of later documents
+        """
+        from PyPDF2 import PdfMerger # slow to import, so only import when needed
         merger = PdfMerger()
-        for pdf in pdf_path_list:
-            merger.append(pdf)
+        for i in range(len(pdf_path_list)):
+            if futures:
+                futures[i].result()
+            merger.append(pdf_path_list[i])
         merger.write(out_path)
         merger.close()
 
@@ -197,8 +235,10 @@ class pdf_renderer(logger):
                 'quiet': '',
                 'disable-javascript': ''
             }
+        import pdfkit
         try:
-            pdfkit.from_file(in_path, out_path, options=options)
+            configuration = self._get_configuration()
+            pdfkit.from_file(in_path, out_path, options=options, configuration=configuration)
         except Exception as err:
             msg = "Unexpected error of type "+\
                 "{0} in PDF rendering: {1}".format(type(err).__name__, err)
@@ -207,3 +247,13 @@ class pdf_renderer(logger):
             self.logger.error('Traceback: {0}'.format(trace))
             raise
         self.logger.info('Finished writing PDF')
+
+    def submit(self, in_path, out_path, footer_text=None, footer=True):
+        """
+        Render a PDF in the shared thread pool; return a Future
+        The Future result is the output path; errors are raised by calling result()
+        """
+        def render():
+            self.render_file(in_path, out_path, footer_text, footer)
+            return out_path
+        return self._get_executor().submit(render)
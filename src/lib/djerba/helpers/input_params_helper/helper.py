@@ -2,7 +2,6 @@ import os
 import csv
 import gzip
 import logging
-import pandas as pd
 import djerba.core.constants as core_constants
 from djerba.util.environment import directory_finder
 import djerba.util.ini_fields as ini  # TODO new module for these constants?
@@ -165,6 +164,7 @@ class main(helper_base):
     def convert_oncotree_to_tcga(self, oncotree_code):
         
         # Read tcga_code_key.txt as a database
+        import pandas as pd # slow to import, so only import when needed
         plugin_dir = os.path.dirname(os.path.realpath(__file__))
         df = pd.read_csv(os.path.join(plugin_dir, self.TCGA_CODE_KEY), sep = "\t", index_col = self.ONCOTREE_CODE)
 
@@ -12,14 +12,15 @@ the full file provenance report.
 
 import os
 import csv
-import gzip
 import logging
 import djerba.core.constants as core_constants
 import djerba.util.ini_fields as ini  # TODO new module for these constants?
-import djerba.util.provenance_index as index
+from djerba.core.workspace import workspace
 from djerba.helpers.base import helper_base
 from djerba.util.provenance_reader import provenance_reader, sample_name_container, \
     InvalidConfigurationError
+from djerba.util.logger import logger
+from djerba.util.provenance_store import read_donor_rows, read_multiple_donor_rows
 
 class main(helper_base):
 
@@ -264,25 +265,55 @@ class main(helper_base):
 
     def write_provenance_subset(self, study, donor, provenance_path):
         self.logger.info('Started reading file provenance from {0}'.format(provenance_path))
-        total = 0
-        kept = 0
-        with gzip.open(provenance_path, 'rt') as in_file, \
-             self.workspace.open_gzip_file(self.PROVENANCE_OUTPUT, write=True) as out_file:
-            reader = csv.reader(in_file, delimiter="\t")
-            writer = csv.writer(out_file, delimiter="\t")
-            for row in reader:
-                total += 1
-                if total % 100000 == 0:
-                    self.logger.debug("Read {0} input rows".format(total))
-                if row[index.STUDY_TITLE] == study and row[index.ROOT_SAMPLE_NAME] == donor:
-                    writer.writerow(row)
-                    kept += 1
-        self.logger.info('Done reading FPR; kept {0} of {1} rows'.format(kept, total))
+        # uses the indexed provenance store, if one is current for the input path
+        rows = read_donor_rows(provenance_path, study, donor, self.log_level, self.log_path)
+        self.write_subset_rows(self.workspace, rows)
+        self.logger.info('Done reading FPR; kept {0} rows'.format(len(rows)))
         self.logger.debug('Wrote provenance subset to {0}'.format(self.PROVENANCE_OUTPUT))
 
+    @staticmethod
+    def write_subset_rows(ws, rows):
+        with ws.open_gzip_file(main.PROVENANCE_OUTPUT, write=True) as out_file:
+            writer = csv.writer(out_file, delimiter="\t")
+            writer.writerows(rows)
+
     def write_sample_info(self, sample_info):
         self.workspace.write_json(core_constants.DEFAULT_SAMPLE_INFO, sample_info)
         self.logger.debug("Wrote sample info to workspace: {0}".format(sample_info))
 
+def write_provenance_subsets(provenance_path, targets, overwrite=False,
+                             log_level=logging.WARNING, log_path=None):
+    """
+    Write provenance subsets for multiple reports, with a single read of the FPR
+    - targets is a list of (study, donor, workspace directory) tuples
+    - Writes the same subset file as the helper; the helper will then not read the FPR
+    - Existing subset files are not overwritten, unless overwrite=True
+    - Returns the number of subset files written
+    """
+    log = logger().get_logger(log_level, __name__, log_path)
+    workspaces = []
+    for (study, donor, work_dir) in targets:
+        ws = workspace(work_dir, log_level, log_path)
+        if ws.has_file(main.PROVENANCE_OUTPUT) and not overwrite:
+            msg = "Provenance subset exists in {0}, will not overwrite".format(work_dir)
+            log.info(msg)
+        else:
+            workspaces.append((study, donor, ws))
+    if len(workspaces) == 0:
+        log.info("No provenance subsets to write")
+        return 0
+    keys = set([(study, donor) for (study, donor, ws) in workspaces])
+    log.info('Reading file provenance for {0} donors from {1}'.format(len(keys), provenance_path))
+    rows = read_multiple_donor_rows(provenance_path, keys, log_level, log_path)
+    for (study, donor, ws) in workspaces:
+        donor_rows = rows[(study, donor)]
+        if len(donor_rows) == 0:
+            msg = "No provenance rows found for project '{0}' and donor '{1}'".format(study, donor)
+            log.warning(msg)
+        main.write_subset_rows(ws, donor_rows)
+        msg = 'Wrote {0} provenance rows for {1}/{2} to {3}'
+        log.debug(msg.format(len(donor_rows), study, donor, ws.get_work_dir()))
+    return len(workspaces)
+
 class DjerbaProvenanceError(Exception):
     pass
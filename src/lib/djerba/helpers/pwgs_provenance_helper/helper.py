@@ -4,7 +4,6 @@ Helper for writing a subset of file provenance to the shared workspace
 
 import os
 import csv
-import gzip
 import logging
 import requests
 import json
@@ -16,6 +15,7 @@ import djerba.util.provenance_index as index
 from djerba.helpers.base import helper_base
 from djerba.util.provenance_reader import provenance_reader, sample_name_container, \
     InvalidConfigurationError
+from djerba.util.provenance_store import read_donor_rows
 import djerba.plugins.pwgs.constants as pc
 
 class main(helper_base):
@@ -139,20 +139,12 @@ class main(helper_base):
 
     def write_provenance_subset(self, study, donor, provenance_path):
         self.logger.info('Started reading file provenance from {0}'.format(provenance_path))
-        total = 0
-        kept = 0
-        with gzip.open(provenance_path, 'rt') as in_file, \
-             self.workspace.open_gzip_file(self.PROVENANCE_OUTPUT, write=True) as out_file:
-            reader = csv.reader(in_file, delimiter="\t")
+        # uses the indexed provenance store, if one is current for the input path
+        rows = read_donor_rows(provenance_path, study, donor, self.log_level, self.log_path)
+        with self.workspace.open_gzip_file(self.PROVENANCE_OUTPUT, write=True) as out_file:
             writer = csv.writer(out_file, delimiter="\t")
-            for row in reader:
-                total += 1
-                if total % 100000 == 0:
-                    self.logger.debug("Read {0} input rows".format(total))
-                if row[index.STUDY_TITLE] == study and row[index.ROOT_SAMPLE_NAME] == donor:
-                    writer.writerow(row)
-                    kept += 1
-        self.logger.info('Done reading FPR; kept {0} of {1} rows'.format(kept, total))
+            writer.writerows(rows)
+        self.logger.info('Done reading FPR; kept {0} rows'.format(len(rows)))
         self.logger.debug('Wrote provenance subset to {0}'.format(self.PROVENANCE_OUTPUT))
     
 class MissingProvenanceError(Exception):
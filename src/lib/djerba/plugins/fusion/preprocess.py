@@ -7,8 +7,6 @@ import csv
 import logging
 import os
 import re
-import pandas as pd
-import numpy as np
 from djerba.util.logger import logger
 from djerba.util.environment import directory_finder
 from djerba.util.oncokb.tools import levels as oncokb_levels
@@ -16,7 +14,7 @@ from djerba.util.oncokb.annotator import annotator_factory
 import djerba.plugins.fusion.constants as fc
 import djerba.core.constants as core_constants
 from djerba.util.subprocess_runner import subprocess_runner
-pd.set_option('future.no_silent_downcasting', True)
+# pandas and numpy are slow to import, so they are imported by the methods which use them
 
 class prepare_fusions(logger):
 
@@ -27,6 +25,8 @@ class prepare_fusions(logger):
         self.logger = self.get_logger(log_level, __name__, log_path)
         self.work_dir = work_dir
         self.data_dir = directory_finder(log_level, log_path).get_data_dir()
+        import pandas as pd
+        pd.set_option('future.no_silent_downcasting', True)
 
     def annotate_fusion_files(self, config_wrapper):
         # annotate from OncoKB
@@ -84,6 +84,7 @@ class prepare_fusions(logger):
         If the tool used is delly, DNA_support = yes, otherwise DNA_support = no
         If the tool used is arriba OR star: RNA_support = yes, otherwise RNA_support = no
         """
+        import numpy as np
       
         DNA_tools = df["tools"].str.contains("delly")
         RNA_tools = df["tools"].str.contains("star|arriba")
@@ -145,6 +146,7 @@ class prepare_fusions(logger):
         The translocation notation will be present for those which the event-type
         is translocation or inverted translocation.
         """
+        import numpy as np
         
         translocation_cases = df["event_type"].isin(["translocation", "inverted translocation"])
         
@@ -208,7 +210,9 @@ class prepare_fusions(logger):
 
             return entry  
     
-        df["translocation"] = df["translocation"].apply(format_translocation)
+        # many rows have the same entry, so format each distinct entry once
+        formatted = {x: format_translocation(x) for x in df["translocation"].unique()}
+        df["translocation"] = df["translocation"].map(formatted)
         return df 
       
     def delete_delly_only_calls(self, df):
@@ -247,10 +251,17 @@ class prepare_fusions(logger):
         """
         """
     
-        columns = df.groupby("fusion_pairs", as_index=False).agg({
-            "event_type": lambda x: ";".join(x.unique()),
-            "reading_frame": lambda x: ";".join(x.dropna().astype(str).unique())
-        })
+        # join the distinct values for each fusion, in order of first appearance
+        # a single pass over deduplicated pairs is much faster than a groupby with one
+        # Python call per fusion
+        fusions = df["fusion_pairs"].drop_duplicates()
+        columns = fusions.to_frame()
+        for column in ["event_type", "reading_frame"]:
+            values = df[["fusion_pairs", column]].dropna().astype(str).drop_duplicates()
+            joined = {}
+            for fusion, value in zip(values["fusion_pairs"], values[column]):
+                joined.setdefault(fusion, []).append(value)
+            columns[column] = [";".join(joined.get(x, [])) for x in fusions]
         df = df.drop(columns=["event_type", "reading_frame"]).merge(columns, on="fusion_pairs")
         df = self.drop_duplicates(df, "fusion_pairs")
         return df
@@ -319,6 +330,7 @@ class prepare_fusions(logger):
         Processing includes changing column names and writing fusion pairs for merging with mavis.
         Returns a processed arriba dataframe.
         """
+        import pandas as pd
         # Get the data_frame if the arriba path is not completely empty:
         # Note: the code should work even if there is only a header.
         if os.path.getsize(arriba_path) != 0:
@@ -340,6 +352,7 @@ class prepare_fusions(logger):
         Processing includes fixing column formats, filtering by read support, adding translocation notation, etc.
         Returns a processed mavis dataframe.
         """
+        import pandas as pd
         # Get the data_frame if the mavis path is not completely empty:
         # Note: the code should work even if there is only a header 
         if os.path.getsize(mavis_path) != 0:
@@ -374,19 +387,24 @@ class prepare_fusions(logger):
         It is deduplicated further as the oncokb annotator does not care about event types.
         We also remove any fusion pairs with None as they will not be reported in Djerba.
         """
+        import pandas as pd
 
         df_annotations = pd.read_csv(os.path.join(self.data_dir, fc.NCCN_ANNOTATION_FILE), sep = '\t')
-        
-        marker_dict = dict(zip(df_annotations["marker"], df_annotations["oncotree"]))
-
-        dict_nccn = {"Tumor_Sample_Barcode":[], "Fusion": []}
-        for row in df_merged.iterrows():
-            translocation = row[1]["translocation"]
-            if translocation in marker_dict and oncotree_code == marker_dict[translocation]:
-                dict_nccn["Fusion"].append(row[1]["fusion_pairs"])
-                dict_nccn["Tumor_Sample_Barcode"].append(row[1]["Sample"])
-
-        df_nccn = pd.DataFrame(dict_nccn)
+        # one OncoTree code per marker; if a marker is repeated, the last entry is used
+        df_annotations = df_annotations.drop_duplicates(subset=["marker"], keep="last")
+
+        columns = {"Sample": "Tumor_Sample_Barcode", "fusion_pairs": "Fusion"}
+        if df_merged.empty:
+            return pd.DataFrame({x: [] for x in columns.values()})
+        # inner join keeps the order of fusions in df_merged
+        df_nccn = df_merged[["translocation", "Sample", "fusion_pairs"]].merge(
+            df_annotations[["marker", "oncotree"]],
+            left_on="translocation",
+            right_on="marker",
+            how="inner"
+        )
+        df_nccn = df_nccn[df_nccn["oncotree"] == oncotree_code]
+        df_nccn = df_nccn[list(columns.keys())].rename(columns=columns).reset_index(drop=True)
         return df_nccn
         
     def remove_self_fusions(self, df):
@@ -394,10 +412,8 @@ class prepare_fusions(logger):
         Removes fusions of the nature Fusion1-Fusion1
         ex. CDKN2A-CDKN2A
         """
-        df = df[~df["fusion_pairs"].apply(
-            lambda x: x.split("-")[0] == x.split("-")[1]
-            )
-        ]
+        genes = df["fusion_pairs"].str.split("-")
+        df = df[~(genes.str[0] == genes.str[1])]
         return df
 
     def reorder_fusions(self, df):
@@ -408,6 +424,7 @@ class prepare_fusions(logger):
         Re-order fusions so it's always 5' first.
         Don't care how reordering impacts Nones; these get filtered out later anyways
         """
+        import numpy as np
         # Make fusion_pairs but ensure 5' always comes first
         df["fusion_pairs_reordered"] = np.where(
             df["gene1_direction"] > df["gene2_direction"], # 5 > 3
@@ -422,6 +439,7 @@ class prepare_fusions(logger):
         Changes any event type with "translocation" to the actual translocation event.
         Changes any event type with "inversion" to the actual inversion event.
         """
+        import numpy as np
 
         # New column that simplifies entries that have multiple event types (ex. "inversion;duplication") with just "Undetermined"
         df["event_type_simple"] = np.where(
@@ -461,6 +479,7 @@ class prepare_fusions(logger):
         Anything else should be left as nan.
 
         """
+        import numpy as np
         
         df["reading_frame"] = df["reading_frame"].replace([".", ""], np.nan)
         df["reading_frame"] = df["reading_frame"].fillna("Unknown")
@@ -492,12 +511,18 @@ class prepare_fusions(logger):
         21
         0
         """
+        import pandas as pd
         columns = ["contig_remapped_reads", "flanking_pairs", "break1_split_reads", "break2_split_reads", "linking_split_reads"]
         for column in columns:
-            df[column] = df[column].astype(str).apply(
-              lambda x: int(max(
-                [float(i) if i not in ["None", "nan"] else 0 for i in x.split(';')]  
-            )))
+            if pd.api.types.is_numeric_dtype(df[column]):
+                # no None or semi-colon entries; only missing values to replace
+                values = df[column].fillna(0)
+            else:
+                # one column for each semi-colon separated value; missing, None and nan are 0
+                values = df[column].fillna("0").astype(str).str.split(';', expand=True)
+                values = values.mask(values.isin(["None", "nan"]), "0")
+                values = values.apply(pd.to_numeric).max(axis=1)
+            df[column] = values.astype(int)
         return df
 
     def write_fusion_files(self, df_mavis, df_arriba, oncotree_code):
@@ -555,13 +580,16 @@ class prepare_fusions(logger):
         The new delimiter is ::, but - is used for now as OncoKB requires it.
         It always orders it alphabetically.
         """
+        import numpy as np
         # First change all nans to the string None
         df[column1] = df[column1].replace({np.nan: None})
         df[column2] = df[column2].replace({np.nan: None})
     
         
-        # Make fusion tuples 
-        df["fusion_pairs"] = df.apply(lambda row: "-".join(sorted([str(row[column1]), str(row[column2])])), axis=1)
+        # Make fusion tuples, with genes in sorted order
+        gene1 = df[column1].where(df[column1].notna(), "None").astype(str)
+        gene2 = df[column2].where(df[column2].notna(), "None").astype(str)
+        df["fusion_pairs"] = np.where(gene1 <= gene2, gene1 + "-" + gene2, gene2 + "-" + gene1)
         return df 
 
 class FileNotFoundError(Exception):
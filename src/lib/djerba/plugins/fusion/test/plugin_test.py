@@ -13,6 +13,7 @@ import djerba.core.constants as constants
 from shutil import copy
 from djerba.plugins.plugin_tester import PluginTester
 from djerba.util.environment import directory_finder
+from djerba.plugins.fusion.preprocess import prepare_fusions
 from djerba.plugins.fusion.tools import whizbam_tools
 
 class TestFusion(PluginTester):
@@ -61,6 +62,25 @@ class TestFusion(PluginTester):
         self.assertEqual(compressed_output, expected_compressed_output,
                          f"Compression output does not match expected result.\nExpected: {expected_compressed_output}\nGot: {compressed_output}")
 
+    def test_find_breakpoints(self):
+        """Test lookup of Arriba breakpoints by unordered gene pair"""
+        arriba_path = os.path.join(self.work_dir, 'arriba.tsv')
+        with open(arriba_path, 'w') as arriba_file:
+            arriba_file.write("#gene1\tgene2\tbreakpoint1\tbreakpoint2\n")
+            arriba_file.write("BRAF\tSND1\tchr7:140787584\tchr7:127654321\n")
+            arriba_file.write("SND1\tBRAF\tchr7:127650000\tchr7:140780000\n")
+            arriba_file.write("MYC\tMYC\tchr8:127736000\tchr8:127737000\n")
+            arriba_file.write("MYC\tIGH\tchr8:127735000\tchr14:105586000\n")
+        index = whizbam_tools.read_breakpoint_index(arriba_path)
+        # first matching row, for either order of genes
+        for gene1, gene2 in [('SND1', 'BRAF'), ('BRAF', 'SND1')]:
+            breakpoints = whizbam_tools.find_breakpoints(index, gene1, gene2)
+            self.assertEqual(breakpoints, ('chr7:140787584', 'chr7:127654321'))
+        # as in a scan of the file, an earlier self-fusion row also matches
+        breakpoints = whizbam_tools.find_breakpoints(index, 'IGH', 'MYC')
+        self.assertEqual(breakpoints, ('chr8:127736000', 'chr8:127737000'))
+        self.assertEqual(whizbam_tools.find_breakpoints(index, 'BRAF', 'KRAS'), (None, None))
+
     def test_fusion(self):
         """Complete test for fusion plugin."""
         params = {
@@ -70,6 +90,36 @@ class TestFusion(PluginTester):
         }
         self.run_basic_test(self.input_dir, params, 'fusion', logging.ERROR, self.work_dir)
 
+    def test_preprocess_columns(self):
+        """Test column-wise transforms in fusion preprocessing"""
+        import pandas as pd
+        prep = prepare_fusions(self.work_dir)
+        df = pd.DataFrame({
+            "gene1_aliases": ["BRAF", "SND1", "CDKN2A", None],
+            "gene2_aliases": ["SND1", "BRAF", "CDKN2A", "MYC"],
+            "event_type": ["deletion", "inversion", "deletion", "translocation"],
+            "reading_frame": ["in-frame", None, None, None],
+            "contig_remapped_reads": ["21;6", "None", None, "3"],
+            "flanking_pairs": [0, 5, None, 2],
+            "break1_split_reads": ["0", "7", "None;2", None],
+            "break2_split_reads": [1, 1, 1, 1],
+            "linking_split_reads": [None, None, None, None]
+        })
+        df = prep.write_fusion_pairs(df, "gene1_aliases", "gene2_aliases")
+        self.assertEqual(
+            df["fusion_pairs"].tolist(),
+            ["BRAF-SND1", "BRAF-SND1", "CDKN2A-CDKN2A", "MYC-None"]
+        )
+        df = prep.split_column_take_max(df)
+        self.assertEqual(df["contig_remapped_reads"].tolist(), [21, 0, 0, 3])
+        self.assertEqual(df["flanking_pairs"].tolist(), [0, 5, 0, 2])
+        self.assertEqual(df["break1_split_reads"].tolist(), [0, 7, 2, 0])
+        self.assertEqual(df["linking_split_reads"].tolist(), [0, 0, 0, 0])
+        df = prep.remove_self_fusions(prep.drop_duplicates_merge_columns(df))
+        self.assertEqual(df["fusion_pairs"].tolist(), ["BRAF-SND1", "MYC-None"])
+        self.assertEqual(df["event_type"].tolist(), ["deletion;inversion", "translocation"])
+        self.assertEqual(df["reading_frame"].tolist(), ["in-frame", ""])
+
     def write_ini_file(self):
         provenance_path = os.path.join(self.data_dir, 'provenance_PANX_1391.tsv.gz')
         mavis_name = 'PANX_1391_Lv_M_100-NH-020_LCM3.mavis_summary.tab'
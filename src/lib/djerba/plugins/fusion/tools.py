@@ -2,6 +2,7 @@
 Utility classes for the fusions plugin
 """
 
+import copy
 import csv
 import logging
 import os
@@ -9,7 +10,6 @@ import re
 import zlib
 import base64
 import json
-import pandas as pd
 from djerba.util.logger import logger
 from djerba.util.oncokb.tools import levels as oncokb_levels
 import djerba.util.oncokb.constants as oncokb
@@ -22,6 +22,7 @@ from djerba.util.oncokb.tools import gene_summary_reader
 import djerba.plugins.fusion.constants as fc
 import djerba.core.constants as core_constants
 from djerba.util.subprocess_runner import subprocess_runner
+# pandas is slow to import, so it is imported by the methods which use it
 
 class fusion_tools(logger):
 
@@ -91,13 +92,18 @@ class fusion_tools(logger):
 
     def construct_whizbam_links(self, tsv_file_path, base_dir, fusion_dir, output_dir, json_template_path, unique_fusions, config, wrapper):
 
+        # Read inputs once for all fusions: Arriba breakpoints, JSON template, BAM/BAI tracks
+        breakpoint_index = whizbam_tools.read_breakpoint_index(tsv_file_path)
+        with open(json_template_path, 'r') as json_file:
+            template = json.load(json_file)
+        self.update_whizbam_tracks(template, wrapper)
+
         failed_fusions = 0
-        fusion_url_pairs = []
+        fusion_outputs = []
 
         for fusion in unique_fusions:
             try:
-                fusion, blurb_url = self.process_fusion(config, fusion, tsv_file_path, json_template_path, output_dir, wrapper)
-                fusion_url_pairs.append([fusion, blurb_url])
+                fusion_outputs.append(self.process_fusion(fusion, breakpoint_index, template, tsv_file_path))
 
             except FusionProcessingError as e:
                 self.logger.warning(f"Skipping fusion {fusion}: {e}")
@@ -106,18 +112,25 @@ class fusion_tools(logger):
         if failed_fusions > 0:
             self.logger.warning(f"{failed_fusions} fusions failed out of {len(unique_fusions)}.")
 
+        # Write the modified JSON for each fusion to the output directory
+        for fusion, json_content, blurb_url in fusion_outputs:
+            output_json_path = os.path.join(output_dir, f"{fusion}.json")
+            with open(output_json_path, 'w') as json_output_file:
+                json_output_file.write(json_content)
+
         # Save the fusion-URL pairs to a CSV file
         output_tsv_path = os.path.join(output_dir, 'fusion_blurb_urls.tsv')
         with open(output_tsv_path, 'w', newline='') as tsvfile:
             writer = csv.writer(tsvfile, delimiter='\t')
             writer.writerow(['Fusion', 'Whizbam URL'])
-            writer.writerows(fusion_url_pairs)
+            writer.writerows([[fusion, blurb_url] for fusion, json_content, blurb_url in fusion_outputs])
 
     def get_oncokb_annotated_df(self):
         """
         Get the oncokb df and turn it into a dataframe
         Only return those for which the mutation effect is not Unknown
         """
+        import pandas as pd
         df = pd.read_csv(os.path.join(self.work_dir, fc.DATA_FUSIONS_ANNOTATED), sep = "\t")
         if len(df) > 0:
             df = df[df.MUTATION_EFFECT != "Unknown"]
@@ -127,6 +140,7 @@ class fusion_tools(logger):
         """
         Get the fusions df and turn it into a dataframe
         """
+        import pandas as pd
         df = pd.read_csv(os.path.join(self.work_dir, fc.DATA_FUSIONS), sep = "\t")
         return df
 
@@ -134,6 +148,7 @@ class fusion_tools(logger):
         """
         Get the NCCN df and turn it into a dataframe
         """
+        import pandas as pd
         df = pd.read_csv(os.path.join(self.work_dir, fc.DATA_FUSIONS_NCCN), sep = "\t")
         df = df[~df["Fusion"].str.contains("None")]
         return df
@@ -321,7 +336,10 @@ class fusion_tools(logger):
                     treatment_opts.extend(treatment_opt)
         return rows, gene_info, treatment_opts
     
-    def process_fusion(self, config, fusion, tsv_file_path, json_template_path, output_dir, wrapper):
+    def process_fusion(self, fusion, breakpoint_index, template, tsv_file_path):
+        """
+        Make the Whizbam session for one fusion; return the fusion, session JSON, and blurb URL
+        """
 
         # Validate and parse the fusion format
         match = re.match(r"(.+)::(.+)", fusion)
@@ -332,7 +350,7 @@ class fusion_tools(logger):
         gene1, gene2 = match.groups()
 
         # Find breakpoints in the ARRIBA TSV file
-        breakpoint1, breakpoint2 = self.find_breakpoints(tsv_file_path, gene1, gene2)
+        breakpoint1, breakpoint2 = whizbam_tools.find_breakpoints(breakpoint_index, gene1, gene2)
         if not (breakpoint1 and breakpoint2):
             msg = f"No matching fusion found in the TSV file ({tsv_file_path}) for {fusion}."
             self.logger.error(msg)
@@ -342,13 +360,19 @@ class fusion_tools(logger):
         formatted_breakpoint1 = whizbam_tools.format_breakpoint(breakpoint1)
         formatted_breakpoint2 = whizbam_tools.format_breakpoint(breakpoint2)
 
-        # Load the JSON template
-        with open(json_template_path, 'r') as json_file:
-            data = json.load(json_file)
-
-        # Update the JSON with the formatted breakpoints
+        # Update a copy of the JSON template with the formatted breakpoints
+        data = copy.deepcopy(template)
         data['locus'] = [formatted_breakpoint1, formatted_breakpoint2]
 
+        # Compress JSON and generate blurb URL
+        json_content = json.dumps(data)
+        compressed_b64_data = whizbam_tools.compress_string(json_content)
+        blurb_url = f"https://whizbam.oicr.on.ca/igv?sessionURL=blob:{compressed_b64_data}"
+        return fusion, json_content, blurb_url
+
+    def update_whizbam_tracks(self, data, wrapper):
+        # Set the tumour BAM/BAI track in the JSON template; the same for all fusions
+
         project_id = wrapper.get_my_string(core_constants.PROJECT)
         tumour_id = wrapper.get_my_string(core_constants.TUMOUR_ID)
         whizbam_project_id = wrapper.get_my_string(fc.WHIZBAM_PROJECT)
@@ -386,29 +410,34 @@ class fusion_tools(logger):
             bai_filename = os.path.basename(bai_file)
             data['tracks'][1]['indexURL'] = f"/bams/project/{bai_project}/RNASEQ/file/{bai_filename}"
 
-        # Write the modified JSON to the output directory
-        output_json_path = os.path.join(output_dir, f"{fusion}.json")
-        with open(output_json_path, 'w') as json_output_file:
-            json.dump(data, json_output_file)
+class whizbam_tools:
 
-        # Compress JSON and generate blurb URL
-        with open(output_json_path, 'r') as json_output_file:
-            json_content = json_output_file.read()
-        compressed_b64_data = whizbam_tools.compress_string(json_content)
-        blurb_url = f"https://whizbam.oicr.on.ca/igv?sessionURL=blob:{compressed_b64_data}"
-        return fusion, blurb_url
+    @staticmethod
+    def find_breakpoints(breakpoint_index, gene1, gene2):
+        # Find breakpoints for the given fusion genes in the arriba index
+        # As in a scan of the file, use the first row with both genes in {gene1, gene2};
+        # this includes a row with either gene fused to itself
+        keys = [frozenset([gene1, gene2]), frozenset([gene1]), frozenset([gene2])]
+        matches = [breakpoint_index[key] for key in keys if key in breakpoint_index]
+        if matches:
+            row_number, breakpoint1, breakpoint2 = min(matches)
+            return breakpoint1, breakpoint2
+        return None, None
 
-    def find_breakpoints(self, tsv_file_path, gene1, gene2):
-        # Find breakpoints for the given fusion genes in the arriba file
+    @staticmethod
+    def read_breakpoint_index(tsv_file_path):
+        """
+        Read the arriba file once; index breakpoints by the unordered pair of gene names
+        Values are (row number, breakpoint1, breakpoint2) for the first row with each pair
+        """
+        breakpoint_index = {}
         with open(tsv_file_path, mode='r') as file:
             reader = csv.DictReader(file, delimiter='\t')
-            for row in reader:
-                if (row['#gene1'] == gene1 or row['#gene1'] == gene2) and (
-                        row['gene2'] == gene1 or row['gene2'] == gene2):
-                    return row['breakpoint1'], row['breakpoint2']
-        return None, None
-
-class whizbam_tools:
+            for row_number, row in enumerate(reader):
+                key = frozenset([row['#gene1'], row['gene2']])
+                if key not in breakpoint_index:
+                    breakpoint_index[key] = (row_number, row['breakpoint1'], row['breakpoint2'])
+        return breakpoint_index
 
     @staticmethod
     def format_breakpoint(breakpoint):
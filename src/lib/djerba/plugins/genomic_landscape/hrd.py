@@ -4,6 +4,7 @@ import json
 import os
 
 from djerba.util.logger import logger
+from djerba.util.reference_data import reference_data
 from djerba.util.subprocess_runner import subprocess_runner
 from djerba.util.validator import path_validator
 
@@ -31,7 +32,7 @@ class hrd_processor(logger):
             # Catch unknown oncotree code. 
             try:
                 oncotree_main = self.read_oncotree_main_type(oncotree_code, oncotree_dir)
-            except IndexError:
+            except KeyError:
                  msg = "Could not find oncotree code {0} in OncoTree.json. Skipping treatment options for HRD.".format(oncotree_code)
                  self.logger.warning(msg)
                  return treatment_options 
@@ -56,23 +57,6 @@ class hrd_processor(logger):
                         }
         return treatment_options
 
-    def find_main_value_from_tree(self, oncotree_code, json_as_text):
-        """
-        Look in JSON and return sub-dictionaries that contain that oncotree_code
-        There may be a simpler way to do this (without the object_hook), but this works for now
-        """
-        tree_info_on_this_code = []
-        oncotree_code = oncotree_code.upper()
-        def _decode_dict(a_dict):
-            try:
-                tree_info_on_this_code.append(a_dict[oncotree_code])
-            except KeyError:
-                pass
-            return a_dict
-        json.loads(json_as_text, object_hook=_decode_dict)
-        mainType = tree_info_on_this_code.pop()['mainType']
-        return mainType
-
     def make_HRD_plot(self, output_dir):
         args = [
             os.path.join(os.path.dirname(__file__),'Rscripts/hrd_plot.R'),
@@ -85,10 +69,11 @@ class hrd_processor(logger):
     def read_oncotree_main_type(self, oncotree_code, data_dir):
         """
         Read Oncotree JSON file and return main type for given code
+        Raises KeyError if the code is not found
         """
-        with open(os.path.join(data_dir, self.ONCOTREE_FILE)) as tree_file:
-            json_as_text = tree_file.read()
-        mainType = self.find_main_value_from_tree(oncotree_code, json_as_text)
+        ref_data = reference_data(self.log_level, self.log_path)
+        tree_index = ref_data.get_oncotree_index(os.path.join(data_dir, self.ONCOTREE_FILE))
+        mainType = tree_index[oncotree_code.upper()]['mainType']
         return(mainType)
 
     def run(self, work_dir, hrd_path):
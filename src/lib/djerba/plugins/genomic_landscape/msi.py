@@ -6,8 +6,6 @@ List of functions to convert MSI information into json format.
 import csv
 import os
 
-import numpy
-
 import djerba.plugins.genomic_landscape.constants as constants
 from djerba.util.image_to_base64 import converter
 from djerba.util.logger import logger
@@ -43,6 +41,7 @@ class msi_processor(logger):
         """
           summarize msisensor file
           """
+        import numpy # slow to import, so only import when needed
         out_path = os.path.join(work_dir, 'msi.txt')
         msi_boots = []
         self.validator.validate_output_dir(work_dir)
@@ -5,7 +5,6 @@ import djerba.plugins.genomic_landscape.constants as constants
 from djerba.util.image_to_base64 import converter
 from djerba.util.logger import logger
 from djerba.util.subprocess_runner import subprocess_runner
-from statsmodels.distributions.empirical_distribution import ECDF
 
 
 class tmb_processor(logger):
@@ -76,6 +75,8 @@ class tmb_processor(logger):
         # We use statsmodels to compute the ECDF
         # See: https://stackoverflow.com/a/15792672
         # Introduces dependency on Pandas, but still the most convenient solution
+        # statsmodels is slow to import, so import it only when needed
+        from statsmodels.distributions.empirical_distribution import ECDF
         if cohort == constants.NA:
             percentile = constants.NA
         else:
@@ -126,6 +127,7 @@ class tmb_processor(logger):
         return fga
 
     def read_pan_cancer_percentile(self, data_dir, tmb):
+        from statsmodels.distributions.empirical_distribution import ECDF
         tmb_array = []
         with open(os.path.join(data_dir, constants.TMBCOMP_TCGA)) as data_file:
             for row in csv.DictReader(data_file, delimiter="\t"):
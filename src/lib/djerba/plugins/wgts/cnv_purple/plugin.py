@@ -12,6 +12,7 @@ from djerba.helpers.input_params_helper.helper import main as iph
 from djerba.plugins.base import plugin_base, DjerbaPluginError
 from djerba.plugins.wgts.cnv_purple.legacy_tools import cnv_processor
 from djerba.plugins.wgts.cnv_purple.purple_tools import purple_processor
+from djerba.util.archive import zip_archive
 from djerba.util.oncokb.annotator import annotator_factory
 from djerba.util.render_mako import mako_renderer
 
@@ -59,22 +60,27 @@ class main(plugin_base):
         self.logger.debug("Starting purple data processing")
         plot9_verbose = wrapper.get_my_boolean(pc.PLOTNINE_VERBOSE)
         processor = purple_processor(work_dir, self.log_level, self.log_path, plot9_verbose)
-        self.logger.debug("Extracting files from ZIP archive")
-        purple_files = processor.unzip_purple(wrapper.get_my_string(pc.PURPLE_ZIP))
+        self.logger.debug("Finding files in ZIP archive")
+        archive = zip_archive(wrapper.get_my_string(pc.PURPLE_ZIP), self.log_level, self.log_path)
+        purple_files = processor.find_purple_members(archive)
         self.logger.debug("Evaluating purity fit")
-        processor.consider_purity_fit(purple_files[pc.PURPLE_PURITY_RANGE])
+        with archive.open_text(purple_files[pc.PURPLE_PURITY_RANGE]) as range_file:
+            processor.consider_purity_fit(range_file)
         self.logger.debug("Converting data format")
-        processor.convert_purple_to_gistic(purple_files[pc.PURPLE_GENE], tumour_id, ploidy)
+        with archive.open_text(purple_files[pc.PURPLE_GENE]) as gene_file:
+            processor.convert_purple_to_gistic(gene_file, tumour_id, ploidy)
         self.logger.debug("Analyzing genome segments")
         whizbam_link = processor.construct_whizbam_link(
             wrapper.get_my_string(pc.WHIZBAM_PROJECT),
             tumour_id,
         )
-        cnv_plot_base64 = processor.analyze_segments(purple_files[pc.PURPLE_CNV],
-                                                     purple_files[pc.PURPLE_SEG],
-                                                     whizbam_link,
-                                                     purity_ploidy[pc.PURITY],
-                                                     ploidy)
+        with archive.open_text(purple_files[pc.PURPLE_CNV]) as cnv_file, \
+             archive.open_text(purple_files[pc.PURPLE_SEG]) as segment_file:
+            cnv_plot_base64 = processor.analyze_segments(cnv_file,
+                                                         segment_file,
+                                                         whizbam_link,
+                                                         purity_ploidy[pc.PURITY],
+                                                         ploidy)
         processor.write_copy_states(tumour_id)
 
         # write alternate solutions launcher JSON
@@ -5,25 +5,14 @@ AUTHOR: Felix Beaudry
 
 import csv
 import json
-import lets_plot as lp
 import logging
-import matplotlib.colors as mcolors
-import matplotlib.pyplot as plt
-import numpy as np
 import os
-import pandas as pd
 import re
-import tempfile
-import zipfile
-from scipy.stats import norm
-from plotnine import *
-from matplotlib import gridspec
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.colors import LinearSegmentedColormap
+# pandas, numpy, matplotlib, scipy and plotnine are slow to import, so they are imported by
+# the methods which use them; this keeps startup fast for modes which do not need them
 
 import djerba.plugins.wgts.cnv_purple.constants as pc
+from djerba.util.archive import zip_archive
 from djerba.util.logger import logger
 from djerba.util.environment import directory_finder
 from djerba.util.image_to_base64 import converter
@@ -43,6 +32,10 @@ class purple_processor(logger):
 
     # rewrite analyze_segments in python
     def analyze_segments(self, cnvfile, segfile, whizbam_url, purity, ploidy):
+        import numpy as np
+        import pandas as pd
+        from plotnine import aes, element_blank, element_text, facet_grid, geom_hline, geom_point, \
+            geom_segment, geom_vline, ggplot, guides, labs, scale_y_continuous, theme, theme_bw
         centromeres_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), pc.CENTROMERES)
         genebedpath = os.path.join(self.data_dir, pc.GENEBED)
         self.look_at_purity_fit(segfile, purity = purity)
@@ -67,12 +60,14 @@ class purple_processor(logger):
         genes_MACN = log2.copy()
         genes_MACN["seg_mean"] = segs["minorAlleleCopyNumber"]
         gene_info = pd.read_csv(genebedpath, sep="\t")
-        CN_table = self.pre_proc_loh(genes_MACN, gene_info)
+        # segments overlapping each gene are the same for MACN and CN; find them once
+        overlaps = self.get_gene_overlaps(log2, gene_info)
+        CN_table = self.pre_proc_loh(genes_MACN, gene_info, overlaps)
 
-        # Convert chromosomes to genes and display their MACN
+        # Convert chromosomes to genes and display their CN
         genes_CN = log2.copy()
         genes_CN["seg_mean"] = segs["copyNumber"]
-        genes_CN = self.pre_proc_loh(genes_CN, gene_info)
+        genes_CN = self.pre_proc_loh(genes_CN, gene_info, overlaps)
 
         # Put the tables together to output a table with genes, MACN, CN
         CN_table["local_cn"] = genes_CN["b_allele"]
@@ -163,6 +158,10 @@ class purple_processor(logger):
         return b64txt
 
     def consider_purity_fit(self, purple_range_file):
+        import matplotlib.colors as mcolors
+        import matplotlib.pyplot as plt
+        import numpy as np
+        import pandas as pd
         range_df = pd.read_csv(purple_range_file, sep="\t", comment='!')
         output = os.path.join(self.work_dir, "purple.range.png")
         
@@ -252,6 +251,7 @@ class purple_processor(logger):
 
     @staticmethod
     def allele_deviation(purity, norm_factor, ploidy, standard_deviation = 0.05, min_standard_deviation_per_ploidy_point = 1.5):
+        from scipy.stats import norm
         ploidy_distance_from_integer = 0.5
         if ploidy >= -0.5:
             ploidy_distance_from_integer = abs(ploidy - round(ploidy))
@@ -263,6 +263,8 @@ class purple_processor(logger):
         """
         Take segment information and turn into chromosome arm level AMP/DEL calls, assuming $seg.perc.threshold is AMP'd or DEL'd
         """
+        import numpy as np
+        import pandas as pd
         segs["seg_length"] = segs["end"] - segs["start"]
         ## roughly estimate centromere position 
         ## b/c the annotation has several centromeric regions
@@ -360,7 +362,46 @@ class purple_processor(logger):
 
         return 1 + ploidy_penalty_factor * min(single_event_distance, whole_genome_doubling_distance)
     
+    def get_gene_overlaps(self, segments, genebed):
+        """
+        Find segments which overlap each gene, with inclusive coordinates
+        Returns arrays of row positions in genebed and segments, for each overlapping pair
+        On each chromosome, segments are sorted by start, with a running maximum of ends;
+        so candidates for all genes are found at once by binary search
+        """
+        import numpy as np
+        segment_chrom = segments["chrom"].astype(str).str.replace("chr", "").to_numpy()
+        segment_start = segments["loc_start"].to_numpy()
+        segment_end = segments["loc_end"].to_numpy()
+        gene_chrom = genebed["chrom"].astype(str).to_numpy()
+        gene_start = genebed["start"].to_numpy()
+        gene_end = genebed["end"].to_numpy()
+        gene_parts = [np.array([], dtype=int)]
+        segment_parts = [np.array([], dtype=int)]
+        for chrom in np.unique(gene_chrom):
+            genes = np.flatnonzero(gene_chrom == chrom)
+            chrom_segments = np.flatnonzero(segment_chrom == chrom)
+            chrom_segments = chrom_segments[np.argsort(segment_start[chrom_segments], kind='stable')]
+            max_ends = np.maximum.accumulate(segment_end[chrom_segments])
+            # candidates have start <= gene end, and some earlier segment has end >= gene start
+            low = np.searchsorted(max_ends, gene_start[genes], side='left')
+            high = np.searchsorted(segment_start[chrom_segments], gene_end[genes], side='right')
+            counts = np.maximum(high - low, 0)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            gene_index = np.repeat(genes, counts)
+            segment_index = chrom_segments[np.repeat(low, counts) + offsets]
+            # with overlapping segments, not every candidate overlaps the gene
+            overlap = segment_end[segment_index] >= gene_start[gene_index]
+            gene_parts.append(gene_index[overlap])
+            segment_parts.append(segment_index[overlap])
+        return np.concatenate(gene_parts), np.concatenate(segment_parts)
+
     def look_at_purity_fit(self, segment_file, purity):
+        import matplotlib.pyplot as plt
+        import numpy as np
+        import pandas as pd
+        from matplotlib import gridspec
+        from matplotlib.colors import LinearSegmentedColormap
 
         fitted_segments_df = pd.read_csv(segment_file, sep="\t", comment="!")
 
@@ -493,6 +534,7 @@ class purple_processor(logger):
 
     
     def major_allele_deviation(self, purity, norm_factor, ploidy, baseline_deviation, major_allele_sub_one_penalty_multiplier = 1 ):
+        import numpy as np
         major_allele_multiplier =1
         if (ploidy >= 0) & (ploidy <= 1):
             major_allele_multiplier = np.maximum(1, major_allele_sub_one_penalty_multiplier * (1-ploidy))
@@ -506,6 +548,7 @@ class purple_processor(logger):
         return max(deviation, baseline_devitation)
     
     def pre_process_CNA(self, purple_gene_file, oncolistpath, tumour_id, ploidy, ploidy_multiplier=2.4):
+        import pandas as pd
         oncolist = pd.read_csv(oncolistpath, sep="\t")
         raw_gene_data = pd.read_csv(purple_gene_file, sep="\t")
         
@@ -526,11 +569,20 @@ class purple_processor(logger):
 
         return df_cna_thresh, df_cna_thresh_onco_nondiploid
     
-    def pre_proc_loh(self, segments, genebed):
-        segments["chrom"] = segments["chrom"].str.replace("chr", "")
-        segments["ID"] = "b_allele"
-        genebed["b_allele"] = genebed.apply(lambda row: np.min(segments[(segments['chrom'] == row['chrom']) & (segments['loc_start'] <= row['end']) & (segments['loc_end'] >= row['start'])]["seg_mean"]), axis=1)
-        a_allele = genebed[["genename", "b_allele"]].copy()
+    def pre_proc_loh(self, segments, genebed, overlaps=None):
+        """
+        Find the minimum seg_mean of segments overlapping each gene; NaN if there are none
+        overlaps is output from get_gene_overlaps, if already known for the segments
+        """
+        import pandas as pd
+        if overlaps is None:
+            overlaps = self.get_gene_overlaps(segments, genebed)
+        gene_index, segment_index = overlaps
+        values = pd.Series(segments["seg_mean"].to_numpy()[segment_index])
+        # minimum skips NaN values, as for the previous row-by-row lookup
+        minimum = values.groupby(gene_index).min().reindex(range(len(genebed)))
+        a_allele = genebed[["genename"]].copy()
+        a_allele["b_allele"] = minimum.to_numpy()
 
         return a_allele
     
@@ -538,6 +590,7 @@ class purple_processor(logger):
         """
         Add some columns to the centromere file so it plots pretty in CNV track
         """
+        import numpy as np
         centromeres[['blank','chr']] = centromeres['chrom'].str.split('chr',expand=True)
         chromosomes_incl = list(map(str, range(1,23))) + ["X"]
         centromeres["Chr"] = np.where(centromeres["chr"].isin(chromosomes_incl), centromeres["chr"], np.nan)
@@ -553,6 +606,7 @@ class purple_processor(logger):
         return centromeres_sub
 
     def purity_data_frame(self, mat, ploidy):
+        import pandas as pd
         df = pd.DataFrame(mat)
         df.insert(0, 'MajorAllele', ploidy)
         column_names = ploidy.tolist()
@@ -563,6 +617,7 @@ class purple_processor(logger):
         return df_long
     
     def purity_matrix(self, purity, ploidy, baseline_deviation = 0.1):
+        import numpy as np
         result_matrix = np.full(shape=(len(ploidy), len(ploidy)),fill_value=np.nan)
   
         for i in range(len(ploidy)):
@@ -575,21 +630,15 @@ class purple_processor(logger):
         return result_matrix
 
     def read_purity_ploidy(self, purple_zip):
-        tempdir = tempfile.TemporaryDirectory()
-        tmp = tempdir.name
-        zf = zipfile.ZipFile(purple_zip)
-        name_list = [x for x in zf.namelist() if not re.search('/$', x)]
-        purple_purity_path = None
-        for name in name_list:
-            if re.search(r'purple\.purity\.tsv$', name):
-                purple_purity_path = zf.extract(name, tmp)
-                break
-        if purple_purity_path is None:
+        archive = zip_archive(purple_zip, self.log_level, self.log_path)
+        name = archive.find_name(r'purple\.purity\.tsv$')
+        if name is None:
             msg = 'Cannot find purity file in ZIP archive {0}'.format(purple_zip)
             self.logger.error(msg)
             raise RuntimeError(msg)
-        self.logger.debug('Extracted purity/ploidy to {0}'.format(purple_purity_path))
-        with open(purple_purity_path, 'r') as purple_purity_file:
+        purple_purity_path = archive.get_path(name)
+        self.logger.debug('Reading purity/ploidy from {0}'.format(purple_purity_path))
+        with archive.open_text(name) as purple_purity_file:
             lines = purple_purity_file.readlines()
         if len(lines) != 2:
             msg = "Data format error: Expected 2 lines in purity/ploidy "+\
@@ -614,7 +663,6 @@ class purple_processor(logger):
             pc.PURITY: purity,
             pc.PLOIDY: ploidy
         }
-        tempdir.cleanup()
         return purity_ploidy
 
     def single_event_distance_calculator(self, major_allele, minor_allele):
@@ -627,19 +675,21 @@ class purple_processor(logger):
 
         return min(major_allele_sub_one_additional_penalty, max(penalty, 0))
     
-    def unzip_purple(self, purple_zip):
-        zf = zipfile.ZipFile(purple_zip)
-        name_list = [x for x in zf.namelist() if not re.search('/$', x)]
+    def find_purple_members(self, archive):
+        """
+        Find names of PURPLE output files in a zip_archive, indexed by file type
+        Files are read from the archive as streams, without extracting to disk
+        """
         purple_files = {}
-        for name in name_list:
+        for name in archive.get_names():
             if re.search(r'purple\.purity\.range\.tsv$', name):
-                purple_files[pc.PURPLE_PURITY_RANGE] = zf.extract(name, self.work_dir)
+                purple_files[pc.PURPLE_PURITY_RANGE] = name
             elif re.search(r'purple\.cnv\.somatic\.tsv$', name):
-                purple_files[pc.PURPLE_CNV] = zf.extract(name, self.work_dir)
+                purple_files[pc.PURPLE_CNV] = name
             elif re.search(r'purple\.segment\.tsv$', name):
-                purple_files[pc.PURPLE_SEG] = zf.extract(name, self.work_dir)
+                purple_files[pc.PURPLE_SEG] = name
             elif re.search(r'purple\.cnv\.gene\.tsv$', name):
-                purple_files[pc.PURPLE_GENE] = zf.extract(name, self.work_dir)
+                purple_files[pc.PURPLE_GENE] = name
         return purple_files
 
     def whole_genome_doubling_distance_calculator(self, major_allele, minor_allele):
@@ -5,15 +5,20 @@ Test of the WGTS small plugin
 AUTHOR: Felix Beaudry
 """
 
+import logging
 import os
 import unittest
 import tempfile
 import string
+import zipfile
 
 from djerba.util.validator import path_validator
 from djerba.plugins.plugin_tester import PluginTester
+import djerba.plugins.wgts.cnv_purple.constants as pc
 import djerba.plugins.wgts.cnv_purple.plugin as cnv
+from djerba.plugins.wgts.cnv_purple.purple_tools import purple_processor
 from djerba.core.workspace import workspace
+from djerba.util.archive import zip_archive
 from djerba.util.environment import directory_finder
 
 class TestPurplePlugin(PluginTester):
@@ -44,6 +49,60 @@ class TestPurplePlugin(PluginTester):
         }
         self.run_basic_test(input_dir, params)
 
+    def testLohOverlaps(self):
+        # compare with the row-by-row lookup previously used by pre_proc_loh
+        import numpy as np
+        import pandas as pd
+        genebed_path = os.path.join(directory_finder().get_data_dir(), pc.GENEBED)
+        genebed = pd.read_csv(genebed_path, sep="\t").sample(500, random_state=42)
+        genebed = genebed.reset_index(drop=True)
+        rng = np.random.default_rng(42)
+        rows = []
+        for chrom in ['chr{0}'.format(x) for x in list(range(1, 23))+['X']]:
+            ends = np.sort(rng.choice(250000000, 41, replace=False))
+            for i in range(40):
+                value = rng.choice([np.nan, 0.0, 1.0, 2.5])
+                rows.append([chrom, ends[i]+1, ends[i+1], value])
+        # overlapping segments, and one on a chromosome with no genes
+        rows.extend([['chr1', 1, 30000000, 0.25], ['chr2', 5000000, 6000000, -1.0]])
+        rows.append(['chrUn', 1, 1000, 3.0])
+        segments = pd.DataFrame(rows, columns=['chrom', 'loc_start', 'loc_end', 'seg_mean'])
+        expected = []
+        for (i, gene) in genebed.iterrows():
+            overlap = segments[(segments['chrom'].str.replace('chr', '') == gene['chrom']) & \
+                               (segments['loc_start'] <= gene['end']) & \
+                               (segments['loc_end'] >= gene['start'])]
+            expected.append(np.min(overlap['seg_mean']))
+        proc = purple_processor(self.get_tmp_dir(), log_level=logging.ERROR)
+        result = proc.pre_proc_loh(segments, genebed)
+        self.assertEqual(list(result.columns), ['genename', 'b_allele'])
+        self.assertEqual(result['genename'].tolist(), genebed['genename'].tolist())
+        np.testing.assert_array_equal(result['b_allele'].to_numpy(), np.array(expected))
+        self.assertTrue(result['b_allele'].isna().any())
+        self.assertFalse(result['b_allele'].isna().all())
+
+    def testReadPurpleArchive(self):
+        # files are found and read from the ZIP archive, without extracting to disk
+        zip_path = os.path.join(self.get_tmp_dir(), 'purple.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            zf.writestr('purple/', '')
+            zf.writestr('purple/T.purple.purity.tsv', "purity\tploidy\tscore\n0.62\t3.1\t0.5\n")
+            zf.writestr('purple/T.purple.purity.range.tsv', "purity\tploidy\tscore\n0.62\t3.1\t0.5\n")
+            zf.writestr('purple/T.purple.cnv.somatic.tsv', "chromosome\n")
+            zf.writestr('purple/T.purple.segment.tsv', "chromosome\n")
+            zf.writestr('purple/T.purple.cnv.gene.tsv', "gene\n")
+        work_dir = os.path.join(self.get_tmp_dir(), 'work')
+        os.mkdir(work_dir)
+        proc = purple_processor(work_dir, log_level=logging.ERROR)
+        purity_ploidy = proc.read_purity_ploidy(zip_path)
+        self.assertEqual(purity_ploidy, {pc.PURITY: 0.62, pc.PLOIDY: 3.1})
+        purple_files = proc.find_purple_members(zip_archive(zip_path))
+        self.assertEqual(purple_files[pc.PURPLE_PURITY_RANGE], 'purple/T.purple.purity.range.tsv')
+        self.assertEqual(purple_files[pc.PURPLE_CNV], 'purple/T.purple.cnv.somatic.tsv')
+        self.assertEqual(purple_files[pc.PURPLE_SEG], 'purple/T.purple.segment.tsv')
+        self.assertEqual(purple_files[pc.PURPLE_GENE], 'purple/T.purple.cnv.gene.tsv')
+        self.assertEqual(os.listdir(work_dir), [])
+
     def redact_json_data(self, data):
         """replaces empty method from testing.tools"""
         for key in ['cnv plot']:
@@ -92,6 +92,7 @@ WHIZBAM_ALL = 'whizbam_all.txt'
 WHIZBAM_ONCOGENIC = 'whizbam_oncogenic.txt'
 MUTATIONS_ALL = 'data_mutations_extended.txt'
 MUTATIONS_ONCOGENIC = 'data_mutations_extended_oncogenic.txt'
+FILTERED_MAF = 'filtered_maf.tsv'
 WHIZBAM_TEMPLATE = 'whizbam_template.html'
 
 # output keys
@@ -89,9 +89,9 @@ class main(plugin_base):
             self.GENOME
         )
         proc = snv_indel_processor(self.workspace, wrapper, self.log_level, self.log_path)
-        proc.write_working_files(whizbam_url)
-        data['results'] = proc.get_results()
-        data['merge_inputs'] = proc.get_merge_inputs()
+        snv_data = proc.write_working_files(whizbam_url)
+        data['results'] = proc.get_results(snv_data)
+        data['merge_inputs'] = proc.get_merge_inputs(snv_data)
         return data
 
     def render(self, data):
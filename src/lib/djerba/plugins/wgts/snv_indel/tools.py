@@ -6,13 +6,12 @@ import os
 import re
 import csv
 import gzip
+import io
+import itertools
 import json
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.ticker import PercentFormatter
-import seaborn as sns
-import numpy as np
 import logging
+# pandas, numpy, matplotlib and seaborn are slow to import, so they are imported by the
+# methods which use them; this keeps startup fast for modes which do not need them
 import djerba.core.constants as core_constants
 import djerba.plugins.wgts.cnv_purple.legacy_constants as cnv_constants
 import djerba.plugins.wgts.snv_indel.constants as sic
@@ -26,6 +25,7 @@ from djerba.util.logger import logger
 from djerba.util.oncokb.annotator import annotator_factory
 from djerba.util.oncokb.tools import levels as oncokb_levels
 from djerba.util.oncokb.tools import gene_summary_reader
+from djerba.util.reference_data import reference_data
 from djerba.util.subprocess_runner import subprocess_runner
 from djerba.util.variant_sorter import variant_sorter
 
@@ -63,52 +63,56 @@ class snv_indel_processor(logger):
         self.config = config_wrapper
         self.data_dir = directory_finder(log_level, log_path).get_data_dir()
 
-    def _maf_body_row_ok(self, row, ix, vaf_cutoff):
+    # rows per chunk for MAF preprocessing; bounds memory use for large WGS MAFs
+    MAF_CHUNK_SIZE = 100000
+
+    def _get_maf_filter(self, df, vaf_cutoff):
         """
-        Should a MAF row be kept for output?
+        Which MAF rows should be kept for output? Returns a boolean Series for the DataFrame
         Implements logic from functions.sh -> hard_filter_maf() in CGI-Tools
         Expected to filter out >99.9% of input reads
-        ix is a dictionary of column indices
         """
-        ok = False
-        row_t_depth = int(row[ix.get(sic.T_DEPTH)])
-        alt_count_raw = row[ix.get(sic.T_ALT_COUNT)]
-        gnomad_af_raw = row[ix.get(sic.GNOMAD_AF)]
-        biotype = row[ix.get(sic.BIOTYPE)]
-        row_t_alt_count = float(alt_count_raw) if alt_count_raw!='' else 0.0
-        row_gnomad_af = float(gnomad_af_raw) if gnomad_af_raw!='' else 0.0
-        is_matched = row[ix.get(sic.MATCHED_NORM_SAMPLE_BARCODE)] != 'unmatched'
-        filter_flags = re.split(';', row[ix.get(sic.FILTER)])
-        var_class = row[ix.get(sic.VARIANT_CLASSIFICATION)]
-        tert_hotspot = self.is_tert_hotspot(row, ix)
-        hugo_symbol = row[ix.get(sic.HUGO_SYMBOL)]
-        if row_t_depth >= 1 and \
-           row_t_alt_count >= 3 and \
-           row_t_alt_count/row_t_depth >= vaf_cutoff and \
-           (is_matched or row_gnomad_af < self.MAX_UNMATCHED_GNOMAD_AF) and \
-           biotype == "protein_coding" and \
-           var_class in sic.MUTATION_TYPES_EXONIC and \
-           not any([z in sic.FILTER_FLAGS_EXCLUDE for z in filter_flags]) and \
-           not (var_class == "5'Flank" and hugo_symbol != 'TERT'):
-            ok = True
-            if hugo_symbol == 'TERT' and not tert_hotspot:
-                ok = False
+        t_depth = df[sic.T_DEPTH]
+        t_alt_count = df[sic.T_ALT_COUNT].fillna(0.0)
+        gnomad_af = df[sic.GNOMAD_AF].fillna(0.0)
+        is_matched = df[sic.MATCHED_NORM_SAMPLE_BARCODE] != 'unmatched'
+        flags = '|'.join([re.escape(x) for x in sic.FILTER_FLAGS_EXCLUDE])
+        filter_flags = '(?:^|;)(?:{0})(?:;|$)'.format(flags)
+        is_excluded = df[sic.FILTER].str.contains(filter_flags, regex=True)
+        var_class = df[sic.VARIANT_CLASSIFICATION]
+        is_tert = df[sic.HUGO_SYMBOL] == 'TERT'
+        # depth is checked first, so the VAF is only used where depth is nonzero
+        ok = (t_depth >= 1) & \
+            (t_alt_count >= 3) & \
+            (t_alt_count/t_depth.where(t_depth >= 1) >= vaf_cutoff) & \
+            (is_matched | (gnomad_af < sic.MAX_UNMATCHED_GNOMAD_AF)) & \
+            (df[sic.BIOTYPE] == "protein_coding") & \
+            var_class.isin(sic.MUTATION_TYPES_EXONIC) & \
+            ~is_excluded & \
+            ~((var_class == "5'Flank") & ~is_tert) & \
+            ~(is_tert & ~self.is_tert_hotspot(df))
         return ok
 
-    def _read_maf_indices(self, row):
-        indices = {}
-        for i in range(len(row)):
-            key = row[i]
-            if key in sic.MAF_KEYS:
-                indices[key] = i
-        if set(indices.keys()) != set(sic.MAF_KEYS):
-            msg = "Indices found in MAF header {0} ".format(indices.keys()) +\
+    def _read_maf_header(self, in_file):
+        """Read column headers from an open MAF, omitting any version header lines"""
+        for line in in_file:
+            if not re.match('#version', line):
+                header = next(csv.reader([line], delimiter="\t"))
+                break
+        else:
+            msg = "No column headers found in MAF input"
+            self.logger.error(msg)
+            raise RuntimeError(msg)
+        missing = set(sic.MAF_KEYS) - set(header)
+        if len(missing) > 0:
+            msg = "Indices found in MAF header {0} ".format(header) +\
                     "do not match required keys {0}".format(sic.MAF_KEYS)
             self.logger.error(msg)
             raise RuntimeError(msg)
-        return indices
+        return header
 
     def add_vaf_to_maf(self, maf_df, alt_col, dep_col, vaf_header):
+        import pandas as pd
         # print a warning if any values are missing (shouldn't happen), but change them to 0
         vaf_df = maf_df.copy()
         if vaf_df[alt_col].isna().any() or vaf_df[dep_col].isna().any():
@@ -132,11 +136,17 @@ class snv_indel_processor(logger):
 
         return vaf_df
     
-    def annotate_maf(self, maf_path):
+    def annotate_maf(self, header, rows, maf_path=None):
+        """
+        Annotate MAF rows in memory; maf_path is a file with the same rows, if any
+        Returns the annotated header and rows
+        """
         factory = annotator_factory(self.log_level, self.log_path)
-        return factory.get_annotator(self.work_dir, self.config).annotate_maf(maf_path)
+        annotator = factory.get_annotator(self.work_dir, self.config)
+        return annotator.annotate_maf_rows(header, rows, maf_path)
 
     def compute_loh(self, df, cn_file, purity):
+        import pandas as pd
         self.logger.info("Computing LOH")
         cn = pd.read_csv(cn_file, sep="\t")
         calc_df = pd.merge(df[["Hugo_Symbol", "tumour_vaf"]], cn, on="Hugo_Symbol")
@@ -168,59 +178,56 @@ class snv_indel_processor(logger):
             vaf_plot = None
         return vaf_plot
 
-    def get_merge_inputs(self):
+    def get_merge_inputs(self, snv_data):
         """
-        Read gene and therapy information for merge inputs
-        Both are derived from the annotated mutations file
+        Find gene and therapy information for merge inputs
+        Both are derived from the annotated oncogenic mutations
         """
-        # read the tab-delimited input file
         gene_info = []
         gene_info_factory = gim_factory(self.log_level, self.log_path)
         summaries = gene_summary_reader(self.log_level, self.log_path)
         treatments = []
         treatment_option_factory = tom_factory(self.log_level, self.log_path)
         oncotree_code = self.config.get_my_string(sic.ONCOTREE_CODE)
-        with open(os.path.join(self.work_dir, sic.MUTATIONS_ONCOGENIC)) as input_file:
-            reader = csv.DictReader(input_file, delimiter="\t")
-            for row_input in reader:
-                # record the gene for all reportable alterations
-                level = oncokb_levels.parse_oncokb_level(row_input)
-                if level not in ['Unknown', 'NA']:
-                    gene = row_input[sic.HUGO_SYMBOL]
-                    gene_info_entry = gene_info_factory.get_json(
-                        gene=gene,
-                        summary=summaries.get(gene)
-                    )
-                    gene_info.append(gene_info_entry)
-                therapies = oncokb_levels.parse_actionable_therapies(row_input)
-                # record therapy for all actionable alterations (OncoKB level 4 or higher)
-                # row may contain therapies at multiple OncoKB levels
-                for level in therapies.keys():
-                    alt = row_input[sic.HGVSP_SHORT]
-                    if gene == 'BRAF' and alt == 'p.V640E':
-                        alt = 'p.V600E'
-                    alt_url = html_builder.build_alteration_url(gene, alt, oncotree_code)
-                    if 'splice' in row_input[sic.VARIANT_CLASSIFICATION].lower():
-                        alt = 'p.? (' + row_input[sic.HGVSC] + ')'
-                        alt_url = html_builder.build_alteration_url(gene, "Truncating%20Mutations", oncotree_code)
-                    if gene == 'TERT':
-                        # filtering for TERT hot spot would have already occured so this is a hot spot
-                        if row_input[sic.START] == '1295113':
-                            alt = 'p.? (c.-124C>T)'
-                        elif row_input[sic.START] == '1295135':
-                            alt = 'p.? (c.-146C>T)'
-                        alt_url = html_builder.build_alteration_url(
-                            gene, "Promoter%20Mutation", oncotree_code
-                        )
-                    treatment_entry = treatment_option_factory.get_json(
-                        tier = oncokb_levels.tier(level),
-                        level = level,
-                        gene = gene,
-                        alteration = alt,
-                        alteration_url = alt_url,
-                        treatments = therapies[level]
+        for row_input in snv_data.get_oncogenic_rows():
+            # record the gene for all reportable alterations
+            level = oncokb_levels.parse_oncokb_level(row_input)
+            if level not in ['Unknown', 'NA']:
+                gene = row_input[sic.HUGO_SYMBOL]
+                gene_info_entry = gene_info_factory.get_json(
+                    gene=gene,
+                    summary=summaries.get(gene)
+                )
+                gene_info.append(gene_info_entry)
+            therapies = oncokb_levels.parse_actionable_therapies(row_input)
+            # record therapy for all actionable alterations (OncoKB level 4 or higher)
+            # row may contain therapies at multiple OncoKB levels
+            for level in therapies.keys():
+                alt = row_input[sic.HGVSP_SHORT]
+                if gene == 'BRAF' and alt == 'p.V640E':
+                    alt = 'p.V600E'
+                alt_url = html_builder.build_alteration_url(gene, alt, oncotree_code)
+                if 'splice' in row_input[sic.VARIANT_CLASSIFICATION].lower():
+                    alt = 'p.? (' + row_input[sic.HGVSC] + ')'
+                    alt_url = html_builder.build_alteration_url(gene, "Truncating%20Mutations", oncotree_code)
+                if gene == 'TERT':
+                    # filtering for TERT hot spot would have already occured so this is a hot spot
+                    if row_input[sic.START] == '1295113':
+                        alt = 'p.? (c.-124C>T)'
+                    elif row_input[sic.START] == '1295135':
+                        alt = 'p.? (c.-146C>T)'
+                    alt_url = html_builder.build_alteration_url(
+                        gene, "Promoter%20Mutation", oncotree_code
                     )
-                    treatments.append(treatment_entry)
+                treatment_entry = treatment_option_factory.get_json(
+                    tier = oncokb_levels.tier(level),
+                    level = level,
+                    gene = gene,
+                    alteration = alt,
+                    alteration_url = alt_url,
+                    treatments = therapies[level]
+                )
+                treatments.append(treatment_entry)
         # assemble the output
         merge_inputs = {
             'gene_information_merger': gene_info,
@@ -233,19 +240,15 @@ class snv_indel_processor(logger):
         alt_count = row['t_alt_count']
         return "{0}/{1}".format(alt_count, depth)
 
-    def get_mutation_totals(self):
+    def get_mutation_totals(self, snv_data):
         # Count the somatic and coding mutations
         # Splice_Region is *excluded* for TMB, *included* in our mutation tables and counts
         # Splice_Region mutations are of interest, but excluded from standard TMB definition
         # The TMB mutation count is (independently) implemented and used in vaf_plot.R
         # See JIRA ticket GCGI-496
-        total = 0
-        excluded = 0
-        with open(os.path.join(self.work_dir, sic.MUTATIONS_ALL)) as data_file:
-            for row in csv.DictReader(data_file, delimiter="\t"):
-                total += 1
-                if row.get(sic.VARIANT_CLASSIFICATION) in sic.TMB_EXCLUDED:
-                    excluded += 1
+        df = snv_data.get_mutations_all()
+        total = len(df)
+        excluded = int(df[sic.VARIANT_CLASSIFICATION].isin(sic.TMB_EXCLUDED).sum())
         coding_total = total - excluded
         msg = "Found {} small mutations and indels, ".format(total)+\
             "of which {} are coding mutations".format(coding_total)
@@ -259,8 +262,8 @@ class snv_indel_processor(logger):
         mutation_type = mutation_type.replace('_', ' ')
         return mutation_type
 
-    def get_results(self):
-        """Read the R script output into the JSON serializable results structure"""
+    def get_results(self, snv_data):
+        """Collate processed SNV/indel data into the JSON serializable results structure"""
         self.logger.debug("Collating SNV/indel results for JSON output")
         oncotree_code = self.config.get_my_string(sic.ONCOTREE_CODE)
         rows = []
@@ -274,35 +277,32 @@ class snv_indel_processor(logger):
             expression = {}
         var_sorter = variant_sorter(self.log_level, self.log_path)
         cytobands = var_sorter.cytoband_lookup()
-        if self.workspace.has_file(sic.LOH_FILE):
-            has_loh = True
-            loh_df = pd.read_csv(os.path.join(self.work_dir, sic.LOH_FILE), sep="\t")
-            loh_dict = dict(zip(loh_df.Hugo_Symbol, loh_df.LOH))
-        else:
+        loh_dict = snv_data.get_loh()
+        if loh_dict == None:
             has_loh = False
             loh_dict = {}
-        with open(os.path.join(self.work_dir, sic.MUTATIONS_ONCOGENIC)) as input_file:
-            reader = csv.DictReader(input_file, delimiter="\t")
-            for row_input in reader:
-                gene = row_input[sic.HUGO_SYMBOL]
-                [protein, protein_url] = self.get_protein_info(row_input, oncotree_code)
-                row_output = {
-                    xreader.EXPRESSION_PERCENTILE: expression.get(gene), # None if WGS
-                    var_sorter.GENE: gene,
-                    var_sorter.GENE_URL: html_builder.build_gene_url(gene),
-                    sic.PROTEIN: protein,
-                    sic.PROTEIN_URL: protein_url,
-                    sic.TYPE: self.get_mutation_type(row_input),
-                    sic.VAF: self.get_tumour_vaf(row_input),
-                    sic.DEPTH: self.get_mutation_depth(row_input),
-                    sic.LOH: loh_dict.get(gene), # None of LOH not available
-                    var_sorter.CHROMOSOME: cytobands.get(gene, var_sorter.UNKNOWN),
-                    var_sorter.ONCOKB: oncokb_levels.parse_oncokb_level(row_input)
-                }
-                rows.append(row_output)
+        else:
+            has_loh = True
+        for row_input in snv_data.get_oncogenic_rows():
+            gene = row_input[sic.HUGO_SYMBOL]
+            [protein, protein_url] = self.get_protein_info(row_input, oncotree_code)
+            row_output = {
+                xreader.EXPRESSION_PERCENTILE: expression.get(gene), # None if WGS
+                var_sorter.GENE: gene,
+                var_sorter.GENE_URL: html_builder.build_gene_url(gene),
+                sic.PROTEIN: protein,
+                sic.PROTEIN_URL: protein_url,
+                sic.TYPE: self.get_mutation_type(row_input),
+                sic.VAF: self.get_tumour_vaf(row_input),
+                sic.DEPTH: self.get_mutation_depth(row_input),
+                sic.LOH: loh_dict.get(gene), # None of LOH not available
+                var_sorter.CHROMOSOME: cytobands.get(gene, var_sorter.UNKNOWN),
+                var_sorter.ONCOKB: oncokb_levels.parse_oncokb_level(row_input)
+            }
+            rows.append(row_output)
         rows = var_sorter.sort_variant_rows(rows)
         rows = oncokb_levels.filter_reportable(rows)
-        somatic_total, coding_seq_total = self.get_mutation_totals()
+        somatic_total, coding_seq_total = self.get_mutation_totals(snv_data)
         results = {
             sic.SOMATIC_MUTATIONS: somatic_total,
             sic.CODING_SEQUENCE_MUTATIONS: coding_seq_total,
@@ -342,75 +342,91 @@ class snv_indel_processor(logger):
         vaf = int(round(float(vaf), 2)*100)
         return vaf
     
-    def has_somatic_mutations(self):
+    def has_somatic_mutations(self, snv_data):
         """
-        Checks if data_mutations_extended.txt is empty.
+        Checks if there are any somatic mutations after filtering.
         This is so we can exclude making a vaf plot if there are no mutations to graph.
         """
-        has_somatic_mutations = False
-        if self.workspace.has_file(sic.MUTATIONS_ALL):
-            df = pd.read_csv(os.path.join(self.work_dir, sic.MUTATIONS_ALL), sep="\t")
-            if df.shape[0] != 0: # i.e. there is at least one row present
-                has_somatic_mutations = True
-        return has_somatic_mutations
-
-    def is_tert_hotspot(self, row, ix):
+        return snv_data != None and snv_data.get_mutations_all().shape[0] != 0
+
+    def is_tert_hotspot(self, df):
         """
         Hot spots are:
         1. -124 bp (nucleotide polymorphism G > A (chr5, 1295113 assembly GRCh38))
         2. -146 bp (nucleotide polymorphism G > A (chr5, 1295135 assembly GRCh38))
+        Returns a boolean Series for rows of the MAF DataFrame
         """
-        chromosome = row[ix.get(sic.CHROMOSOME)]
-        start = row[ix.get(sic.START)]
-        ref_allele = row[ix.get(sic.REF_ALLELE)]
-        tum_allele = row[ix.get(sic.TUM_ALLELE)]
-
-        if chromosome == 'chr5' and start in ['1295113', '1295135'] and ref_allele == "G" and tum_allele == "A":
-            return True
-        else:
-            return False
+        return (df[sic.CHROMOSOME] == 'chr5') & \
+            df[sic.START].isin(['1295113', '1295135']) & \
+            (df[sic.REF_ALLELE] == "G") & \
+            (df[sic.TUM_ALLELE] == "A")
 
     def preprocess_maf(self, maf_path, tumour_id):
-        """Filter a MAF file to remove unwanted rows; also update the tumour ID"""
-        tmp_path = os.path.join(self.work_dir, 'filtered_maf.tsv')
+        """
+        Filter a MAF file to remove unwanted rows; also update the tumour ID
+        Lines are read in chunks; filter columns are parsed into a DataFrame and filtered
+        column-wise, and only the lines kept are parsed in full
+        Returns the header and rows kept, which are also written to the workspace for
+        reference; eg. for `djerba.py oncokb-cache check`
+        """
+        import numpy as np
+        import pandas as pd
+        tmp_path = os.path.join(self.work_dir, sic.FILTERED_MAF)
         vaf_cutoff = sic.MIN_VAF
         self.logger.info("Filtering MAF input")
-        # find the relevant indices on-the-fly from MAF column headers
-        # use this instead of csv.DictReader to preserve the rows for output
         with gzip.open(maf_path, 'rt', encoding=core_constants.TEXT_ENCODING) as in_file,\
              open(tmp_path, 'wt') as tmp_file:
-            # preprocess the MAF file
-            reader = csv.reader(in_file, delimiter="\t")
             writer = csv.writer(tmp_file, delimiter="\t")
-            in_header = True
+            # write the column headers without change
+            header = self._read_maf_header(in_file)
+            writer.writerow(header)
+            # find the relevant indices from MAF column headers
+            indices = sorted([header.index(x) for x in sic.MAF_KEYS])
+            tumour_index = header.index(sic.TUMOUR_SAMPLE_BARCODE)
+            # numeric columns; empty count and frequency values are read as NA, then zero
+            dtypes = {i: str for i in indices}
+            for key in [sic.T_DEPTH, sic.T_ALT_COUNT, sic.GNOMAD_AF]:
+                dtypes[header.index(key)] = float
+            na_values = {header.index(x): [''] for x in [sic.T_ALT_COUNT, sic.GNOMAD_AF]}
             total = 0
-            kept = 0
-            header_length = 0
-            for row in reader:
-                if in_header:
-                    if re.match('#version', row[0]):
-                        # do not write the version header
-                        continue
-                    else:
-                        # write the column headers without change
-                        writer.writerow(row)
-                        indices = self._read_maf_indices(row)
-                        header_length = len(row)
-                        in_header = False
-                else:
-                    total += 1
-                    if len(row) != header_length:
-                        msg = "Indices found in MAF header are not of same length as rows!"
-                        raise RuntimeError(msg)
-                    if self._maf_body_row_ok(row, indices, vaf_cutoff):
-                        # filter rows in the MAF body and update the tumour_id
-                        row[indices.get(sic.TUMOUR_SAMPLE_BARCODE)] = tumour_id
-                        writer.writerow(row)
-                        kept += 1
-        self.logger.info("Kept {0} of {1} MAF data rows".format(kept, total))
-        return tmp_path
-    
+            rows = []
+            while True:
+                lines = list(itertools.islice(in_file, self.MAF_CHUNK_SIZE))
+                if len(lines) == 0:
+                    break
+                total += len(lines)
+                # every row has the same number of fields as the header
+                if set(map(str.count, lines, itertools.repeat("\t"))) != {len(header) - 1}:
+                    msg = "Indices found in MAF header are not of same length as rows!"
+                    self.logger.error(msg)
+                    raise RuntimeError(msg)
+                # fields are split on tabs only, as for the field count above
+                df = pd.read_csv(
+                    io.StringIO(''.join(lines)),
+                    sep="\t",
+                    header=None,
+                    usecols=indices,
+                    dtype=dtypes,
+                    keep_default_na=False,
+                    na_values=na_values,
+                    quoting=csv.QUOTE_NONE
+                )
+                if len(df) != len(lines):
+                    msg = "Parsed {0} rows from {1} lines of MAF input".format(len(df), len(lines))
+                    self.logger.error(msg)
+                    raise RuntimeError(msg)
+                df.columns = [header[i] for i in indices]
+                for i in np.flatnonzero(self._get_maf_filter(df, vaf_cutoff).to_numpy()):
+                    # filter rows in the MAF body and update the tumour_id
+                    row = next(csv.reader([lines[i]], delimiter="\t", quoting=csv.QUOTE_NONE))
+                    row[tumour_index] = tumour_id
+                    writer.writerow(row)
+                    rows.append(row)
+        self.logger.info("Kept {0} of {1} MAF data rows".format(len(rows), total))
+        return [header, rows]
+
     def proc_vep(self, maf_df):
+        import numpy as np
         # add vaf columns
         vaf_df = self.add_vaf_to_maf(maf_df, alt_col="t_alt_count", dep_col="t_depth", vaf_header="tumour_vaf")
         vaf_df = self.add_vaf_to_maf(vaf_df, alt_col="n_alt_count", dep_col="n_depth", vaf_header="normal_vaf")
@@ -454,52 +470,66 @@ class snv_indel_processor(logger):
 
         return df_filt
 
-    def process_snv_data(self, whizbam_url, maf_input_path):
-        if maf_input_path is None:
-            self.logger.info("No MAF file input, processing omitted")
+    def process_snv_data(self, whizbam_url, maf_header, maf_rows):
+        """
+        Filter annotated MAF rows, and compute LOH if copy number data is available
+        Returns an snv_indel_data object, or None if there is no MAF input
+        Tables are also written to the workspace for reference, but are not read back
+        """
+        import pandas as pd
+        snv_data = None
+        if maf_rows is None:
+            self.logger.info("No MAF input, processing omitted")
         else:
             self.logger.info("Processing Mutation data")
 
             # annotate with filters
+            # rows are parsed from memory, with the same type inference as for a MAF file
             self.logger.debug("--- Reading MAF data ---")
-            maf_df = pd.read_csv(maf_input_path, sep="\t")
+            maf_text = ''.join(["\t".join(row)+"\n" for row in [maf_header]+maf_rows])
+            maf_df = pd.read_csv(io.StringIO(maf_text), sep="\t", quoting=csv.QUOTE_NONE)
 
             df_filter = self.proc_vep(maf_df)
             df_filt_whizbam = self.construct_whizbam_links(df=df_filter, whizbam_url=whizbam_url)
-            df_filt_whizbam.to_csv(path_or_buf=os.path.join(self.work_dir, "data_mutations_extended.txt"), sep="\t", index=False)
+            df_filt_whizbam.to_csv(path_or_buf=os.path.join(self.work_dir, sic.MUTATIONS_ALL), sep="\t", index=False)
 
             if df_filter.empty:
                 self.logger.info("No passed mutations")
                 df_filt_oncokb = df_filt_whizbam
-                df_filt_whizbam.to_csv(path_or_buf=os.path.join(self.work_dir, "data_mutations_extended_oncogenic.txt"), sep="\t", index=False)
+                df_filt_whizbam.to_csv(path_or_buf=os.path.join(self.work_dir, sic.MUTATIONS_ONCOGENIC), sep="\t", index=False)
             else:
                 # subset to oncokb annotated genes
                 df_filt_oncokb = df_filt_whizbam[(df_filt_whizbam['ONCOGENIC'] == "Oncogenic") | (df_filt_whizbam['ONCOGENIC'] == "Likely Oncogenic")]
                 if df_filt_oncokb.empty:
                     self.logger.info("no oncogenic mutations")
-                df_filt_oncokb.to_csv(path_or_buf=os.path.join(self.work_dir, "data_mutations_extended_oncogenic.txt"), sep="\t", index=False)
+                df_filt_oncokb.to_csv(path_or_buf=os.path.join(self.work_dir, sic.MUTATIONS_ONCOGENIC), sep="\t", index=False)
 
             if self.workspace.has_file("purity_ploidy.json") and self.workspace.has_file("cn.txt"):
                 purity = str(self.workspace.read_json("purity_ploidy.json")["purity"])
                 cn_file = os.path.join(self.work_dir, "cn.txt")
 
                 final_table = self.compute_loh(df_filt_oncokb, cn_file, purity)
-                final_table.to_csv(os.path.join(self.work_dir, "loh.txt"), sep="\t", index=False)
+                final_table.to_csv(os.path.join(self.work_dir, sic.LOH_FILE), sep="\t", index=False)
+                loh = dict(zip(final_table.Hugo_Symbol, final_table.LOH))
             else:
                 self.logger.info("No copy number information, LOH omitted")
+                loh = None
+            snv_data = snv_indel_data(df_filt_whizbam, df_filt_oncokb, loh)
+        return snv_data
    
-    def write_vaf_plot(self):
+    def write_vaf_plot(self, snv_data):
         """"Create VAF plot with matplotlib"""
-        data_directory = self.data_dir
-        cyto_band = os.path.join(data_directory, 'cytoBand.txt')
-        cytoBand = pd.read_csv(cyto_band, sep="\t")
+        import matplotlib.pyplot as plt
+        import numpy as np
+        import seaborn as sns
+        from matplotlib.ticker import PercentFormatter
+        cytoBand = reference_data(self.log_level, self.log_path).get_cytoband_table(self.data_dir)
 
-        maf_path = os.path.join(self.work_dir, 'data_mutations_extended.txt')
         output = os.path.join(self.work_dir, sic.VAF_PLOT_FILENAME)
         self.logger.info(f"Creating VAF plot and saving to file {output}")
 
 
-        MAF = pd.read_csv(maf_path, sep="\t")
+        MAF = snv_data.get_mutations_all()
         MAF = MAF[~MAF['Variant_Classification'].isin(['Silent', 'Splice_Region'])]
         MAF = MAF.drop(columns=['Chromosome'])
         MAF = MAF.merge(cytoBand, how='inner')
@@ -544,41 +574,82 @@ class snv_indel_processor(logger):
 
         plt.savefig(output, bbox_inches = 'tight', backend='Cairo')
 
-    def whizbam_to_text(self, in_name, out_name):
-        in_path = os.path.join(self.work_dir, in_name)
+    def whizbam_to_text(self, df, out_name):
         out_path = os.path.join(self.work_dir, out_name)
-        links = []
-        with open(in_path) as in_file, open(out_path, 'w') as out_file:
-            reader = csv.DictReader(in_file, delimiter="\t")
+        fieldnames = ['Hugo_Symbol', 'whizbam']
+        # whizbam column is absent if there are no mutations
+        rows = snv_indel_data.get_text_rows(df.reindex(columns=fieldnames))
+        with open(out_path, 'w') as out_file:
             writer = csv.DictWriter(
                 out_file,
-                fieldnames=['Hugo_Symbol', 'whizbam'],
+                fieldnames=fieldnames,
                 extrasaction='ignore',
                 delimiter="\t"
             )
             writer.writeheader()
-            for row in reader:
-                writer.writerow(row)
+            writer.writerows(rows)
 
-    def write_whizbam_files(self):
+    def write_whizbam_files(self, snv_data):
         """
         Write Whizbam links in their own files for easier reference
         Original MAF file contains 100+ columns; this is much easier to read
         """
-        self.whizbam_to_text(sic.MUTATIONS_ALL, sic.WHIZBAM_ALL)
-        self.whizbam_to_text(sic.MUTATIONS_ONCOGENIC, sic.WHIZBAM_ONCOGENIC)
+        self.whizbam_to_text(snv_data.get_mutations_all(), sic.WHIZBAM_ALL)
+        self.whizbam_to_text(snv_data.get_mutations_oncogenic(), sic.WHIZBAM_ONCOGENIC)
         
     def write_working_files(self, whizbam_url):
         """
         Preprocess inputs, including OncoKB annotation
         Run the main scripts for data processing and VAF plot
+        Returns processed data, for results and merge inputs
         """
         maf_path = self.config.get_my_string(sic.MAF_PATH)
         tumour_id = self.config.get_my_string(sic.TUMOUR_ID)
-        maf_path_preprocessed = self.preprocess_maf(maf_path, tumour_id)
-        maf_path_annotated = self.annotate_maf(maf_path_preprocessed)
-        self.process_snv_data(whizbam_url, maf_path_annotated)
+        [header, rows] = self.preprocess_maf(maf_path, tumour_id)
+        maf_path_filtered = os.path.join(self.work_dir, sic.FILTERED_MAF)
+        [header, rows] = self.annotate_maf(header, rows, maf_path_filtered)
+        snv_data = self.process_snv_data(whizbam_url, header, rows)
         # Exclude the plot if there are no somatic mutations
-        if self.has_somatic_mutations():
-            self.write_vaf_plot()
-        self.write_whizbam_files()
+        if self.has_somatic_mutations(snv_data):
+            self.write_vaf_plot(snv_data)
+        self.write_whizbam_files(snv_data)
+        return snv_data
+
+
+class snv_indel_data:
+
+    """
+    Container for SNV/indel data after filtering; produced once by snv_indel_processor,
+    and read by its methods for the VAF plot, Whizbam files, results and merge inputs
+    """
+
+    def __init__(self, mutations_all, mutations_oncogenic, loh=None):
+        # mutations_all, mutations_oncogenic are pandas DataFrames
+        # loh is a dictionary of LOH by gene, or None if LOH was not computed
+        self.mutations_all = mutations_all
+        self.mutations_oncogenic = mutations_oncogenic
+        self.loh = loh
+        self.oncogenic_rows = None
+
+    def get_loh(self):
+        return self.loh
+
+    def get_mutations_all(self):
+        return self.mutations_all
+
+    def get_mutations_oncogenic(self):
+        return self.mutations_oncogenic
+
+    def get_oncogenic_rows(self):
+        """Oncogenic mutations as a list of dictionaries; computed on first call"""
+        if self.oncogenic_rows == None:
+            self.oncogenic_rows = self.get_text_rows(self.mutations_oncogenic)
+        return self.oncogenic_rows
+
+    @staticmethod
+    def get_text_rows(df):
+        """
+        Convert a DataFrame to a list of dictionaries with string values, as they would be
+        read from a TSV file written by pandas; missing values are empty strings
+        """
+        return df.astype(object).where(df.notna(), '').astype(str).to_dict('records')
@@ -0,0 +1,122 @@
+"""
+Read members of ZIP archives as streams, without extracting them to disk
+
+Archives from PURPLE and Sequenza are large (hundreds of MB), but we only need a few small
+members; reading them directly avoids scratch I/O on a shared filesystem. Open archives are
+kept in a process-wide cache, so the central directory of each archive is read only once.
+Each cache entry has a signature of modification time and size; if the archive changes on
+disk, it is reopened. The cache holds at most MAX_ARCHIVES open archives, so long-running
+processes (eg. batch mode) do not run out of file descriptors; the least recently used
+archive is closed, and reopened if needed.
+"""
+
+import io
+import logging
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+import djerba.core.constants as core_constants
+from djerba.util.logger import logger
+
+class zip_archive(logger):
+
+    # process-wide state, shared by all instances
+    # archives are indexed by (real path, process ID); values are (signature, ZipFile)
+    # open files are not shared with forked processes, which have their own entries
+    # ordered from least to most recently used
+    MAX_ARCHIVES = 8
+    _archives = OrderedDict()
+    _lock = threading.Lock()
+    _stats = {'hits': 0, 'misses': 0}
+
+    def __init__(self, zip_path, log_level=logging.WARNING, log_path=None):
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.zip_path = zip_path
+        self.zf = self._get_zipfile()
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            for (signature, zf) in cls._archives.values():
+                zf.close()
+            cls._archives.clear()
+            cls._stats.update({'hits': 0, 'misses': 0})
+
+    @classmethod
+    def get_cache_stats(cls):
+        """Return counts of hits and misses for open archives"""
+        with cls._lock:
+            stats = dict(cls._stats)
+            stats['archives'] = len(cls._archives)
+        return stats
+
+    def _get_zipfile(self):
+        key = (os.path.realpath(self.zip_path), os.getpid())
+        try:
+            stat = os.stat(self.zip_path)
+        except OSError as err:
+            msg = "Cannot read ZIP archive {0}: {1}".format(self.zip_path, err)
+            self.logger.error(msg)
+            raise DjerbaArchiveError(msg) from err
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._archives.get(key)
+            if entry != None and entry[0] == signature:
+                self._stats['hits'] += 1
+                self._archives.move_to_end(key)
+                return entry[1]
+            self._stats['misses'] += 1
+            if entry != None:
+                self.logger.debug("ZIP archive {0} has changed, reopening".format(self.zip_path))
+                entry[1].close()
+            try:
+                zf = zipfile.ZipFile(self.zip_path)
+            except zipfile.BadZipFile as err:
+                msg = "Invalid ZIP archive {0}: {1}".format(self.zip_path, err)
+                self.logger.error(msg)
+                raise DjerbaArchiveError(msg) from err
+            self._archives[key] = (signature, zf)
+            self._archives.move_to_end(key)
+            while len(self._archives) > self.MAX_ARCHIVES:
+                (evicted_key, (evicted_signature, evicted_zf)) = self._archives.popitem(last=False)
+                # member streams already open are unaffected; see ZipFile.close()
+                evicted_zf.close()
+                self.logger.debug("Closed ZIP archive {0}".format(evicted_key[0]))
+        self.logger.debug("Read central directory of ZIP archive {0}".format(self.zip_path))
+        return zf
+
+    def _get_open_zipfile(self):
+        """Return the ZipFile, reopening it if closed since; eg. on eviction from the cache"""
+        if self.zf.fp == None:
+            self.zf = self._get_zipfile()
+        return self.zf
+
+    def extract(self, name, dest_dir):
+        """Extract a member to a directory, for tools which need a file on disk"""
+        return self._get_open_zipfile().extract(name, dest_dir)
+
+    def find_name(self, pattern):
+        """Return the first member name matching the regular expression, or None"""
+        for name in self.get_names():
+            if re.search(pattern, name):
+                return name
+        return None
+
+    def get_names(self):
+        """Return member names, excluding directories"""
+        return [x for x in self._get_open_zipfile().namelist() if not re.search('/$', x)]
+
+    def get_path(self, name):
+        """Member location, for log and error messages"""
+        return "{0}:{1}".format(self.zip_path, name)
+
+    def open_text(self, name):
+        """Open a member as a text stream; use as a context manager, to close when done"""
+        member = self._get_open_zipfile().open(name)
+        return io.TextIOWrapper(member, encoding=core_constants.TEXT_ENCODING)
+
+
+class DjerbaArchiveError(Exception):
+    pass
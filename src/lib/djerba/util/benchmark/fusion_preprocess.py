@@ -0,0 +1,139 @@
+"""
+Benchmark fusion preprocessing on synthetic MAVIS and Arriba files
+
+Writes a synthetic MAVIS summary and Arriba fusion file with the given numbers of calls, and
+measures time and memory to process them with prepare_fusions; as for process_fusion_files,
+but omitting OncoKB annotation. Each measurement runs in a fresh worker process, so peak
+memory use is independent for each input size.
+"""
+
+import csv
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from djerba.plugins.fusion.preprocess import prepare_fusions
+from djerba.util.logger import logger
+from djerba.util.timing import measure, WALL_SECONDS, CPU_SECONDS, PEAK_RSS_DELTA_KB
+import djerba.plugins.fusion.constants as fc
+
+class fusion_preprocess_benchmark(logger):
+
+    TUMOUR_ID = 'TUMOUR'
+    ONCOTREE_CODE = 'PCM'
+    MIN_READS = 20
+    SEED = 42
+    CHROMOSOMES = [str(x) for x in range(1, 23)] + ['X', 'Y']
+    EVENT_TYPES = ['deletion', 'duplication', 'inversion', 'translocation',
+                   'inverted translocation', 'insertion']
+    CALL_METHODS = ['contig', 'flanking reads', 'split reads', 'contig;split reads']
+    TOOLS = ['arriba', 'delly', 'star', 'arriba;star', 'delly;star', 'arriba;delly;star']
+    READING_FRAMES = ['in-frame', 'out-of-frame', 'stop-codon', '.']
+    MAVIS_HEADER = [
+        'gene1_aliases', 'gene2_aliases', 'tools', 'call_method', 'event_type',
+        'break1_chromosome', 'break2_chromosome', 'gene1_direction', 'gene2_direction',
+        'contig_remapped_reads', 'flanking_pairs', 'break1_split_reads',
+        'break2_split_reads', 'linking_split_reads'
+    ]
+    ARRIBA_HEADER = ['#gene1', 'gene2', 'breakpoint1', 'breakpoint2', 'reading_frame']
+    RESULT_HEADER = [
+        'calls', 'fusions', WALL_SECONDS, CPU_SECONDS, PEAK_RSS_DELTA_KB, 'calls_per_second'
+    ]
+
+    def __init__(self, work_dir, genes=2000, log_level=logging.WARNING, log_path=None):
+        self.log_level = log_level
+        self.log_path = log_path
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.work_dir = work_dir
+        self.genes = max(genes, 2)
+
+    def get_read_count(self, rng):
+        """Read count field, which may be missing, None, or have multiple values"""
+        return rng.choice([
+            '',
+            'None',
+            str(rng.randint(0, 100)),
+            '{0};{1}'.format(rng.randint(0, 100), rng.randint(0, 100))
+        ])
+
+    def run(self, sizes):
+        """Run the benchmark for each size; return a list of result rows"""
+        results = []
+        for total in sizes:
+            mavis_path = os.path.join(self.work_dir, 'mavis_{0}.tab'.format(total))
+            arriba_path = os.path.join(self.work_dir, 'arriba_{0}.tsv'.format(total))
+            self.write_inputs(mavis_path, arriba_path, total)
+            out_dir = os.path.join(self.work_dir, 'fusions_{0}'.format(total))
+            os.makedirs(out_dir, exist_ok=True)
+            # a fresh process for each size
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(
+                    _preprocess_fusions, out_dir, mavis_path, arriba_path,
+                    self.TUMOUR_ID, self.MIN_READS, self.ONCOTREE_CODE
+                )
+                measurements = future.result()
+            with open(os.path.join(out_dir, fc.DATA_FUSIONS)) as data_file:
+                fusions = sum(1 for line in data_file) - 1
+            wall = measurements[WALL_SECONDS]
+            rate = int(total/wall) if wall > 0 else None
+            result = [
+                total,
+                fusions,
+                wall,
+                measurements[CPU_SECONDS],
+                measurements[PEAK_RSS_DELTA_KB],
+                rate
+            ]
+            self.logger.info("Benchmark result: {0}".format(result))
+            results.append(result)
+            os.remove(mavis_path)
+            os.remove(arriba_path)
+        return results
+
+    def write_inputs(self, mavis_path, arriba_path, total):
+        """Write MAVIS and Arriba inputs, with an Arriba call for about half of the MAVIS calls"""
+        rng = random.Random(self.SEED)
+        with open(mavis_path, 'w') as mavis_file, open(arriba_path, 'w') as arriba_file:
+            mavis_writer = csv.writer(mavis_file, delimiter="\t", lineterminator="\n")
+            arriba_writer = csv.writer(arriba_file, delimiter="\t", lineterminator="\n")
+            mavis_writer.writerow(self.MAVIS_HEADER)
+            arriba_writer.writerow(self.ARRIBA_HEADER)
+            for i in range(total):
+                gene1, gene2 = ['GENE{0}'.format(rng.randrange(self.genes)) for j in range(2)]
+                direction1 = rng.choice([3, 5])
+                row = [
+                    gene1,
+                    gene2,
+                    rng.choice(self.TOOLS),
+                    rng.choice(self.CALL_METHODS),
+                    rng.choice(self.EVENT_TYPES),
+                    rng.choice(self.CHROMOSOMES),
+                    rng.choice(self.CHROMOSOMES),
+                    direction1,
+                    8 - direction1
+                ]
+                row.extend([self.get_read_count(rng) for j in range(5)])
+                mavis_writer.writerow(row)
+                if rng.random() < 0.5:
+                    arriba_writer.writerow([
+                        gene1,
+                        gene2,
+                        rng.randint(1, 10**8),
+                        rng.randint(1, 10**8),
+                        rng.choice(self.READING_FRAMES)
+                    ])
+        self.logger.debug("Wrote synthetic MAVIS and Arriba with {0} calls".format(total))
+
+
+def _preprocess_fusions(work_dir, mavis_path, arriba_path, tumour_id, min_reads, oncotree_code):
+    """Process fusions and return measurements; module-level for use in a worker process"""
+    prep = prepare_fusions(work_dir)
+    result, measurements = measure(
+        _process_fusions, prep, mavis_path, arriba_path, tumour_id, min_reads, oncotree_code
+    )
+    return measurements
+
+def _process_fusions(prep, mavis_path, arriba_path, tumour_id, min_reads, oncotree_code):
+    df_mavis = prep.process_mavis(mavis_path, tumour_id, min_reads)
+    df_arriba = prep.process_arriba(arriba_path)
+    prep.write_fusion_files(df_mavis, df_arriba, oncotree_code)
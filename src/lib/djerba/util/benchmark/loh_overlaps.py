@@ -0,0 +1,83 @@
+"""
+Benchmark gene-level LOH lookup in the PURPLE plugin, for highly segmented tumours
+
+Writes synthetic PURPLE segments with the given numbers of segments, evenly divided between
+chromosomes, and measures time to find the minimum MACN and CN of segments overlapping each
+gene in the gene BED file; as in purple_processor.analyze_segments.
+"""
+
+import logging
+import os
+import random
+from djerba.plugins.wgts.cnv_purple.purple_tools import purple_processor
+from djerba.util.environment import directory_finder
+from djerba.util.logger import logger
+from djerba.util.timing import measure, WALL_SECONDS, CPU_SECONDS, PEAK_RSS_DELTA_KB
+import djerba.plugins.wgts.cnv_purple.constants as pc
+
+class loh_overlap_benchmark(logger):
+
+    CHROMOSOMES = ['chr{0}'.format(x) for x in list(range(1, 23))+['X', 'Y']]
+    CHROMOSOME_LENGTH = 250000000
+    SEED = 42
+    RESULT_HEADER = [
+        'segments', 'genes', 'overlaps', WALL_SECONDS, CPU_SECONDS, PEAK_RSS_DELTA_KB
+    ]
+
+    def __init__(self, work_dir, log_level=logging.WARNING, log_path=None):
+        self.log_level = log_level
+        self.log_path = log_path
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.work_dir = work_dir
+        self.data_dir = directory_finder(log_level, log_path).get_data_dir()
+
+    def get_segments(self, total):
+        """Synthetic segments in the format used by analyze_segments, with MACN and CN"""
+        import pandas as pd
+        rng = random.Random(self.SEED)
+        per_chromosome = max(1, total // len(self.CHROMOSOMES))
+        rows = []
+        for chrom in self.CHROMOSOMES:
+            breaks = sorted(rng.sample(range(1, self.CHROMOSOME_LENGTH), per_chromosome+1))
+            for i in range(per_chromosome):
+                rows.append([
+                    'purple',
+                    chrom,
+                    breaks[i],
+                    breaks[i+1]-1,
+                    rng.randint(0, 1000),
+                    rng.choice([0.0, 0.5, 1.0, 2.0]),
+                    rng.choice([1.0, 2.0, 3.0, 6.0])
+                ])
+        columns = ["ID", "chrom", "loc_start", "loc_end", "num_mark", "macn", "cn"]
+        return pd.DataFrame(rows, columns=columns)
+
+    def lookup(self, segments, gene_info):
+        """Find minimum MACN and CN for each gene; return the number of overlaps"""
+        proc = purple_processor(self.work_dir, self.log_level, self.log_path)
+        overlaps = proc.get_gene_overlaps(segments, gene_info)
+        for column in ['macn', 'cn']:
+            gene_segments = segments.copy()
+            gene_segments["seg_mean"] = segments[column]
+            proc.pre_proc_loh(gene_segments, gene_info, overlaps)
+        return len(overlaps[0])
+
+    def run(self, sizes):
+        """Run the benchmark for each number of segments; return a list of result rows"""
+        import pandas as pd
+        gene_info = pd.read_csv(os.path.join(self.data_dir, pc.GENEBED), sep="\t")
+        results = []
+        for total in sizes:
+            segments = self.get_segments(total)
+            overlaps, measurements = measure(self.lookup, segments, gene_info)
+            result = [
+                len(segments),
+                len(gene_info),
+                overlaps,
+                measurements[WALL_SECONDS],
+                measurements[CPU_SECONDS],
+                measurements[PEAK_RSS_DELTA_KB]
+            ]
+            self.logger.info("Benchmark result: {0}".format(result))
+            results.append(result)
+        return results
@@ -0,0 +1,112 @@
+"""
+Benchmark SNV/indel MAF preprocessing on synthetic WGS MAF files
+
+Writes a synthetic gzipped MAF with the given numbers of rows, and measures time and memory
+to filter it with snv_indel_processor.preprocess_maf. Most rows fail the filter, as for a
+WGS MAF. Each measurement runs in a fresh worker process, so peak memory use is independent
+for each input size.
+"""
+
+import gzip
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from djerba.core.workspace import workspace
+from djerba.plugins.wgts.snv_indel.tools import snv_indel_processor
+from djerba.util.logger import logger
+from djerba.util.timing import measure, WALL_SECONDS, CPU_SECONDS, PEAK_RSS_DELTA_KB
+import djerba.core.constants as core_constants
+import djerba.plugins.wgts.snv_indel.constants as sic
+
+class maf_preprocess_benchmark(logger):
+
+    TUMOUR_ID = 'TUMOUR'
+    BASES = ['A', 'C', 'G', 'T']
+    # mostly non-coding variant classifications and biotypes, as in a WGS MAF
+    VARIANT_CLASSIFICATIONS = ['Intron', 'IGR', "3'UTR", 'RNA'] + sic.MUTATION_TYPES_EXONIC
+    BIOTYPES = ['protein_coding', 'lncRNA', 'processed_pseudogene', '']
+    FILTERS = ['PASS', 'PASS', 'PASS', 'str_contraction', 't_lod_fstar', 'PASS;clustered_events']
+    SEED = 42
+    RESULT_HEADER = [
+        'rows', 'kept', WALL_SECONDS, CPU_SECONDS, PEAK_RSS_DELTA_KB, 'rows_per_second'
+    ]
+
+    def __init__(self, work_dir, columns=130, log_level=logging.WARNING, log_path=None):
+        self.log_level = log_level
+        self.log_path = log_path
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.work_dir = work_dir
+        self.columns = max(columns, len(sic.MAF_KEYS))
+
+    def get_rows(self, total):
+        """Generator: synthetic MAF rows, including the header"""
+        rng = random.Random(self.SEED)
+        header = sic.MAF_KEYS.copy()
+        header.extend(['Extra_{0}'.format(i) for i in range(self.columns - len(header))])
+        yield header
+        for i in range(total):
+            ref, alt = rng.sample(self.BASES, 2)
+            depth = rng.randint(0, 100)
+            fields = {
+                sic.VARIANT_CLASSIFICATION: rng.choice(self.VARIANT_CLASSIFICATIONS),
+                sic.TUMOUR_SAMPLE_BARCODE: 'SYNTHETIC',
+                sic.MATCHED_NORM_SAMPLE_BARCODE: rng.choice(['NORMAL', 'unmatched']),
+                sic.FILTER: rng.choice(self.FILTERS),
+                sic.T_DEPTH: str(depth),
+                sic.T_ALT_COUNT: str(rng.randint(0, depth)),
+                sic.GNOMAD_AF: rng.choice(['', '0.0001', '0.01']),
+                sic.BIOTYPE: rng.choice(self.BIOTYPES),
+                sic.HUGO_SYMBOL: 'GENE{0}'.format(i % 20000),
+                sic.CHROMOSOME: 'chr{0}'.format(i % 22 + 1),
+                sic.START: str(1000 + i),
+                sic.REF_ALLELE: ref,
+                sic.TUM_ALLELE: alt
+            }
+            row = [fields[x] for x in sic.MAF_KEYS]
+            row.extend([str(rng.randint(0, 1000)) for j in range(len(header) - len(row))])
+            yield row
+
+    def run(self, sizes):
+        """Run the benchmark for each size; return a list of result rows"""
+        results = []
+        for total in sizes:
+            maf_path = os.path.join(self.work_dir, 'synthetic_{0}.maf.gz'.format(total))
+            self.write_maf(maf_path, total)
+            # a fresh process for each size
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(
+                    _preprocess_maf, self.work_dir, maf_path, self.TUMOUR_ID
+                )
+                kept, measurements = future.result()
+            wall = measurements[WALL_SECONDS]
+            rate = int(total/wall) if wall > 0 else None
+            result = [
+                total,
+                kept,
+                wall,
+                measurements[CPU_SECONDS],
+                measurements[PEAK_RSS_DELTA_KB],
+                rate
+            ]
+            self.logger.info("Benchmark result: {0}".format(result))
+            results.append(result)
+            os.remove(maf_path)
+            os.remove(os.path.join(self.work_dir, sic.FILTERED_MAF))
+        return results
+
+    def write_maf(self, path, total):
+        with gzip.open(path, 'wt', encoding=core_constants.TEXT_ENCODING) as out_file:
+            out_file.write("#version 2.4\n")
+            for row in self.get_rows(total):
+                out_file.write("\t".join(row)+"\n")
+        self.logger.debug("Wrote synthetic MAF with {0} rows to {1}".format(total, path))
+
+
+def _preprocess_maf(work_dir, maf_path, tumour_id):
+    """Filter a MAF and return measurements; module-level for use in a worker process"""
+    # pandas is imported by preprocess_maf; import it here, so it is not timed
+    import pandas
+    processor = snv_indel_processor(workspace(work_dir), None)
+    [header, rows], measurements = measure(processor.preprocess_maf, maf_path, tumour_id)
+    return len(rows), measurements
@@ -0,0 +1,119 @@
+"""
+Benchmark Mako template lookup for the components of a WGTS report
+
+For each mode, gets every template rendered in a WGTS report: document headers and footers,
+and the templates of WGTS plugins and mergers. Modes are:
+- uncached: a new TemplateLookup for each template, so every template is compiled
+- cold: the first report in a new process, with no module directory
+- memory: later reports in the same process, eg. in update or batch runs
+- module_directory: the first report in a new process, with compiled modules on disk
+Each mode runs in a fresh worker process, so caches and peak memory use are independent.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from mako.lookup import TemplateLookup
+import djerba
+from djerba.util.environment import directory_finder
+from djerba.util.logger import logger
+from djerba.util.render_mako import mako_renderer
+from djerba.util.timing import measure, WALL_SECONDS, CPU_SECONDS, PEAK_RSS_DELTA_KB
+
+class mako_render_benchmark(logger):
+
+    # template directories relative to the djerba package, and template names
+    WGTS_TEMPLATES = [
+        ['core/html', [
+            'clinical_header.html', 'clinical_footer.html', 'research_header.html',
+            'research_footer.html', 'footer.html'
+        ]],
+        ['plugins/report_title', ['title.html']],
+        ['plugins/patient_info', ['patient_info_template.html']],
+        ['plugins/case_overview', ['case_overview_template.html']],
+        ['plugins/summary', ['summary_report_template.html']],
+        ['plugins/sample', ['sample_template.html']],
+        ['plugins/genomic_landscape', ['genomic_landscape_template.html']],
+        ['plugins/wgts/snv_indel', ['snv_indel_template.html']],
+        ['plugins/wgts/cnv_purple', ['cnv_template.html']],
+        ['plugins/fusion', ['fusion_template.html']],
+        ['plugins/supplement/body', ['supplementary_materials_template.html']],
+        ['mergers/gene_information_merger', ['gene_information_template.html']],
+        ['mergers/treatment_options_merger', ['treatment_options_template.html']]
+    ]
+    UNCACHED = 'uncached'
+    COLD = 'cold'
+    MEMORY = 'memory'
+    MODULE_DIRECTORY = 'module_directory'
+    RESULT_HEADER = [
+        'mode', 'reports', 'templates', WALL_SECONDS, CPU_SECONDS, PEAK_RSS_DELTA_KB,
+        'ms_per_report'
+    ]
+
+    def __init__(self, work_dir, log_level=logging.WARNING, log_path=None):
+        self.log_level = log_level
+        self.log_path = log_path
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.work_dir = work_dir
+        package_dir = os.path.dirname(os.path.realpath(djerba.__file__))
+        self.templates = []
+        for [template_dir, names] in self.WGTS_TEMPLATES:
+            for name in names:
+                self.templates.append([os.path.join(package_dir, template_dir), name])
+
+    def run(self, reports):
+        """Run the benchmark for the given number of reports; return a list of result rows"""
+        module_dir = os.path.join(self.work_dir, 'mako_modules')
+        os.makedirs(module_dir, exist_ok=True)
+        modes = [
+            [self.UNCACHED, reports, None],
+            [self.COLD, 1, None],
+            [self.MEMORY, reports, None],
+            # first run writes modules; second run reads them, in a new process
+            [None, 1, module_dir],
+            [self.MODULE_DIRECTORY, 1, module_dir]
+        ]
+        results = []
+        for [mode, total, mode_module_dir] in modes:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(
+                    _get_templates, self.templates, mode, total, mode_module_dir
+                )
+                measurements = future.result()
+            if mode == None:
+                continue
+            wall = measurements[WALL_SECONDS]
+            result = [
+                mode,
+                total,
+                len(self.templates),
+                wall,
+                measurements[CPU_SECONDS],
+                measurements[PEAK_RSS_DELTA_KB],
+                round(1000*wall/total, 3)
+            ]
+            self.logger.info("Benchmark result: {0}".format(result))
+            results.append(result)
+        return results
+
+
+def _get_templates(templates, mode, total, module_dir):
+    """Get templates and return measurements; module-level for use in a worker process"""
+    if module_dir == None:
+        os.environ.pop(directory_finder.DJERBA_TEMPLATE_CACHE_DIR_VAR, None)
+    else:
+        os.environ[directory_finder.DJERBA_TEMPLATE_CACHE_DIR_VAR] = module_dir
+    if mode == mako_render_benchmark.MEMORY:
+        # first report compiles templates, and is not measured
+        _get_all_templates(templates, 1, mode)
+    result, measurements = measure(_get_all_templates, templates, total, mode)
+    return measurements
+
+def _get_all_templates(templates, total, mode):
+    for i in range(total):
+        for [template_dir, name] in templates:
+            if mode == mako_render_benchmark.UNCACHED:
+                # as in previous versions of mako_renderer
+                TemplateLookup(directories=[template_dir, ], strict_undefined=True).get_template(name)
+            else:
+                mako_renderer(template_dir, logging.WARNING).get_template(template_dir, name)
@@ -0,0 +1,222 @@
+"""
+Benchmark OncoKB cache annotation on synthetic MAF files
+
+Writes a synthetic MAF with the given numbers of rows, populates a cache store with
+annotations for a fraction of the rows, and measures time and memory to annotate the MAF
+from the cache. Each measurement runs in a fresh worker process, so peak memory use is
+independent for each input size.
+
+Also compares the time to compute legacy (sha256) and versioned MAF cache keys; and runs
+a stress test of concurrent cache updates, in many writer processes.
+"""
+
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from djerba.util.logger import logger
+from djerba.util.oncokb.cache import oncokb_cache
+from djerba.util.oncokb.cache_store import oncokb_cache_store
+from djerba.util.timing import measure, WALL_SECONDS, CPU_SECONDS, PEAK_RSS_DELTA_KB
+
+class oncokb_cache_benchmark(logger):
+
+    ONCOTREE_CODE = 'PAAD'
+    HEADER = ['Hugo_Symbol', 'Chromosome', 'Start_Position', 'Reference_Allele',
+              'Tumor_Seq_Allele2', 'HGVSp_Short']
+    BASES = ['A', 'C', 'G', 'T']
+    SEED = 42
+    RESULT_HEADER = ['rows', WALL_SECONDS, CPU_SECONDS, PEAK_RSS_DELTA_KB, 'rows_per_second']
+    KEYS_RESULT_HEADER = ['rows', 'columns', 'scheme', WALL_SECONDS, 'rows_per_second']
+    LEGACY = 'legacy'
+    VERSIONED = 'versioned'
+    STRESS_RESULT_HEADER = ['writers', 'rows_per_writer', 'expected', 'found', WALL_SECONDS]
+    STRESS_UPDATES = 5 # cache updates by each writer
+    STRESS_LEGACY_FUSIONS = 10 # fusions in a legacy JSON cache, migrated on first update
+
+    def __init__(self, work_dir, columns=20, hit_fraction=0.1,
+                 log_level=logging.WARNING, log_path=None):
+        self.log_level = log_level
+        self.log_path = log_path
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.work_dir = work_dir
+        self.columns = max(columns, len(self.HEADER))
+        self.hit_fraction = hit_fraction
+
+    def compare_keys(self, sizes):
+        """Time MAF cache key computation for each size and key scheme; return result rows"""
+        results = []
+        cache = oncokb_cache(self.work_dir, None, self.log_level, self.log_path)
+        for total in sizes:
+            rows = self.get_rows(total)
+            header = next(rows)
+            rows = list(rows)
+            key_functions = {
+                self.LEGACY: cache._make_legacy_maf_key,
+                self.VERSIONED: cache._get_key_function(oncokb_cache_store.MAF, header)
+            }
+            for (scheme, key_func) in key_functions.items():
+                boundary = len(header)
+                start = time.perf_counter()
+                for row in rows:
+                    key_func(row, boundary)
+                wall = round(time.perf_counter() - start, 3)
+                rate = int(total/wall) if wall > 0 else None
+                result = [total, len(header), scheme, wall, rate]
+                self.logger.info("Key benchmark result: {0}".format(result))
+                results.append(result)
+        return results
+
+    def get_rows(self, total):
+        """Generator: synthetic MAF rows, including the header"""
+        rng = random.Random(self.SEED)
+        header = self.HEADER.copy()
+        header.extend(['Extra_{0}'.format(i) for i in range(self.columns - len(self.HEADER))])
+        yield header
+        for i in range(total):
+            ref, alt = rng.sample(self.BASES, 2)
+            row = [
+                'GENE{0}'.format(i % 20000),
+                'chr{0}'.format(i % 22 + 1),
+                str(1000 + i),
+                ref,
+                alt,
+                'p.X{0}Y'.format(i)
+            ]
+            row.extend([str(rng.randint(0, 1000)) for j in range(len(header) - len(row))])
+            yield row
+
+    def populate_cache(self, total):
+        """Write cache annotations for a fraction of rows; return the cache base directory"""
+        cache_base = os.path.join(self.work_dir, 'cache')
+        os.makedirs(cache_base, exist_ok=True)
+        cache = oncokb_cache(cache_base, self.ONCOTREE_CODE, self.log_level, self.log_path)
+        # no legacy JSON to import, but readers only use the store once it is migrated
+        cache.store.migrate(cache.cache_dir)
+        annotations = ['True', 'True', 'True', 'Gain-of-function', '', 'Oncogenic']
+        annotations.extend(['']*(len(cache.ANNOTATION_HEADERS) - len(annotations)))
+        interval = max(1, int(round(1/self.hit_fraction))) if self.hit_fraction > 0 else None
+        items = []
+        rows = self.get_rows(total)
+        header = next(rows)
+        boundary = len(header)
+        key_func = cache._get_key_function(oncokb_cache_store.MAF, header)
+        for (i, row) in enumerate(rows):
+            if interval and i % interval == 0:
+                items.append((key_func(row, boundary), annotations))
+            if len(items) >= cache.CHUNK_SIZE:
+                cache.store.put_many(oncokb_cache_store.MAF, items)
+                items = []
+        if len(items) > 0:
+            cache.store.put_many(oncokb_cache_store.MAF, items)
+        return cache_base
+
+    def run(self, sizes):
+        """Run the benchmark for each size; return a list of result rows"""
+        results = []
+        for total in sizes:
+            maf_path = os.path.join(self.work_dir, 'synthetic_{0}.maf'.format(total))
+            self.write_maf(maf_path, total)
+            cache_base = self.populate_cache(total)
+            out_path = os.path.join(self.work_dir, 'annotated_{0}.maf'.format(total))
+            # a fresh process for each size; also, nothing is read from the in-memory cache
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(
+                    _annotate_maf, cache_base, self.ONCOTREE_CODE, maf_path, out_path
+                )
+                measurements = future.result()
+            wall = measurements[WALL_SECONDS]
+            rate = int(total/wall) if wall > 0 else None
+            result = [
+                total,
+                wall,
+                measurements[CPU_SECONDS],
+                measurements[PEAK_RSS_DELTA_KB],
+                rate
+            ]
+            self.logger.info("Benchmark result: {0}".format(result))
+            results.append(result)
+            os.remove(maf_path)
+            os.remove(out_path)
+        return results
+
+    def stress_update(self, writers, sizes):
+        """
+        Update a new cache concurrently from many writer processes; for each number of rows
+        per writer, return a result row with numbers of annotations expected and found
+        Writers share half their rows, and each makes several updates; all start with a
+        legacy JSON cache to migrate
+        """
+        results = []
+        for total in sizes:
+            cache_base = os.path.join(self.work_dir, 'stress_{0}'.format(total))
+            os.makedirs(cache_base)
+            cache = oncokb_cache(cache_base, self.ONCOTREE_CODE, self.log_level, self.log_path)
+            fusions = {'GENE{0}-GENE{1}'.format(i, i+1): ['True']*len(cache.ANNOTATION_HEADERS)
+                       for i in range(self.STRESS_LEGACY_FUSIONS)}
+            with open(cache._get_legacy_path(oncokb_cache_store.FUSION), 'w') as out_file:
+                out_file.write(json.dumps(fusions))
+            shared = total // 2
+            unique = total - shared
+            paths = []
+            for writer in range(writers):
+                indices = list(range(shared))
+                start = shared + writer*unique
+                indices.extend(range(start, start+unique))
+                for update in range(self.STRESS_UPDATES):
+                    path = os.path.join(cache_base, 'writer_{0}_{1}.maf'.format(writer, update))
+                    self.write_annotated_maf(path, indices[update::self.STRESS_UPDATES])
+                    paths.append(path)
+            start_time = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=writers) as executor:
+                futures = [
+                    executor.submit(
+                        _write_maf_cache, cache_base, self.ONCOTREE_CODE,
+                        paths[i*self.STRESS_UPDATES:(i+1)*self.STRESS_UPDATES]
+                    ) for i in range(writers)
+                ]
+                for future in futures:
+                    future.result()
+            wall = round(time.perf_counter() - start_time, 3)
+            cache.store.compact()
+            expected = shared + writers*unique
+            found = cache.store.count(oncokb_cache_store.MAF)
+            if cache.store.count(oncokb_cache_store.FUSION) != len(fusions):
+                found = None # migration of legacy annotations failed
+            result = [writers, total, expected, found, wall]
+            self.logger.info("Stress test result: {0}".format(result))
+            results.append(result)
+        return results
+
+    def write_annotated_maf(self, path, indices):
+        """Write a MAF with annotations for the given row indices"""
+        header = self.HEADER.copy()
+        header.extend(oncokb_cache.ANNOTATION_HEADERS)
+        annotations = ['True']*len(oncokb_cache.ANNOTATION_HEADERS)
+        with open(path, 'w') as out_file:
+            out_file.write("\t".join(header)+"\n")
+            for i in indices:
+                row = ['GENE{0}'.format(i), 'chr1', str(1000 + i), 'A', 'C', 'p.X{0}Y'.format(i)]
+                row.extend(annotations)
+                out_file.write("\t".join(row)+"\n")
+
+    def write_maf(self, path, total):
+        with open(path, 'w') as out_file:
+            for row in self.get_rows(total):
+                out_file.write("\t".join(row)+"\n")
+        self.logger.debug("Wrote synthetic MAF with {0} rows to {1}".format(total, path))
+
+
+def _annotate_maf(cache_base, oncotree_code, maf_path, out_path):
+    """Annotate a MAF and return measurements; module-level for use in a worker process"""
+    cache = oncokb_cache(cache_base, oncotree_code)
+    result, measurements = measure(cache.annotate_maf, maf_path, out_path)
+    return measurements
+
+def _write_maf_cache(cache_base, oncotree_code, paths):
+    """Update the cache from annotated MAF files; module-level for use in a worker process"""
+    cache = oncokb_cache(cache_base, oncotree_code)
+    for path in paths:
+        cache.write_maf_cache(path)
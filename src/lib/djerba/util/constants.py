@@ -49,6 +49,11 @@ CONFIGURE = 'configure'
 EXTRACT = 'extract'
 RENDER = 'render'
 UPDATE = 'update'
+BATCH = 'batch'
+ONCOKB_CACHE = 'oncokb-cache'
+
+# actions for oncokb-cache mode of djerba.py
+CHECK = 'check'
 
 # mode names for benchmark.py
 # REPORT = 'report' # duplicate of top-level JSON section name; this is fine
@@ -15,6 +15,8 @@ class directory_finder(logger):
     DJERBA_TEST_DIR_VAR = 'DJERBA_TEST_DIR'
     DJERBA_TEST_OUTPUT_DIR_VAR = 'DJERBA_TEST_OUTPUT_DIR'
     DJERBA_CORE_HTML_DIR_VAR = 'DJERBA_CORE_HTML_DIR'
+    DJERBA_REFERENCE_CACHE_DIR_VAR = 'DJERBA_REFERENCE_CACHE_DIR' # optional
+    DJERBA_TEMPLATE_CACHE_DIR_VAR = 'DJERBA_TEMPLATE_CACHE_DIR' # optional
 
     def __init__(self, log_level=logging.WARNING, log_path=None):
         self.logger = self.get_logger(log_level, __name__, log_path)
@@ -48,6 +50,12 @@ class directory_finder(logger):
     def get_private_dir(self):
         return self.get_directory(self.DJERBA_PRIVATE_DIR_VAR)
 
+    def get_reference_cache_dir(self):
+        return self.get_directory(self.DJERBA_REFERENCE_CACHE_DIR_VAR)
+
+    def get_template_cache_dir(self):
+        return self.get_directory(self.DJERBA_TEMPLATE_CACHE_DIR_VAR)
+
     def get_test_dir(self):
         return self.get_directory(self.DJERBA_TEST_DIR_VAR)
 
@@ -73,6 +81,12 @@ class directory_finder(logger):
     def has_valid_private_dir(self):
         return self.has_valid_directory(self.DJERBA_PRIVATE_DIR_VAR)
 
+    def has_valid_reference_cache_dir(self):
+        return self.has_valid_directory(self.DJERBA_REFERENCE_CACHE_DIR_VAR)
+
+    def has_valid_template_cache_dir(self):
+        return self.has_valid_directory(self.DJERBA_TEMPLATE_CACHE_DIR_VAR)
+
     def has_valid_test_dir(self):
         return self.has_valid_directory(self.DJERBA_TEST_DIR_VAR)
 
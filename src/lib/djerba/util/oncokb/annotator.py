@@ -3,12 +3,16 @@
 # The Python scripts in oncokb-annotator do not have a class structure and would be difficult to import
 # Instead, we run them as subprocesses
 
+import csv
+import itertools
 import os
 import logging
 import djerba.core.constants as core_constants
 import djerba.util.oncokb.constants as oncokb_constants
 import djerba.util.constants as constants
+import djerba.util.ini_fields as ini
 from djerba.util.oncokb.cache import oncokb_cache, oncokb_cache_params
+from djerba.util.oncokb.client import oncokb_client
 from djerba.util.logger import logger
 from djerba.util.subprocess_runner import subprocess_runner
 from djerba.util.validator import path_validator
@@ -30,6 +34,9 @@ class annotator_factory(logger):
             log_path=self.log_path
         )
         self.logger.debug("OncoKB cache params: {0}".format(cache_params))
+        # use the OncoKB client instead of annotator scripts, if configured in [core]
+        use_client = config_wrapper.has_param(ini.CORE, core_constants.ONCOKB_CLIENT) and \
+            config_wrapper.get_core_boolean(core_constants.ONCOKB_CLIENT)
         annotator = oncokb_annotator(
             config_wrapper.get_my_string(core_constants.TUMOUR_ID),
             config_wrapper.get_my_string(oncokb_constants.ONCOTREE_CODE),
@@ -37,7 +44,8 @@ class annotator_factory(logger):
             work_dir, # temporary dir -- same as output
             cache_params,
             self.log_level,
-            self.log_path
+            self.log_path,
+            use_client
         )
         return annotator
 
@@ -56,10 +64,11 @@ class oncokb_annotator(logger):
     ]
 
     def __init__(self, tumour_id, oncotree_code, report_dir, scratch_dir=None,
-                 cache_params=None, log_level=logging.WARNING, log_path=None):
+                 cache_params=None, log_level=logging.WARNING, log_path=None, use_client=False):
         # report_dir is for input and (persistent) output; must contain appropriate input files
         # if given, scratch_dir is for working files not needed for final output
         # cache_params is a djerba.extract.oncokb.cache.params object
+        # if use_client is True, query OncoKB with djerba.util.oncokb.client, not with scripts
         self.log_level = log_level
         self.log_path = log_path
         self.logger = self.get_logger(log_level, __name__, log_path)
@@ -72,6 +81,8 @@ class oncokb_annotator(logger):
         else:
             self.scratch_dir = self.report_dir
         self.runner = subprocess_runner(log_level, log_path)
+        self.tumour_id = tumour_id
+        self.oncotree_code = oncotree_code
         # Write sample name and oncotree code to a file, for use by annotation scripts
         self.info_path = os.path.join(self.scratch_dir, oncokb_constants.ONCOKB_CLINICAL_INFO)
         args = [tumour_id, oncotree_code]
@@ -93,6 +104,11 @@ class oncokb_annotator(logger):
         else:
             with open(os.environ[self.ONCOKB_TOKEN_VARIABLE]) as token_file:
                 self.oncokb_token = token_file.read().strip()
+        if use_client and not self.apply_cache:
+            self.logger.debug('Using OncoKB client for annotation')
+            self.client = oncokb_client(self.oncokb_token, log_level=log_level, log_path=log_path)
+        else:
+            self.client = None
         # Set up the cache, if needed
         if self.apply_cache or self.update_cache:
             cache_dir = cache_params.get_cache_dir()
@@ -111,14 +127,17 @@ class oncokb_annotator(logger):
         if self.apply_cache:
             self.cache.annotate_cna(in_path, out_path, self.info_path)
         else:
-            cmd = [
-                'CnaAnnotator.py',
-                '-i', in_path,
-                '-o', out_path,
-                '-c', self.info_path,
-                '-b', self.oncokb_token
-            ]
-            self._run_annotator_script(cmd, 'CNA annotator')
+            if self.client:
+                self.client.annotate_cna(in_path, out_path, self.tumour_id, self.oncotree_code)
+            else:
+                cmd = [
+                    'CnaAnnotator.py',
+                    '-i', in_path,
+                    '-o', out_path,
+                    '-c', self.info_path,
+                    '-b', self.oncokb_token
+                ]
+                self._run_annotator_script(cmd, 'CNA annotator')
             if self.update_cache:
                 self.cache.write_cna_cache(out_path)
         return out_path
@@ -144,14 +163,17 @@ class oncokb_annotator(logger):
         else:
             msg = "Read {0} lines of fusion input, running Fusion annotator".format(total)
             self.logger.debug(msg)
-            cmd = [
-                'FusionAnnotator.py',
-                '-i', in_path,
-                '-o', out_path,
-                '-c', self.info_path,
-                '-b', self.oncokb_token
-            ]
-            self._run_annotator_script(cmd, 'fusion annotator')
+            if self.client:
+                self.client.annotate_fusion(in_path, out_path, self.oncotree_code)
+            else:
+                cmd = [
+                    'FusionAnnotator.py',
+                    '-i', in_path,
+                    '-o', out_path,
+                    '-c', self.info_path,
+                    '-b', self.oncokb_token
+                ]
+                self._run_annotator_script(cmd, 'fusion annotator')
             if self.update_cache:
                 self.cache.write_fusion_cache(out_path)
         return out_path
@@ -163,19 +185,56 @@ class oncokb_annotator(logger):
         if self.apply_cache:
             self.cache.annotate_maf(in_path, out_path)
         else:
-            cmd = [
-                'MafAnnotator.py',
-                '-i', in_path,
-                '-o', out_path,
-                '-c', self.info_path,
-                '-q', 'Genomic_Change',
-                '-b', self.oncokb_token
-            ]
-            self._run_annotator_script(cmd, 'MAF annotator')
+            if self.client:
+                self.client.annotate_maf(in_path, out_path, self.oncotree_code)
+            else:
+                cmd = [
+                    'MafAnnotator.py',
+                    '-i', in_path,
+                    '-o', out_path,
+                    '-c', self.info_path,
+                    '-q', 'Genomic_Change',
+                    '-b', self.oncokb_token
+                ]
+                self._run_annotator_script(cmd, 'MAF annotator')
             if self.update_cache:
                 self.cache.write_maf_cache(out_path)
         return out_path
     
+    def annotate_maf_rows(self, header, rows, in_path=None):
+        """
+        Annotate MAF rows in memory, eg. rows kept by plugin preprocessing; returns the
+        annotated header and rows. The cache and OncoKB client annotate the rows directly.
+        Annotator scripts need an input file: in_path, if it has the same rows (eg. written
+        for reference), or a file written here. Annotated rows are written to the scratch
+        directory for reference, eg. for cache updates with update_cache_files().
+        """
+        out_path = os.path.join(self.scratch_dir, oncokb_constants.ANNOTATED_MAF)
+        if self.apply_cache:
+            [out_header, out_rows] = self.cache.annotate_maf_rows(header, rows)
+        elif self.client:
+            [out_header, out_rows] = self.client.annotate_maf_rows(header, rows, self.oncotree_code)
+        else:
+            if in_path == None:
+                in_path = os.path.join(self.scratch_dir, oncokb_constants.MAF_ANNOTATOR_INPUT)
+                with open(in_path, 'w') as in_file:
+                    writer = csv.writer(in_file, delimiter="\t")
+                    writer.writerow(header)
+                    writer.writerows(rows)
+            # updates the cache, if needed
+            self.annotate_maf(in_path)
+            with open(out_path) as out_file:
+                reader = csv.reader(out_file, delimiter="\t", quoting=csv.QUOTE_NONE)
+                out_header = next(reader)
+                out_rows = list(reader)
+            return [out_header, out_rows]
+        with open(out_path, 'w') as out_file:
+            for row in itertools.chain([out_header], out_rows):
+                out_file.write("\t".join(row)+"\n")
+        if self.update_cache and not self.apply_cache:
+            self.cache.write_maf_cache_rows(out_header, out_rows, out_path)
+        return [out_header, out_rows]
+
     def annotate_biomarkers_maf(self, in_path, out_path):
         """although it uses the same MafAnnotator script, 
         other biomarkers needs to be seperate because 
@@ -185,14 +244,17 @@ class oncokb_annotator(logger):
             self.logger.debug("Applying cache for biomarker annotation")
             self.cache.annotate_maf(in_path, out_path)
         else:
-            cmd = [
-                'MafAnnotator.py',
-                '-i', in_path,
-                '-o', out_path,
-                '-c', self.info_path,
-                '-b', self.oncokb_token
-            ]
-            self._run_annotator_script(cmd, 'MAF annotator')
+            if self.client:
+                self.client.annotate_maf(in_path, out_path, self.oncotree_code, False)
+            else:
+                cmd = [
+                    'MafAnnotator.py',
+                    '-i', in_path,
+                    '-o', out_path,
+                    '-c', self.info_path,
+                    '-b', self.oncokb_token
+                ]
+                self._run_annotator_script(cmd, 'MAF annotator')
             if self.update_cache:
                 self.logger.debug("Updating cache for biomarker annotation")
                 self.cache.write_maf_cache(out_path)
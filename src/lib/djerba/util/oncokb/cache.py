@@ -1,5 +1,15 @@
 """Read/write a cache of oncoKB results; allows faster, offline access"""
 
+# Annotations are kept in an indexed store; see djerba.util.oncokb.cache_store
+# Legacy JSON cache files are read if the store does not exist yet, and imported into the
+# store on its first update. Use migrate_oncokb_cache.py to import them in advance.
+# Lookups are served from memory where possible; see djerba.util.oncokb.cache_manager
+
+# MAF cache keys are versioned. Legacy keys are sha256 digests of all MAF columns before
+# annotation; current keys are the OncoTree code and variant-defining columns, with a
+# version prefix. Current keys are short enough to store as-is, so need no hashing. Rows
+# not found under current keys are looked up under legacy keys, if the cache has any.
+
 # NOTE: OncoKB annotator takes an 'info' file including the OncoTree code as input
 # It is the user's responsibility to ensure cache updates use a consistent OncoTree code
 # (Not expected to be an issue for test data with known OncoTree codes)
@@ -9,9 +19,12 @@ import gzip
 import hashlib
 import json
 import logging
+import operator
 import os
 import re
 from djerba.util.logger import logger
+from djerba.util.oncokb.cache_manager import oncokb_cache_manager
+from djerba.util.oncokb.cache_store import oncokb_cache_store
 from djerba.util.validator import path_validator
 import djerba.util.oncokb.constants as oncokb_constants
 import djerba.util.constants as constants
@@ -63,6 +76,17 @@ class oncokb_cache(logger):
     DEFAULT_MAF_ANNOTATIONS = ["True", "False", "False", "Unknown", '', "Unknown", '', '', '', '',
                                '', '', '', '', '', '', '', '', '', '', '', '', '', '', '', '', '']
 
+    CHUNK_SIZE = 10000 # rows per cache lookup, for streaming annotation
+    BUFFER_SIZE = 1048576 # bytes, for uncompressed input/output
+
+    # versioned MAF keys; required columns, and others used if present
+    MAF_KEY_VERSION = 'v2'
+    MAF_KEY_COLUMNS = ['Chromosome', 'Start_Position', 'Reference_Allele', 'Tumor_Seq_Allele2']
+    MAF_KEY_OPTIONAL_COLUMNS = ['Hugo_Symbol', 'End_Position', 'HGVSp_Short',
+                                'Variant_Classification']
+    # legacy MAF keys are lowercase hex digests, so sort in this range; versioned keys do not
+    LEGACY_MAF_KEY_RANGE = ('0', 'g')
+
     # headers for extra annotation columns
     ANNOTATION_HEADERS = ["ANNOTATED", "GENE_IN_ONCOKB", "VARIANT_IN_ONCOKB", "MUTATION_EFFECT", "MUTATION_EFFECT_CITATIONS", "ONCOGENIC", "LEVEL_1", "LEVEL_2", "LEVEL_3A", "LEVEL_3B", "LEVEL_4", "LEVEL_R1", "LEVEL_R2", "HIGHEST_LEVEL", "HIGHEST_SENSITIVE_LEVEL", "HIGHEST_RESISTANCE_LEVEL", "TX_CITATIONS", "LEVEL_Dx1", "LEVEL_Dx2", "LEVEL_Dx3", "HIGHEST_DX_LEVEL", "DX_CITATIONS", "LEVEL_Px1", "LEVEL_Px2", "LEVEL_Px3", "HIGHEST_PX_LEVEL", "PX_CITATIONS"]
 
@@ -72,41 +96,128 @@ class oncokb_cache(logger):
         self.validator.validate_output_dir(cache_base)
         # if oncotree_code is given, output to a subdirectory
         # avoids cache collision between same variants with different oncotree code
+        self.oncotree_code = oncotree_code.lower() if oncotree_code else ''
         if oncotree_code:
             self.cache_dir = os.path.join(cache_base, oncotree_code.lower())
             if os.path.exists(self.cache_dir):
                 self.logger.debug('Using existing cache subdirectory {0}'.format(self.cache_dir))
             else:
-                os.mkdir(self.cache_dir)
+                # another process may create the subdirectory concurrently
+                os.makedirs(self.cache_dir, exist_ok=True)
                 self.logger.debug('Created cache subdirectory {0}'.format(self.cache_dir))
         else:
             self.cache_dir = cache_base
             self.logger.debug('No OncoTree code given, writing to cache dir {0}'.format(self.cache_dir))
-        # individual cache files need not exist at object creation; may be written later
+        # cache store need not exist at object creation; may be written later
+        store_path = os.path.join(self.cache_dir, oncokb_constants.CACHE_STORE)
+        self.store = oncokb_cache_store(store_path, log_level, log_path)
+        self.manager = oncokb_cache_manager(log_level, log_path)
+        # legacy JSON cache files, read only until the store is migrated
         self.maf_cache = os.path.join(self.cache_dir, oncokb_constants.CACHE_MAF)
         self.cna_cache = os.path.join(self.cache_dir, oncokb_constants.CACHE_CNA)
         self.fusion_cache = os.path.join(self.cache_dir, oncokb_constants.CACHE_FUSION)
 
-    def _initialize_cache(self, cache_input):
-        if cache_input:
-            with open(cache_input) as cache_file:
-                cache = json.loads(cache_file.read())
-                msg = "Read {0} annotations from cache file {1}".format(len(cache), cache_input)
-                self.logger.debug(msg)
+    def _annotate_rows(self, kind, reader, boundary, key_func, defaults, counts):
+        """
+        Generator: annotate rows from the reader, looking up keys one chunk at a time
+        Updates counts of total rows, and rows found in the cache
+        """
+        legacy = self._has_legacy_keys(kind, key_func)
+        for chunk in self._read_chunks(reader):
+            annotations = self._lookup_rows(kind, chunk, boundary, key_func, legacy)
+            for (row, anno) in zip(chunk, annotations):
+                counts['total'] += 1
+                if anno:
+                    row.extend(anno)
+                    counts['found'] += 1
+                else:
+                    row.extend(defaults)
+                yield row
+
+    def _get_legacy_path(self, kind):
+        return os.path.join(self.cache_dir, self.store.JSON_FILENAMES[kind])
+
+    def _get_signature(self, kind):
+        """Modification times and sizes of the cache files on disk; None for missing files"""
+        if self.store.exists():
+            paths = [self.store.db_path]
         else:
-            cache = {}
-            self.logger.debug("No cache input given")
-        return cache
+            paths = [self._get_legacy_path(kind)]
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _get_key_function(self, kind, header):
+        """
+        Return a function of (row, boundary) to make cache keys for rows with the given header
+        MAF rows have versioned keys, if the header has the required columns; otherwise legacy
+        keys. Fusion keys are the fusion ID (column 1, zero-indexed).
+        """
+        if kind == oncokb_cache_store.FUSION:
+            return self._make_fusion_key
+        elif not all([x in header for x in self.MAF_KEY_COLUMNS]):
+            self.logger.debug("MAF header lacks versioned key columns; using legacy keys")
+            return self._make_legacy_maf_key
+        columns = self.MAF_KEY_COLUMNS+[x for x in self.MAF_KEY_OPTIONAL_COLUMNS if x in header]
+        get_values = operator.itemgetter(*[header.index(x) for x in columns])
+        prefix = "{0}\t{1}\t".format(self.MAF_KEY_VERSION, self.oncotree_code)
+        return lambda row, boundary: prefix+"\t".join(get_values(row))
 
-    def _make_maf_key(self, row, boundary):
+    def _has_legacy_keys(self, kind, key_func):
+        """Check if rows not found under versioned keys should be looked up under legacy keys"""
+        if kind != oncokb_cache_store.MAF or key_func == self._make_legacy_maf_key:
+            return False
+        elif self.store.exists():
+            return self.store.has_keys_in_range(kind, *self.LEGACY_MAF_KEY_RANGE)
+        else:
+            return os.path.isfile(self._get_legacy_path(kind))
+
+    def _lookup_rows(self, kind, rows, boundary, key_func, legacy=False):
+        """
+        Return a list of annotations for each row, or None if not found in the cache
+        If legacy is True, MAF rows not found are looked up again under legacy keys
+        """
+        keys = [key_func(row, boundary) for row in rows]
+        cache = self._read_cache(kind, keys)
+        annotations = [cache.get(key) for key in keys]
+        if legacy:
+            missing = [i for i in range(len(rows)) if annotations[i] == None]
+            legacy_keys = [self._make_legacy_maf_key(rows[i], boundary) for i in missing]
+            if len(legacy_keys) > 0:
+                legacy_cache = self._read_cache(kind, legacy_keys)
+                for (i, legacy_key) in zip(missing, legacy_keys):
+                    annotations[i] = legacy_cache.get(legacy_key)
+        return annotations
+
+    def _make_fusion_key(self, row, boundary):
+        return row[1]
+
+    def _make_legacy_maf_key(self, row, boundary):
         base = re.sub("[\r\n]", "", "\t".join(row[0:boundary]))
         return hashlib.sha256(base.encode(constants.TEXT_ENCODING)).hexdigest()
 
-    def _open_maybe_gzip(self, input_path):
-        if re.search('\.gz$', input_path):
-            return gzip.open(input_path, 'rt')
+    def _open_maybe_gzip(self, path, write=False):
+        mode = 'w' if write else 'r'
+        if re.search('\.gz$', path):
+            return gzip.open(path, mode+'t')
         else:
-            return open(input_path)
+            return open(path, mode, buffering=self.BUFFER_SIZE)
+
+    def _read_chunks(self, reader):
+        """Generator: lists of up to CHUNK_SIZE rows from the reader"""
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= self.CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
 
     def _read_oncokb_info(self, info_path):
         rows = 0
@@ -122,11 +233,43 @@ class oncokb_cache(logger):
             raise RuntimeError("Could not parse sample or oncotree code from {0}".format(info_path))
         return [sample, oncotree_code]
 
-    def _write_cache(self, cache, cache_output):
-        with open(cache_output, 'w') as cache_file:
-            cache_file.write(json.dumps(cache))
-        msg = "Wrote {0} annotations to cache file {1}".format(len(cache), cache_output)
+    def _read_cache(self, kind, keys):
+        """Return a dictionary of annotations for those keys found in the cache"""
+        return self.manager.get_many(
+            self.cache_dir,
+            kind,
+            keys,
+            self._get_signature(kind),
+            lambda missing: self._read_cache_from_disk(kind, missing)
+        )
+
+    def _read_cache_from_disk(self, kind, keys):
+        if self.store.exists():
+            return self.store.get_many(kind, keys)
+        legacy_path = self._get_legacy_path(kind)
+        msg = "Cache store {0} not found or not migrated, ".format(self.store.db_path)+\
+            "reading legacy JSON cache {0}".format(legacy_path)
+        self.logger.warning(msg)
+        self.validator.validate_input_file(legacy_path)
+        with open(legacy_path) as cache_file:
+            cache = json.loads(cache_file.read())
+        if kind == oncokb_cache_store.CNA:
+            cache = {
+                self.store.make_cna_key(hugo_symbol, alteration): annotations
+                for (hugo_symbol, alterations) in cache.items()
+                for (alteration, annotations) in alterations.items()
+            }
+        return {key: cache[key] for key in keys if key in cache}
+
+    def _write_cache(self, kind, cache):
+        if not self.store.is_migrated():
+            # first update; carry over any legacy JSON annotations
+            self.store.migrate(self.cache_dir)
+        self.store.put_many(kind, cache.items())
+        msg = "Wrote {0} {1} annotations to cache store {2}".format(
+            len(cache), kind, self.store.db_path)
         self.logger.debug(msg)
+        return self.store.db_path
 
     def annotate_cna(self, input_cna, output_cna, oncokb_info):
         """
@@ -134,12 +277,9 @@ class oncokb_cache(logger):
         No defaults supported; all hugo_symbol/alteration pairs must be in the cache
         This is consistent with our practice of only annotating CNAs found in OncoKB
         """
-        self.validator.validate_input_file(self.cna_cache)
         msg = "Annotating CNA from cache: "+\
               "Input {0}, output {1}, metadata {2}".format(input_cna, output_cna, oncokb_info)
         self.logger.debug(msg)
-        with open(self.cna_cache) as cache_file:
-            cache = json.loads(cache_file.read())
         cna_keys = []
         with open(input_cna) as input_file:
             reader = csv.reader(input_file, delimiter="\t")
@@ -157,6 +297,10 @@ class oncokb_cache(logger):
                     keys = None
                 if keys:
                     cna_keys.append(keys)
+        cache = self._read_cache(
+            oncokb_cache_store.CNA,
+            [self.store.make_cna_key(*keys) for keys in cna_keys[1:]]
+        )
         [sample, oncotree_code] = self._read_oncokb_info(oncokb_info)
         with open(output_cna, 'w') as output_file:
             first = True
@@ -169,7 +313,7 @@ class oncokb_cache(logger):
                 else:
                     row = [sample, oncotree_code, hugo_symbol, alteration]
                     try:
-                        row.extend(cache[hugo_symbol][alteration])
+                        row.extend(cache[self.store.make_cna_key(hugo_symbol, alteration)])
                     except KeyError as err:
                         msg = "No CNA cache value found for [{0}][{1}]".format(hugo_symbol, alteration)
                         self.logger.error(msg)
@@ -183,59 +327,66 @@ class oncokb_cache(logger):
         Annotate a fusion file from the cache
         Cache key is the fusion ID (column 1, zero-indexed)
         """
-        cache_path = self.fusion_cache
         self.logger.debug("Annotating fusion from cache: Input {0}, output {1}".format(input_fusion, output_fusion))
         self.annotate_maf_or_fusion(
-            cache_path, input_fusion, output_fusion, lambda x,i:x[1], self.DEFAULT_FUSION_ANNOTATIONS
+            oncokb_cache_store.FUSION, input_fusion, output_fusion, self.DEFAULT_FUSION_ANNOTATIONS
         )
         self.logger.debug("Fusion annotation done.")
 
     def annotate_maf(self, input_maf, output_maf):
         """Annotate a MAF file from the cache"""
-        cache_path = self.maf_cache
         self.logger.debug("Annotating MAF from cache: Input {0}, output {1}".format(input_maf, output_maf))
         self.annotate_maf_or_fusion(
-            cache_path, input_maf, output_maf, self._make_maf_key, self.DEFAULT_MAF_ANNOTATIONS
+            oncokb_cache_store.MAF, input_maf, output_maf, self.DEFAULT_MAF_ANNOTATIONS
         )
         self.logger.debug("MAF cache annotation done.")
 
-    def annotate_maf_or_fusion(self, cache_path, input_path, output_path, key_func, defaults):
+    def annotate_maf_rows(self, header, rows):
+        """
+        Annotate MAF rows in memory from the cache, eg. rows kept by plugin preprocessing
+        Rows are lists of strings, and are not modified; returns the annotated header and rows
+        """
+        counts = {'found': 0, 'total': 0}
+        key_func = self._get_key_function(oncokb_cache_store.MAF, header)
+        annotated_rows = list(self._annotate_rows(
+            oncokb_cache_store.MAF,
+            (row.copy() for row in rows),
+            len(header),
+            key_func,
+            self.DEFAULT_MAF_ANNOTATIONS,
+            counts
+        ))
+        self.logger.debug("Found annotation for "+\
+                          "{0} of {1} variants".format(counts['found'], counts['total']))
+        return header+self.ANNOTATION_HEADERS, annotated_rows
+
+    def annotate_maf_or_fusion(self, kind, input_path, output_path, defaults):
         """
         Annotate a MAF or Fusion file from the cache; methods differ only by cache keys and defaults
+        Rows are streamed from input to output in chunks, so memory use does not depend on
+        the size of the input. Input and/or output may be gzipped, with a .gz suffix.
         """
-        self.validator.validate_input_file(cache_path)
-        with open(cache_path) as cache_file:
-            cache = json.loads(cache_file.read())
-        reads_from_cache = 0
-        total_reads = 0
-        annotated_rows = []
-        boundary = None # 0-indexed column of first annotation row; needed for MAF annotation
-        with self._open_maybe_gzip(input_path) as input_file:
+        counts = {'found': 0, 'total': 0}
+        with self._open_maybe_gzip(input_path) as input_file, \
+             self._open_maybe_gzip(output_path, write=True) as output_file:
             reader = csv.reader(input_file, delimiter="\t")
-            for row in reader:
-                if not boundary:
-                    boundary = len(row)
-                    row.extend(self.ANNOTATION_HEADERS)
-                else:
-                    key = key_func(row, boundary)
-                    anno = cache.get(key)
-                    total_reads += 1
-                    if anno:
-                        row.extend(anno)
-                        reads_from_cache += 1
-                    else:
-                        row.extend(defaults)
-                annotated_rows.append(row)
+            header = next(reader, None)
+            if header != None:
+                # 0-indexed column of first annotation row; needed for MAF annotation
+                boundary = len(header)
+                key_func = self._get_key_function(kind, header)
+                header.extend(self.ANNOTATION_HEADERS)
+                output_file.write("\t".join(header)+"\n")
+                rows = self._annotate_rows(kind, reader, boundary, key_func, defaults, counts)
+                # not using csv.writer because it appends extra carriage returns
+                for row in rows:
+                    output_file.write("\t".join(row)+"\n")
         self.logger.debug("Found annotation for "+\
-                          "{0} of {1} variants".format(reads_from_cache, total_reads))
-        with open(output_path, 'w') as output_file:
-            # not using csv.writer because it appends extra carriage returns
-            for row in annotated_rows:
-                print("\t".join(row), file=output_file)
+                          "{0} of {1} variants".format(counts['found'], counts['total']))
 
     def update_cache_files(self, report_dir):
         """
-        Update all cache files in cache_dir, with input from report_dir
+        Update the cache in cache_dir, with input from report_dir
         """
         maf = 'maf'
         cna = 'cna'
@@ -245,62 +396,39 @@ class oncokb_cache(logger):
             cna: os.path.join(report_dir, oncokb_constants.DATA_CNA_ONCOKB_GENES_NON_DIPLOID_ANNOTATED),
             fusion: os.path.join(report_dir, oncokb_constants.DATA_FUSIONS_ONCOKB_ANNOTATED)
         }
-        outputs = {
-            maf: self.maf_cache,
-            cna: self.cna_cache,
-            fusion: self.fusion_cache
-        }
         for input_path in inputs.values():
             if not os.path.exists(input_path):
                 msg = "Input file {0} does not exist; ".format(input_path)+\
                       "need to generate report with --no-cleanup option?"
                 self.logger.error(msg)
                 raise RuntimeError(msg)
-        existing = {} # existing cache files, if any
-        for key in outputs.keys():
-            if os.path.exists(outputs[key]):
-                existing[key] = outputs[key]
-            else:
-                existing[key] = None
-        self.write_cna_cache(inputs[cna], outputs[cna], existing[cna])
-        self.write_fusion_cache(inputs[fusion], outputs[fusion], existing[fusion])
-        self.write_maf_cache(inputs[maf], outputs[maf], existing[maf])
+        self.write_cna_cache(inputs[cna])
+        self.write_fusion_cache(inputs[fusion])
+        self.write_maf_cache(inputs[maf])
 
-    def write_cna_cache(self, annotated_cna, cache_output=None, cache_input=None):
+    def write_cna_cache(self, annotated_cna):
         """
         CNA annotation prepends the sample ID and oncotree code (from clinical info file)
         Do not cache these; do cache lookup by Hugo_Symbol and CNV status
         """
         self.logger.debug("Writing CNA cache")
-        if not cache_output:
-            cache_output = self.cna_cache
-        if cache_input==None and os.path.exists(cache_output):
-            cache_input = cache_output
-        cache = self._initialize_cache(cache_input)
+        cache = {}
         with open(annotated_cna) as cna_file:
             reader = csv.reader(cna_file, delimiter="\t")
             for row in reader:
                 hugo_symbol = row[2]
                 alteration = row[3]
-                if not hugo_symbol in cache:
-                    cache[hugo_symbol] = {}
-                cache[hugo_symbol][alteration] = row[4:]
-        self._write_cache(cache, cache_output)
-        return cache_output
+                cache[self.store.make_cna_key(hugo_symbol, alteration)] = row[4:]
+        return self._write_cache(oncokb_cache_store.CNA, cache)
 
-    def write_fusion_cache(self, annotated_fusion, cache_output=None, cache_input=None):
+    def write_fusion_cache(self, annotated_fusion):
         """
-        Create/update the cache with annotations from the given fusion file
-        cache_output and cache_input may be the same file
+        Update the cache with annotations from the given fusion file
         Fusion annotated file includes the sample ID; do not cache this, use fusion ID only
         Fusion ID has old-style "-" separator instead of "::" for consistency with OncoKB inputs
         """
         self.logger.debug("Writing Fusion cache")
-        if not cache_output:
-            cache_output = self.fusion_cache
-        if cache_input==None and os.path.exists(cache_output):
-            cache_input = cache_output
-        cache = self._initialize_cache(cache_input)
+        cache = {}
         with open(annotated_fusion) as fusion_file:
             reader = csv.reader(fusion_file, delimiter="\t")
             for row in reader:
@@ -308,38 +436,41 @@ class oncokb_cache(logger):
                 annotations = row[2:]
                 if annotations!=self.DEFAULT_FUSION_ANNOTATIONS:
                     cache[fusion] = annotations
-        self._write_cache(cache, cache_output)
-        return cache_output
+        return self._write_cache(oncokb_cache_store.FUSION, cache)
 
-    def write_maf_cache(self, annotated_maf, cache_output=None, cache_input=None):
+    def write_maf_cache(self, annotated_maf):
         """
-        Create/update the cache with annotations from the given MAF file
-        cache_output and cache_input may be the same file
+        Update the cache with annotations from the given MAF file
         """
         self.logger.debug("Updating MAF cache from annotated file {0}".format(annotated_maf))
-        if not cache_output:
-            cache_output = self.maf_cache
-        if cache_input==None and os.path.exists(cache_output):
-            cache_input = cache_output
-        cache = self._initialize_cache(cache_input)
-        boundary = None
         with self._open_maybe_gzip(annotated_maf) as maf_file:
             reader = csv.reader(maf_file, delimiter="\t")
-            for row in reader:
-                if not boundary: # find annotation start index from the header
-                    for i in range(len(row)):
-                        if row[i]==self.ANNOTATION_HEADERS[0]:
-                            boundary = i
-                            break
-                    if boundary == None:
-                        msg = "Cannot deduce annotation boundary; MAF input file "+\
-                              "{0} may have no header and/or not be annotated".format(annotated_maf)
-                        self.logger.error(msg)
-                        raise RuntimeError(msg)
-                else:
-                    key = self._make_maf_key(row, boundary)
-                    annotations = row[boundary:]
-                    if annotations[1] == 'True':
-                        cache[key] = annotations
-        self._write_cache(cache, cache_output)
-        return cache_output
+            header = next(reader, None)
+            if header == None:
+                return self._write_cache(oncokb_cache_store.MAF, {})
+            return self.write_maf_cache_rows(header, reader, annotated_maf)
+
+    def write_maf_cache_rows(self, header, rows, source='rows'):
+        """
+        Update the cache with annotated MAF rows in memory; header includes the annotations
+        source is a description of the rows, for error messages
+        """
+        boundary = None
+        # find annotation start index from the header
+        for i in range(len(header)):
+            if header[i]==self.ANNOTATION_HEADERS[0]:
+                boundary = i
+                break
+        if boundary == None:
+            msg = "Cannot deduce annotation boundary; MAF input "+\
+                  "{0} may have no header and/or not be annotated".format(source)
+            self.logger.error(msg)
+            raise RuntimeError(msg)
+        key_func = self._get_key_function(oncokb_cache_store.MAF, header[0:boundary])
+        cache = {}
+        for row in rows:
+            key = key_func(row, boundary)
+            annotations = row[boundary:]
+            if annotations[1] == 'True':
+                cache[key] = annotations
+        return self._write_cache(oncokb_cache_store.MAF, cache)
@@ -0,0 +1,188 @@
+"""
+Check OncoKB cache coverage for report inputs, and optionally pre-warm the cache
+
+Scans report workspaces for the MAF, CNA and fusion files which are annotated from the
+cache, computes their cache keys, and reports how many are found in the cache; per file,
+and in total for each OncoTree code. With apply-cache, MAF and fusion rows not found in
+the cache silently receive default annotations, and CNA rows not found raise an error.
+
+Pre-warming queries OncoKB for the rows not found (with djerba.util.oncokb.client), and
+writes the results to the cache. As for update-cache, MAF annotations are only cached for
+genes known to OncoKB; so some MAF rows may still be reported as not found.
+"""
+
+import csv
+import logging
+import os
+import tempfile
+from djerba.util.logger import logger
+from djerba.util.oncokb.cache import oncokb_cache
+from djerba.util.oncokb.cache_store import oncokb_cache_store
+from djerba.util.oncokb.client import oncokb_client
+from djerba.util.validator import path_validator
+import djerba.util.constants as constants
+import djerba.util.oncokb.constants as oncokb_constants
+
+class oncokb_cache_checker(logger):
+
+    # workspace files annotated from the cache, by kind
+    INPUTS = [
+        (oncokb_cache_store.MAF, 'filtered_maf.tsv'),
+        (oncokb_cache_store.MAF, 'genomic_biomarkers.maf'),
+        (oncokb_cache_store.CNA, oncokb_constants.DATA_CNA_ONCOKB_GENES_NON_DIPLOID),
+        (oncokb_cache_store.FUSION, constants.DATA_FUSIONS_ONCOKB)
+    ]
+    # environment variable for OncoKB token path, as in djerba.util.oncokb.annotator
+    ONCOKB_TOKEN_VARIABLE = 'ONCOKB_TOKEN'
+    HEADER = ['oncotree_code', 'kind', 'path', 'total', 'found', 'hit_rate']
+    TOTAL = 'TOTAL'
+    ALL = 'all'
+
+    def __init__(self, cache_base, log_level=logging.WARNING, log_path=None):
+        self.log_level = log_level
+        self.log_path = log_path
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.validator = path_validator(log_level, log_path)
+        self.cache_base = cache_base
+
+    def check(self, report_dirs, oncotree_code=None, prewarm=False, token=None):
+        """
+        Check cache coverage for inputs in each report directory
+        Returns a list of result rows, as in HEADER; if prewarm is True, fill the cache
+        for rows not found, and report coverage afterwards
+        """
+        inputs = self.find_inputs(report_dirs, oncotree_code)
+        if prewarm:
+            self.prewarm(inputs, token)
+        results = []
+        totals = {}
+        for (code, kind, path) in inputs:
+            header, total, missing = self.find_missing(code, kind, path)
+            found = total - len(missing)
+            results.append(self._get_result_row(code, kind, path, total, found))
+            code_totals = totals.setdefault(code, [0, 0])
+            code_totals[0] += total
+            code_totals[1] += found
+        for (code, (total, found)) in totals.items():
+            results.append(self._get_result_row(code, self.ALL, self.TOTAL, total, found))
+        return results
+
+    def find_inputs(self, report_dirs, oncotree_code=None):
+        """Find inputs in each report directory; return a list of (code, kind, path)"""
+        inputs = []
+        for report_dir in report_dirs:
+            self.validator.validate_input_dir(report_dir)
+            if oncotree_code:
+                code = oncotree_code
+            else:
+                code = self.read_oncotree_code(report_dir)
+            for (kind, filename) in self.INPUTS:
+                path = os.path.join(report_dir, filename)
+                if os.path.isfile(path):
+                    inputs.append((code, kind, path))
+                else:
+                    self.logger.debug("Input {0} not found, omitting".format(path))
+        return inputs
+
+    def find_missing(self, code, kind, path):
+        """
+        Look up rows of an input file in the cache; for CNA, only amplifications and deletions
+        Returns the header, total number of rows, and a list of rows not found
+        """
+        cache = self._get_cache(code)
+        cache_exists = cache.store.exists() or os.path.isfile(cache._get_legacy_path(kind))
+        total = 0
+        missing = []
+        with open(path) as in_file:
+            reader = csv.reader(in_file, delimiter="\t")
+            header = next(reader, None)
+            if kind == oncokb_cache_store.CNA:
+                reader = (row for row in reader if int(row[1]) in oncokb_client.CNA_ALTERATIONS)
+                key_func = self._make_cna_key
+            else:
+                key_func = cache._get_key_function(kind, header)
+            legacy = cache_exists and cache._has_legacy_keys(kind, key_func)
+            for chunk in cache._read_chunks(reader):
+                total += len(chunk)
+                if cache_exists:
+                    annotations = cache._lookup_rows(kind, chunk, len(header), key_func, legacy)
+                    missing.extend([row for (row, x) in zip(chunk, annotations) if x == None])
+                else:
+                    missing.extend(chunk)
+        return (header, total, missing)
+
+    def prewarm(self, inputs, token):
+        """Annotate rows not found in the cache with the OncoKB client, and update the cache"""
+        if token == None:
+            token = self.read_token()
+        client = oncokb_client(token, log_level=self.log_level, log_path=self.log_path)
+        with tempfile.TemporaryDirectory(prefix='djerba_oncokb_prewarm_') as tmp_dir:
+            for (i, (code, kind, path)) in enumerate(inputs):
+                header, total, missing = self.find_missing(code, kind, path)
+                if len(missing) == 0:
+                    self.logger.debug("No rows missing from cache for {0}".format(path))
+                    continue
+                # write the missing rows to a temporary file, for annotation
+                missing_path = os.path.join(tmp_dir, 'missing_{0}.txt'.format(i))
+                annotated_path = os.path.join(tmp_dir, 'annotated_{0}.txt'.format(i))
+                with open(missing_path, 'w') as out_file:
+                    for row in [header]+missing:
+                        out_file.write("\t".join(row)+"\n")
+                self.logger.info("Pre-warming cache for {0} of {1} rows of {2}".format(
+                    len(missing), total, path))
+                cache = self._get_cache(code)
+                if kind == oncokb_cache_store.MAF:
+                    genomic_change = 'Start_Position' in header
+                    client.annotate_maf(missing_path, annotated_path, code, genomic_change)
+                    cache.write_maf_cache(annotated_path)
+                elif kind == oncokb_cache_store.FUSION:
+                    client.annotate_fusion(missing_path, annotated_path, code)
+                    cache.write_fusion_cache(annotated_path)
+                else:
+                    sample = header[1] if len(header) > 1 else ''
+                    client.annotate_cna(missing_path, annotated_path, sample, code)
+                    cache.write_cna_cache(annotated_path)
+
+    def read_oncotree_code(self, report_dir):
+        info_path = os.path.join(report_dir, oncokb_constants.ONCOKB_CLINICAL_INFO)
+        if not os.path.isfile(info_path):
+            msg = "Cannot find OncoTree code for {0}: ".format(report_dir)+\
+                "no {0} file; ".format(oncokb_constants.ONCOKB_CLINICAL_INFO)+\
+                "specify the OncoTree code instead"
+            self.logger.error(msg)
+            raise DjerbaOncokbCacheCheckError(msg)
+        with open(info_path) as info_file:
+            rows = list(csv.DictReader(info_file, delimiter="\t"))
+        return rows[0]['ONCOTREE_CODE']
+
+    def read_token(self):
+        token_path = os.environ.get(self.ONCOKB_TOKEN_VARIABLE)
+        if token_path == None:
+            msg = "Cannot pre-warm cache: environment variable "+\
+                "{0} for OncoKB token path is not set".format(self.ONCOKB_TOKEN_VARIABLE)
+            self.logger.error(msg)
+            raise DjerbaOncokbCacheCheckError(msg)
+        self.validator.validate_input_file(token_path)
+        with open(token_path) as token_file:
+            token = token_file.read().strip()
+        return token
+
+    def write_results(self, results, out_file):
+        out_file.write("\t".join(self.HEADER)+"\n")
+        for row in results:
+            out_file.write("\t".join([str(x) for x in row])+"\n")
+
+    def _get_cache(self, code):
+        return oncokb_cache(self.cache_base, code, self.log_level, self.log_path)
+
+    def _get_result_row(self, code, kind, path, total, found):
+        hit_rate = '{0:.3f}'.format(found/total) if total > 0 else 'NA'
+        return [code, kind, path, total, found, hit_rate]
+
+    def _make_cna_key(self, row, boundary):
+        alteration = oncokb_client.CNA_ALTERATIONS[int(row[1])]
+        return oncokb_cache_store.make_cna_key(row[0], alteration)
+
+
+class DjerbaOncokbCacheCheckError(Exception):
+    pass
@@ -0,0 +1,97 @@
+"""
+Process-wide in-memory cache of OncoKB annotations, shared by all oncokb_cache instances
+
+Several plugins in the same report (and reports in the same batch) annotate from the same
+OncoKB cache; the manager keeps annotations in memory once they have been read, so repeated
+lookups do not go back to disk. Keys not found on disk are remembered too, so repeated
+misses are also served from memory.
+
+Entries are partitioned by cache directory (which includes the OncoTree subdirectory, if
+any) and kind of annotation. Each partition has a signature, eg. the modification time
+and size of its files on disk; if the signature changes, entries for that partition are
+discarded. The total number of entries is bounded, with least-recently-used eviction.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from djerba.util.logger import logger
+
+class oncokb_cache_manager(logger):
+
+    MAX_ENTRIES = 100000
+
+    # process-wide state, shared by all manager instances
+    # entries are indexed by (cache_dir, kind, key); value is None for a key not found on disk
+    _entries = OrderedDict()
+    _signatures = {}
+    _lock = threading.Lock()
+    _stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def __init__(self, log_level=logging.WARNING, log_path=None):
+        self.logger = self.get_logger(log_level, __name__, log_path)
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._entries.clear()
+            cls._signatures.clear()
+            cls._stats.update({'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0})
+
+    @classmethod
+    def get_cache_stats(cls):
+        """Return counts of hits, misses, evictions, and partition invalidations"""
+        with cls._lock:
+            stats = dict(cls._stats)
+            stats['entries'] = len(cls._entries)
+        return stats
+
+    def get_many(self, cache_dir, kind, keys, signature, read_function):
+        """
+        Return a dictionary of annotations for those keys found in the cache
+        - signature: state of the cache on disk; if changed, in-memory entries are discarded
+        - read_function: input a list of keys, return a dictionary of annotations from disk
+        """
+        partition = (cache_dir, kind)
+        results = {}
+        missing = []
+        with self._lock:
+            if self._signatures.get(partition) != signature:
+                self._invalidate(partition)
+                self._signatures[partition] = signature
+            for key in set(keys):
+                entry_key = (cache_dir, kind, key)
+                if entry_key in self._entries:
+                    self._entries.move_to_end(entry_key)
+                    value = self._entries[entry_key]
+                    if value is not None:
+                        results[key] = value
+                    self._stats['hits'] += 1
+                else:
+                    missing.append(key)
+                    self._stats['misses'] += 1
+        hits = len(set(keys)) - len(missing)
+        self.logger.debug("OncoKB {0} cache in {1}: {2} keys found in memory, {3} read".format(
+            kind, cache_dir, hits, len(missing)))
+        if len(missing) > 0:
+            found = read_function(missing)
+            with self._lock:
+                # omit if the partition was invalidated while reading
+                if self._signatures.get(partition) == signature:
+                    for key in missing:
+                        self._entries[(cache_dir, kind, key)] = found.get(key)
+                    while len(self._entries) > self.MAX_ENTRIES:
+                        self._entries.popitem(last=False)
+                        self._stats['evictions'] += 1
+            results.update(found)
+        return results
+
+    def _invalidate(self, partition):
+        # call with the lock held
+        stale = [x for x in self._entries.keys() if x[0:2] == partition]
+        for entry_key in stale:
+            del self._entries[entry_key]
+        if partition in self._signatures:
+            self._stats['invalidations'] += 1
+            self.logger.debug("Discarded {0} in-memory entries for OncoKB cache {1}".format(
+                len(stale), partition))
@@ -0,0 +1,245 @@
+"""
+Indexed store for OncoKB cache annotations
+
+The legacy cache is a set of JSON files (MAF, CNA, fusion) which are read in full for every
+lookup, and rewritten in full for every update. The store is an SQLite database with one row
+per annotation, keyed by kind (maf, cna or fusion) and cache key; the store may hold both
+legacy and versioned MAF keys, see djerba.util.oncokb.cache. Lookups are index queries,
+and updates insert or replace only the annotations which have changed.
+
+Partitioning by OncoTree code is unchanged: the store lives in the same (OncoTree-specific)
+cache directory as the legacy JSON files. Until the JSON files have been imported, readers
+use them instead of the store.
+
+Concurrent updates, eg. from simultaneous report runs, are safe: each update is a single
+transaction, which takes the write lock before reading or writing; concurrent writers wait
+for each other, up to a timeout. Legacy JSON files are imported once, in a transaction
+which records the migration.
+
+The database uses the default rollback journal, not WAL mode: WAL needs shared memory, so
+does not work for processes on different hosts. Processes on different hosts may share the
+cache directory, but its filesystem must support POSIX advisory locks (fcntl); eg. NFS
+with locking enabled, not a filesystem mounted with 'nolock'. Otherwise, concurrent updates
+may corrupt the database.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from djerba.util.logger import logger
+import djerba.util.oncokb.constants as oncokb_constants
+
+class oncokb_cache_store(logger):
+
+    SCHEMA_VERSION = '1'
+    BATCH_SIZE = 500 # below the SQLite limit on parameters in a query
+    TIMEOUT = 300 # seconds to wait for a concurrent writer
+    MIGRATED = 'migrated' # metadata key
+
+    MAF = 'maf'
+    CNA = 'cna'
+    FUSION = 'fusion'
+    KINDS = [MAF, CNA, FUSION]
+
+    # legacy JSON cache filenames
+    JSON_FILENAMES = {
+        MAF: oncokb_constants.CACHE_MAF,
+        CNA: oncokb_constants.CACHE_CNA,
+        FUSION: oncokb_constants.CACHE_FUSION
+    }
+
+    def __init__(self, db_path, log_level=logging.WARNING, log_path=None):
+        self.log_level = log_level
+        self.log_path = log_path
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.db_path = db_path
+        self.initialized = False
+        self.ready = False # migration is never undone, so only check until it is done
+
+    @staticmethod
+    def make_cna_key(hugo_symbol, alteration):
+        return "{0}\t{1}".format(hugo_symbol, alteration)
+
+    def compact(self):
+        """Rebuild the database file, to reclaim space left by replaced annotations"""
+        with self._connect() as conn:
+            pages_before = conn.execute('PRAGMA page_count').fetchone()[0]
+            try:
+                conn.execute('VACUUM')
+            except sqlite3.OperationalError as err:
+                # eg. timeout waiting for concurrent readers or writers
+                self.logger.warning("Cannot compact {0}: {1}".format(self.db_path, err))
+                return False
+            pages_after = conn.execute('PRAGMA page_count').fetchone()[0]
+        self.logger.debug("Compacted {0} from {1} to {2} pages".format(
+            self.db_path, pages_before, pages_after))
+        return True
+
+    def count(self, kind):
+        self._validate_kind(kind)
+        query = 'SELECT COUNT(*) FROM annotations WHERE kind = ?'
+        with self._connect() as conn:
+            total = conn.execute(query, (kind,)).fetchone()[0]
+        return total
+
+    def exists(self):
+        """
+        Check if the store is ready to read: the database exists, and migrate() has committed.
+        Until then, eg. while another process migrates legacy JSON files, readers use the JSON.
+        """
+        if not self.ready and os.path.isfile(self.db_path):
+            # query directly, so a reader does not create tables or wait to initialize them
+            query = 'SELECT value FROM metadata WHERE key = ?'
+            with closing(sqlite3.connect(self.db_path, timeout=self.TIMEOUT)) as conn:
+                try:
+                    self.ready = conn.execute(query, (self.MIGRATED,)).fetchone() != None
+                except sqlite3.OperationalError as err:
+                    # tables not yet created by a writer
+                    self.logger.debug("Cache store {0} not ready: {1}".format(self.db_path, err))
+        return self.ready
+
+    def get_many(self, kind, keys):
+        """Return a dictionary of annotation lists for those keys found in the store"""
+        self._validate_kind(kind)
+        keys = list(set(keys))
+        results = {}
+        with self._connect() as conn:
+            for i in range(0, len(keys), self.BATCH_SIZE):
+                batch = keys[i:i+self.BATCH_SIZE]
+                query = 'SELECT key, annotations FROM annotations '+\
+                    'WHERE kind = ? AND key IN ({0})'.format(','.join(['?']*len(batch)))
+                for (key, annotations) in conn.execute(query, [kind]+batch):
+                    results[key] = json.loads(annotations)
+        self.logger.debug("Found {0} of {1} {2} keys in cache store".format(
+            len(results), len(keys), kind))
+        return results
+
+    def has_keys_in_range(self, kind, low, high):
+        """Check for any key with low <= key < high; an index query, does not scan the table"""
+        self._validate_kind(kind)
+        query = 'SELECT 1 FROM annotations WHERE kind = ? AND key >= ? AND key < ? LIMIT 1'
+        with self._connect() as conn:
+            found = conn.execute(query, (kind, low, high)).fetchone() != None
+        return found
+
+    def import_json(self, kind, json_path, replace=True):
+        """
+        Import annotations from a legacy JSON cache file
+        If replace is False, annotations already in the store are kept
+        """
+        self._validate_kind(kind)
+        with self._connect() as conn:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                total = self._import_json(conn, kind, json_path, replace)
+        return total
+
+    def is_migrated(self):
+        """Check if legacy JSON files have been imported by migrate()"""
+        query = 'SELECT value FROM metadata WHERE key = ?'
+        with self._connect() as conn:
+            result = conn.execute(query, (self.MIGRATED,)).fetchone()
+        return result != None
+
+    def migrate(self, cache_dir, force=False):
+        """
+        Import any legacy JSON cache files in cache_dir, in a single transaction
+        Unless force is True, do nothing if already migrated, and keep any annotations
+        already in the store; these are newer than the JSON files
+        Returns a dictionary of annotation totals imported, indexed by kind
+        """
+        totals = {}
+        with self._connect() as conn:
+            with conn:
+                # take the write lock first, so concurrent callers migrate only once
+                conn.execute('BEGIN IMMEDIATE')
+                query = 'SELECT value FROM metadata WHERE key = ?'
+                if conn.execute(query, (self.MIGRATED,)).fetchone() != None and not force:
+                    self.logger.debug("Cache store {0} already migrated".format(self.db_path))
+                    return totals
+                for kind in self.KINDS:
+                    json_path = os.path.join(cache_dir, self.JSON_FILENAMES[kind])
+                    if os.path.isfile(json_path):
+                        totals[kind] = self._import_json(conn, kind, json_path, force)
+                conn.execute('INSERT OR REPLACE INTO metadata VALUES (?, ?)',
+                             (self.MIGRATED, 'true'))
+        return totals
+
+    def put_many(self, kind, items):
+        """
+        Insert or replace annotations in a single transaction
+        items is an iterable of (key, annotation list) pairs; returns the number written
+        """
+        self._validate_kind(kind)
+        with self._connect() as conn:
+            with conn: # commits the transaction, or rolls back on error
+                # take the write lock at the start, so a concurrent writer waits for it
+                conn.execute('BEGIN IMMEDIATE')
+                total = self._insert(conn, kind, items)
+        self.logger.debug("Wrote {0} {1} annotations to cache store".format(total, kind))
+        return total
+
+    def _connect(self):
+        # sqlite3 connection context managers do not close the connection, so use closing()
+        conn = sqlite3.connect(self.db_path, timeout=self.TIMEOUT)
+        if not self.initialized:
+            self._initialize(conn)
+            self.initialized = True
+        return closing(conn)
+
+    def _import_json(self, conn, kind, json_path, replace):
+        with open(json_path) as json_file:
+            cache = json.loads(json_file.read())
+        if kind == self.CNA:
+            # legacy CNA cache is nested by Hugo symbol, then alteration
+            items = [
+                (self.make_cna_key(hugo_symbol, alteration), annotations)
+                for (hugo_symbol, alterations) in cache.items()
+                for (alteration, annotations) in alterations.items()
+            ]
+        else:
+            items = cache.items()
+        total = self._insert(conn, kind, items, replace)
+        self.logger.info("Imported {0} {1} annotations from {2}".format(total, kind, json_path))
+        return total
+
+    def _initialize(self, conn):
+        # WAL mode is persistent; revert stores written by earlier versions, which used it
+        if conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            mode = conn.execute('PRAGMA journal_mode=DELETE').fetchone()[0]
+            if mode == 'wal':
+                # needs exclusive access; another instance will try again
+                msg = "Cannot change {0} from WAL to rollback journal, ".format(self.db_path)+\
+                    "database is in use"
+                self.logger.warning(msg)
+        # create tables if needed; check first, so readers do not take the write lock
+        query = "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'annotations'"
+        if conn.execute(query).fetchone() != None:
+            return
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)')
+            conn.execute('INSERT OR IGNORE INTO metadata VALUES (?, ?)',
+                         ('schema_version', self.SCHEMA_VERSION))
+            conn.execute('CREATE TABLE IF NOT EXISTS annotations '+\
+                         '(kind TEXT, key TEXT, annotations TEXT, PRIMARY KEY (kind, key)) '+\
+                         'WITHOUT ROWID')
+
+    def _insert(self, conn, kind, items, replace=True):
+        action = 'REPLACE' if replace else 'IGNORE'
+        insert = 'INSERT OR {0} INTO annotations VALUES (?, ?, ?)'.format(action)
+        rows = [(kind, key, json.dumps(annotations)) for (key, annotations) in items]
+        conn.executemany(insert, rows)
+        return len(rows)
+
+    def _validate_kind(self, kind):
+        if kind not in self.KINDS:
+            msg = "Unknown OncoKB cache kind '{0}', expected one of {1}".format(kind, self.KINDS)
+            self.logger.error(msg)
+            raise DjerbaOncokbCacheError(msg)
+
+
+class DjerbaOncokbCacheError(Exception):
+    pass
@@ -0,0 +1,388 @@
+"""
+Annotate MAF, CNA and fusion files by querying the OncoKB web API directly
+
+An alternative to running the oncokb-annotator scripts in subprocesses:
+- Queries are deduplicated, and sent to OncoKB in batches
+- Results are kept in memory for the whole process (see djerba.util.oncokb.cache_manager);
+  so a variant queried for one input is not queried again, for the same or another input,
+  in the same report or in later reports run by the same process
+- HTTP connections are pooled, and failed requests are retried with exponential backoff
+- Output has the same columns as output from the oncokb-annotator scripts
+
+The OncoKB base URL defaults to the public server; it may be overridden with the ONCOKB_URL
+environment variable, eg. for testing with djerba.util.oncokb.mock_server.
+"""
+
+import csv
+import json
+import logging
+import os
+import re
+import threading
+from djerba.util.logger import logger
+from djerba.util.oncokb.cache import oncokb_cache
+from djerba.util.oncokb.cache_manager import oncokb_cache_manager
+import djerba.util.oncokb.constants as oncokb_constants
+
+class oncokb_client(logger):
+
+    DEFAULT_URL = 'https://www.oncokb.org'
+    URL_VARIABLE = 'ONCOKB_URL'
+    BATCH_SIZE = 100 # queries per request
+    POOL_SIZE = 10
+    RETRIES = 5
+    BACKOFF_FACTOR = 1.0 # wait 1, 2, 4, ... seconds between retries
+    RETRY_STATUS = [429, 500, 502, 503, 504]
+    TIMEOUT = 120 # seconds
+
+    # API endpoints
+    GENOMIC_CHANGE = '/api/v1/annotate/mutations/byGenomicChange'
+    PROTEIN_CHANGE = '/api/v1/annotate/mutations/byProteinChange'
+    COPY_NUMBER = '/api/v1/annotate/copyNumberAlterations'
+    STRUCTURAL_VARIANT = '/api/v1/annotate/structuralVariants'
+
+    DEFAULT_REFERENCE_GENOME = 'GRCh37' # consistent with oncokb-annotator
+    CNA_ALTERATIONS = {2: 'Amplification', -2: 'Deletion'}
+    CNA_TYPES = {'Amplification': 'AMPLIFICATION', 'Deletion': 'DELETION'}
+
+    # HTTP sessions, shared by all client instances in the process
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
+    def __init__(self, token, base_url=None, log_level=logging.WARNING, log_path=None):
+        self.log_level = log_level
+        self.log_path = log_path
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.token = token
+        if base_url:
+            self.base_url = base_url
+        else:
+            self.base_url = os.environ.get(self.URL_VARIABLE, self.DEFAULT_URL)
+        self.base_url = self.base_url.rstrip('/')
+        self.manager = oncokb_cache_manager(log_level, log_path)
+
+    def _annotate_rows(self, rows, header, endpoint, query_function, defaults, counts):
+        """
+        Generator: annotate rows in chunks, extending each row with its annotations
+        query_function inputs a row and header, and returns a query (or None)
+        Updates counts of total rows, and rows with a query
+        """
+        for chunk in self._read_chunks(rows):
+            keys = []
+            queries = {}
+            for row in chunk:
+                query = query_function(row, header)
+                key = self._get_key(query) if query else None
+                if key:
+                    queries[key] = query
+                keys.append(key)
+            annotations = self.annotate(endpoint, queries)
+            for (row, key) in zip(chunk, keys):
+                counts['total'] += 1
+                if key:
+                    row.extend(annotations[key])
+                    counts['found'] += 1
+                else:
+                    row.extend(defaults)
+                yield row
+
+    def _annotate_table(self, in_path, out_path, endpoint, query_function, defaults):
+        """Annotate a tab-delimited file with a header, in chunks of rows"""
+        counts = {'found': 0, 'total': 0}
+        with open(in_path) as in_file, open(out_path, 'w') as out_file:
+            reader = csv.reader(in_file, delimiter="\t")
+            header = next(reader, None)
+            if header == None:
+                return
+            out_file.write("\t".join(header+oncokb_cache.ANNOTATION_HEADERS)+"\n")
+            rows = self._annotate_rows(reader, header, endpoint, query_function, defaults, counts)
+            for row in rows:
+                out_file.write("\t".join(row)+"\n")
+        self.logger.debug("Annotated {0} of {1} rows from {2}".format(
+            counts['found'], counts['total'], in_path))
+
+    def _get_genomic_query(self, row, header, tumour_type):
+        fields = {}
+        for name in ['Chromosome', 'Start_Position', 'End_Position', 'Reference_Allele',
+                     'Tumor_Seq_Allele1', 'Tumor_Seq_Allele2']:
+            if name not in header:
+                return None
+            fields[name] = row[header.index(name)]
+        ref = fields['Reference_Allele']
+        if fields['Tumor_Seq_Allele1'] != ref:
+            alt = fields['Tumor_Seq_Allele1']
+        else:
+            alt = fields['Tumor_Seq_Allele2']
+        location = ','.join([
+            re.sub('^chr', '', fields['Chromosome']),
+            fields['Start_Position'],
+            fields['End_Position'],
+            ref,
+            alt
+        ])
+        if 'NCBI_Build' in header and row[header.index('NCBI_Build')] != '':
+            reference_genome = row[header.index('NCBI_Build')]
+        else:
+            reference_genome = self.DEFAULT_REFERENCE_GENOME
+        query = {
+            'genomicLocation': location,
+            'referenceGenome': reference_genome,
+            'tumorType': tumour_type
+        }
+        return query
+
+    def _get_key(self, query):
+        return json.dumps(query, sort_keys=True)
+
+    def _get_maf_query(self, tumour_type, genomic_change):
+        """Return the endpoint and query function for MAF annotation"""
+        if genomic_change:
+            query_function = lambda row, header: self._get_genomic_query(row, header, tumour_type)
+            endpoint = self.GENOMIC_CHANGE
+        else:
+            query_function = lambda row, header: self._get_protein_query(row, header, tumour_type)
+            endpoint = self.PROTEIN_CHANGE
+        return [endpoint, query_function]
+
+    def _get_protein_query(self, row, header, tumour_type):
+        upper_header = [x.upper() for x in header]
+        if 'HUGO_SYMBOL' not in upper_header:
+            return None
+        hugo_symbol = row[upper_header.index('HUGO_SYMBOL')]
+        alteration = None
+        for name in ['HGVSP_SHORT', 'ALTERATION']:
+            if name in upper_header and row[upper_header.index(name)] != '':
+                alteration = re.sub('^p\\.', '', row[upper_header.index(name)])
+                break
+        if alteration == None:
+            return None
+        query = {
+            'gene': {'hugoSymbol': hugo_symbol},
+            'alteration': alteration,
+            'tumorType': tumour_type
+        }
+        return query
+
+    def _get_session(self):
+        key = (self.base_url, os.getpid())
+        with self._sessions_lock:
+            if key not in self._sessions:
+                # requests is slow to import, so only import when needed
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+                retry = Retry(
+                    total=self.RETRIES,
+                    backoff_factor=self.BACKOFF_FACTOR,
+                    status_forcelist=self.RETRY_STATUS,
+                    allowed_methods=['POST'],
+                    raise_on_status=False # return the last response, and raise an error below
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=self.POOL_SIZE,
+                    pool_maxsize=self.POOL_SIZE,
+                    max_retries=retry
+                )
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[key] = session
+        return self._sessions[key]
+
+    def _post(self, endpoint, queries):
+        """Send a list of queries to the endpoint, in batches; return a list of responses"""
+        url = self.base_url+endpoint
+        headers = {
+            'Authorization': 'Bearer {0}'.format(self.token),
+            'Content-Type': 'application/json'
+        }
+        session = self._get_session()
+        responses = []
+        for i in range(0, len(queries), self.BATCH_SIZE):
+            batch = queries[i:i+self.BATCH_SIZE]
+            self.logger.debug("Sending {0} queries to {1}".format(len(batch), url))
+            result = session.post(url, headers=headers, json=batch, timeout=self.TIMEOUT)
+            if result.status_code != 200:
+                # do not log the headers, which include the access token
+                msg = "OncoKB request to {0} failed with status {1}: {2}".format(
+                    url, result.status_code, result.text[0:1000])
+                self.logger.error(msg)
+                raise DjerbaOncokbClientError(msg)
+            batch_responses = result.json()
+            if len(batch_responses) != len(batch):
+                msg = "Expected {0} responses from {1}, found {2}".format(
+                    len(batch), url, len(batch_responses))
+                self.logger.error(msg)
+                raise DjerbaOncokbClientError(msg)
+            responses.extend(batch_responses)
+        return responses
+
+    def _read_chunks(self, reader):
+        # same chunking as for annotation from the cache
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= oncokb_cache.CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+
+    def annotate(self, endpoint, queries):
+        """
+        Input a dictionary of queries indexed by key; return a dictionary of annotations
+        Annotations are lists of values for oncokb_cache.ANNOTATION_HEADERS
+        Only queries not already known to the process are sent to OncoKB
+        """
+        def read_function(keys):
+            responses = self._post(endpoint, [queries[key] for key in keys])
+            return {key: get_annotations(x) for (key, x) in zip(keys, responses)}
+        # signature is constant; responses from the server are not expected to change
+        # during the lifetime of the process
+        return self.manager.get_many(self.base_url, endpoint, queries.keys(), None, read_function)
+
+    def annotate_cna(self, in_path, out_path, sample, tumour_type):
+        """
+        Annotate a CNA file; one row per gene, with the CNA state for a single sample
+        Output has one row for each amplification or deep deletion, as for CnaAnnotator.py
+        """
+        alterations = []
+        with open(in_path) as in_file:
+            reader = csv.reader(in_file, delimiter="\t")
+            next(reader, None)
+            for row in reader:
+                alteration = self.CNA_ALTERATIONS.get(int(row[1]))
+                if alteration:
+                    alterations.append((row[0], alteration))
+        keys = []
+        queries = {}
+        for (hugo_symbol, alteration) in alterations:
+            query = {
+                'gene': {'hugoSymbol': hugo_symbol},
+                'copyNameAlterationType': self.CNA_TYPES[alteration],
+                'tumorType': tumour_type
+            }
+            key = self._get_key(query)
+            keys.append(key)
+            queries[key] = query
+        annotations = self.annotate(self.COPY_NUMBER, queries)
+        with open(out_path, 'w') as out_file:
+            header = ['SAMPLE_ID', 'CANCER_TYPE', 'HUGO_SYMBOL', 'ALTERATION']
+            header.extend(oncokb_cache.ANNOTATION_HEADERS)
+            out_file.write("\t".join(header)+"\n")
+            for (key, (hugo_symbol, alteration)) in zip(keys, alterations):
+                row = [sample, tumour_type, hugo_symbol, alteration]
+                row.extend(annotations[key])
+                out_file.write("\t".join(row)+"\n")
+        self.logger.debug("Wrote {0} annotated CNA rows to {1}".format(len(alterations), out_path))
+
+    def annotate_fusion(self, in_path, out_path, tumour_type):
+        """Annotate a fusion file with Tumor_Sample_Barcode and Fusion columns"""
+        def query_function(row, header):
+            fusion = row[header.index('Fusion')]
+            genes = re.split('-', fusion)
+            gene_a = genes[0]
+            gene_b = genes[1] if len(genes) > 1 and genes[1] != 'intragenic' else gene_a
+            query = {
+                'geneA': {'hugoSymbol': gene_a},
+                'geneB': {'hugoSymbol': gene_b},
+                'structuralVariantType': 'FUSION',
+                'functionalFusion': True,
+                'tumorType': tumour_type
+            }
+            return query
+        self._annotate_table(in_path, out_path, self.STRUCTURAL_VARIANT, query_function,
+                             oncokb_cache.DEFAULT_FUSION_ANNOTATIONS)
+
+    def annotate_maf(self, in_path, out_path, tumour_type, genomic_change=True):
+        """
+        Annotate a MAF file
+        If genomic_change is True, query by genomic location; otherwise, by protein change
+        (using HGVSp_Short if present, or ALTERATION), as for MafAnnotator.py
+        """
+        [endpoint, query_function] = self._get_maf_query(tumour_type, genomic_change)
+        self._annotate_table(in_path, out_path, endpoint, query_function,
+                             oncokb_cache.DEFAULT_MAF_ANNOTATIONS)
+
+    def annotate_maf_rows(self, header, rows, tumour_type, genomic_change=True):
+        """
+        Annotate MAF rows in memory, eg. rows kept by plugin preprocessing
+        Rows are lists of strings, and are not modified; returns the annotated header and rows
+        """
+        [endpoint, query_function] = self._get_maf_query(tumour_type, genomic_change)
+        counts = {'found': 0, 'total': 0}
+        annotated_rows = list(self._annotate_rows(
+            (row.copy() for row in rows),
+            header,
+            endpoint,
+            query_function,
+            oncokb_cache.DEFAULT_MAF_ANNOTATIONS,
+            counts
+        ))
+        self.logger.debug("Annotated {0} of {1} MAF rows".format(counts['found'], counts['total']))
+        return header+oncokb_cache.ANNOTATION_HEADERS, annotated_rows
+
+
+def get_annotations(response):
+    """
+    Convert an OncoKB API response to a list of values for oncokb_cache.ANNOTATION_HEADERS
+    Follows the conventions of oncokb-annotator, eg. drugs separated by '+' in a treatment,
+    and treatments by ',' in a level
+    """
+    levels = oncokb_constants.ANNOTATION_THERAPY_LEVELS
+    drugs = {level: [] for level in levels}
+    treatments = response.get('treatments', [])
+    for treatment in treatments:
+        level = treatment.get('level')
+        if level in drugs:
+            names = [x.get('drugName') for x in treatment.get('drugs', [])]
+            drugs[level].append('+'.join(names))
+    diagnostic = response.get('diagnosticImplications', [])
+    prognostic = response.get('prognosticImplications', [])
+    mutation_effect = response.get('mutationEffect') or {}
+    highest_sensitive = response.get('highestSensitiveLevel') or ''
+    highest_resistance = response.get('highestResistanceLevel') or ''
+    annotations = [
+        'True',
+        str(bool(response.get('geneExist'))),
+        str(bool(response.get('variantExist'))),
+        mutation_effect.get('knownEffect') or oncokb_constants.UNKNOWN,
+        _get_citations([mutation_effect.get('citations') or {}]),
+        response.get('oncogenic') or oncokb_constants.UNKNOWN
+    ]
+    annotations.extend([','.join(drugs[level]) for level in levels])
+    annotations.extend([
+        highest_sensitive if highest_sensitive else highest_resistance,
+        highest_sensitive,
+        highest_resistance,
+        _get_citations(treatments)
+    ])
+    annotations.extend(_get_implications(diagnostic, 'LEVEL_Dx'))
+    annotations.append(response.get('highestDiagnosticImplicationLevel') or '')
+    annotations.append(_get_citations(diagnostic))
+    annotations.extend(_get_implications(prognostic, 'LEVEL_Px'))
+    annotations.append(response.get('highestPrognosticImplicationLevel') or '')
+    annotations.append(_get_citations(prognostic))
+    return annotations
+
+def _get_citations(items):
+    """PubMed IDs and abstract links, separated by ';' without duplicates"""
+    citations = []
+    for item in items:
+        citations.extend(item.get('pmids', []))
+        citations.extend([x.get('link') for x in item.get('abstracts', [])])
+    return ';'.join([str(x) for x in dict.fromkeys(citations)])
+
+def _get_implications(implications, prefix):
+    """Tumour type names for each of levels 1-3 of diagnostic or prognostic implications"""
+    names = {'{0}{1}'.format(prefix, i): [] for i in range(1, 4)}
+    for implication in implications:
+        level = implication.get('levelOfEvidence')
+        if level in names:
+            tumour_type = implication.get('tumorType') or {}
+            names[level].append(tumour_type.get('name', ''))
+    return [','.join(names[key]) for key in sorted(names.keys())]
+
+
+class DjerbaOncokbClientError(Exception):
+    pass
@@ -0,0 +1,148 @@
+"""
+Local stand-in for the OncoKB annotation API, for testing
+
+Serves the annotation endpoints used by djerba.util.oncokb.client on a local port, with
+fixed responses for a few known genes. Records the requests received, so tests can check
+batching and deduplication; can also fail a given number of requests, to test retries.
+
+Usage:
+    with mock_oncokb_server() as server:
+        client = oncokb_client(server.TOKEN, server.url)
+"""
+
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from djerba.util.logger import logger
+
+class mock_oncokb_server(logger):
+
+    TOKEN = 'mock-oncokb-token'
+    HOST = '127.0.0.1'
+
+    # known genes, and their highest level of sensitivity
+    KNOWN_GENES = {
+        'BRAF': 'LEVEL_1',
+        'ERBB2': 'LEVEL_1',
+        'KRAS': 'LEVEL_1',
+        'NTRK1': 'LEVEL_1',
+        'PIK3CA': 'LEVEL_3A'
+    }
+    # genomic locations of known variants, as in a query by genomic change
+    KNOWN_LOCATIONS = {
+        '12,25245350,25245350,C,T': 'KRAS',
+        '7,140753336,140753336,A,T': 'BRAF',
+        '3,179234297,179234297,A,G': 'PIK3CA'
+    }
+
+    def __init__(self, fail_first=0, log_level=logging.WARNING, log_path=None):
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.fail_first = fail_first
+        self.requests = [] # (path, number of queries) for each request
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def url(self):
+        return 'http://{0}:{1}'.format(self.HOST, self.server.server_address[1])
+
+    def get_gene(self, path, query):
+        if path.endswith('byGenomicChange'):
+            gene = self.KNOWN_LOCATIONS.get(query.get('genomicLocation'))
+        elif path.endswith('structuralVariants'):
+            gene = query.get('geneA', {}).get('hugoSymbol')
+        else:
+            gene = query.get('gene', {}).get('hugoSymbol')
+        return gene
+
+    def get_response(self, path, query):
+        gene = self.get_gene(path, query)
+        level = self.KNOWN_GENES.get(gene)
+        if level:
+            response = {
+                'query': query,
+                'geneExist': True,
+                'variantExist': True,
+                'oncogenic': 'Oncogenic',
+                'mutationEffect': {
+                    'knownEffect': 'Gain-of-function',
+                    'citations': {'pmids': ['10000001'], 'abstracts': []}
+                },
+                'highestSensitiveLevel': level,
+                'highestResistanceLevel': None,
+                'treatments': [{
+                    'level': level,
+                    'drugs': [{'drugName': '{0} inhibitor'.format(gene)}, {'drugName': 'Drug B'}],
+                    'pmids': ['10000002'],
+                    'abstracts': []
+                }],
+                'diagnosticImplications': [],
+                'prognosticImplications': []
+            }
+        else:
+            response = {
+                'query': query,
+                'geneExist': gene != None,
+                'variantExist': False,
+                'oncogenic': 'Unknown',
+                'mutationEffect': {
+                    'knownEffect': 'Unknown',
+                    'citations': {'pmids': [], 'abstracts': []}
+                },
+                'treatments': []
+            }
+        return response
+
+    def respond(self, path, authorization, queries):
+        """Return an HTTP status and response body for a request"""
+        with self.lock:
+            self.requests.append((path, len(queries)))
+            fail = len(self.requests) <= self.fail_first
+        if fail:
+            return 503, {'message': 'Service unavailable (mock failure)'}
+        elif authorization != 'Bearer {0}'.format(self.TOKEN):
+            return 401, {'message': 'Unauthorized'}
+        elif not path.startswith('/api/v1/annotate/'):
+            return 404, {'message': 'Not found'}
+        else:
+            return 200, [self.get_response(path, query) for query in queries]
+
+    def start(self):
+        self.server = ThreadingHTTPServer((self.HOST, 0), _mock_handler)
+        self.server.mock = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.logger.debug("Started mock OncoKB server at {0}".format(self.url))
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.logger.debug("Stopped mock OncoKB server")
+
+
+class _mock_handler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get('Content-Length', 0))
+        queries = json.loads(self.rfile.read(length))
+        status, body = mock.respond(self.path, self.headers.get('Authorization'), queries)
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        self.server.mock.logger.debug(format % args)
@@ -1,13 +1,12 @@
 """Simple functions to process actionability tiers and other information from OncoKB"""
 
-import csv
 import logging
-import os
 import re
 import djerba.core.constants as core_constants
 import djerba.util.oncokb.constants as oncokb
 from djerba.util.environment import directory_finder
 from djerba.util.logger import logger
+from djerba.util.reference_data import reference_data
 
 class levels:
 
@@ -155,11 +154,8 @@ class gene_summary_reader(logger):
     DEFAULT = 'OncoKB summary not available'
 
     def __init__(self, log_level=logging.WARNING, log_path=None):
-        self.summaries = {}
-        oncokb_dir = os.path.dirname(os.path.realpath(__file__))
-        with open(os.path.join(oncokb_dir, oncokb.ALL_CURATED_GENES)) as in_file:
-            for row in csv.DictReader(in_file, delimiter="\t"):
-                self.summaries[row['hugoSymbol']] = row['summary']
+        # parsed once per process, and shared; do not modify
+        self.summaries = reference_data(log_level, log_path).get_gene_summaries()
 
     def get(self, gene):
         return self.summaries.get(gene, self.DEFAULT)
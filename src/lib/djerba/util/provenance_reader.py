@@ -1,13 +1,12 @@
 """Class to read and parse the file provenance report (FPR)"""
 
-import csv
-import gzip
 import logging
 import re
 
 import djerba.util.provenance_index as index
 import djerba.util.ini_fields as ini
 from djerba.util.logger import logger
+from djerba.util.provenance_store import read_donor_rows
 
 class provenance_reader(logger):
 
@@ -113,14 +112,15 @@ class provenance_reader(logger):
             raise RuntimeError(msg)
         self.provenance = []
         # find provenance rows with the required project, root sample, and (if given) sample names
-        with gzip.open(provenance_path, 'rt') as infile:
-            reader = csv.reader(infile, delimiter="\t")
-            for row in reader:
-                if row[index.STUDY_TITLE] == project and \
-                   row[index.ROOT_SAMPLE_NAME] == self.root_sample_name and \
-                   (samples.name_ok(row[index.SAMPLE_NAME])) and \
-                   row[index.SEQUENCER_RUN_PLATFORM_ID] != 'Illumina_MiSeq':
-                    self.provenance.append(row)
+        # use the indexed provenance store if available, otherwise scan the input file
+        donor_rows = read_donor_rows(provenance_path, project, self.root_sample_name,
+                                     log_level, log_path)
+        for row in donor_rows:
+            if samples.name_ok(row[index.SAMPLE_NAME]) and \
+               row[index.SEQUENCER_RUN_PLATFORM_ID] != 'Illumina_MiSeq':
+                self.provenance.append(row)
+        self._patterns = {}
+        self._index_rows()
         if len(self.provenance)==0:
             # continue with empty provenance results, eg. for GSICAPBENCH testing
             msg = "No provenance records found for project '%s' and donor '%s' " % (project, donor) +\
@@ -205,6 +205,12 @@ class provenance_reader(logger):
                     self.logger.debug(msg)
         self.logger.debug("Finished check on workflows in file provenance")
 
+    def _compile(self, pattern):
+        # cache compiled regular expressions; the same patterns are used for many rows
+        if pattern not in self._patterns:
+            self._patterns[pattern] = re.compile(pattern)
+        return self._patterns[pattern]
+
     def _filter_rows(self, index, value, rows=None):
         # find matching provenance rows from a list
         if rows == None: rows = self.provenance
@@ -212,11 +218,13 @@ class provenance_reader(logger):
 
     def _filter_metatype(self, pattern, rows=None):
         if rows == None: rows = self.provenance
-        return filter(lambda x: re.search(pattern, x[index.FILE_META_TYPE]), rows)
+        regex = self._compile(pattern)
+        return filter(lambda x: regex.search(x[index.FILE_META_TYPE]), rows)
 
     def _filter_file_path(self, pattern, rows=None):
         if rows == None: rows = self.provenance
-        return filter(lambda x: re.search(pattern, x[index.FILE_PATH]), rows)
+        regex = self._compile(pattern)
+        return filter(lambda x: regex.search(x[index.FILE_PATH]), rows)
 
     def _filter_sample_name(self, sample_name, rows=None):
         return self._filter_rows(index.SAMPLE_NAME, sample_name, rows)
@@ -224,6 +232,10 @@ class provenance_reader(logger):
     def _filter_workflow(self, workflow, rows=None):
         return self._filter_rows(index.WORKFLOW_NAME, workflow, rows)
 
+    def _get_indexed_rows(self, workflow, sample_name):
+        # rows for the given workflow and sample name, most recent first
+        return self.rows_by_workflow_sample.get((workflow, sample_name), [])
+
     def _get_most_recent_row(self, rows):
         # if input is empty, raise an error
         # otherwise, return the row with the most recent date field (last in lexical sort order)
@@ -345,21 +357,35 @@ class provenance_reader(logger):
                 break
         return path
 
+    def _index_rows(self):
+        """
+        Index provenance rows by workflow and sample name, for the _parse_* methods
+        Rows for each key are sorted by modification time, most recent first
+        The sort is stable, so ties are resolved as in _get_most_recent_row
+        """
+        self.rows_by_workflow_sample = {}
+        ordered = sorted(self.provenance, key=lambda row: row[index.LAST_MODIFIED], reverse=True)
+        for row in ordered:
+            key = (row[index.WORKFLOW_NAME], row[index.SAMPLE_NAME])
+            self.rows_by_workflow_sample.setdefault(key, []).append(row)
+        self.logger.debug("Indexed provenance rows for {0} ".format(len(self.rows_by_workflow_sample))+\
+                          "combinations of workflow and sample name")
+
     def _parse_file_path(self, workflow, meta_pattern, file_pattern, sample_name):
         # get most recent file of given workflow, metatype, file path pattern, and sample name
-        # self._filter_* functions return an iterator
-        iterrows = self._filter_workflow(workflow)
-        iterrows = self._filter_metatype(meta_pattern, iterrows)
-        iterrows = self._filter_file_path(file_pattern, iterrows)
-        iterrows = self._filter_sample_name(sample_name, iterrows)
-        try:
-            row = self._get_most_recent_row(iterrows)
-            path = row[index.FILE_PATH]
-        except MissingProvenanceError as err:
+        # indexed rows are already in order, so the first match is the most recent
+        meta_regex = self._compile(meta_pattern)
+        file_regex = self._compile(file_pattern)
+        path = None
+        for row in self._get_indexed_rows(workflow, sample_name):
+            if meta_regex.search(row[index.FILE_META_TYPE]) and \
+               file_regex.search(row[index.FILE_PATH]):
+                path = row[index.FILE_PATH]
+                break
+        if path == None:
             msg = "No provenance records meet filter criteria: Workflow = {0}, ".format(workflow) +\
                   "metatype-regex = {0}, path-regex = {1}.".format(meta_pattern, file_pattern)
             self.logger.debug(msg)
-            path = None
         return path
 
     def _parse_row_attributes(self, row):
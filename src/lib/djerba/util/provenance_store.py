@@ -0,0 +1,204 @@
+"""
+Indexed store for the file provenance report (FPR)
+
+The FPR is a gzipped TSV file of several GB; scanning it in full takes minutes. The store
+is an SQLite database built once from the FPR, with rows indexed by study title, root
+sample name, and workflow name. Finding the rows for a donor is then an index lookup.
+
+The store records the modification time and size of the FPR it was built from. If the
+FPR has changed since then, the store is stale and will not be used for lookups.
+
+By default, the store for an FPR at PATH is located at PATH.djerba_index.sqlite; this can
+be overridden with the DJERBA_PROVENANCE_INDEX environment variable.
+"""
+
+import csv
+import gzip
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from urllib.parse import quote
+import djerba.util.provenance_index as index
+from djerba.util.logger import logger
+
+class provenance_store(logger):
+
+    INDEX_PATH_VAR = 'DJERBA_PROVENANCE_INDEX'
+    INDEX_SUFFIX = '.djerba_index.sqlite'
+    SCHEMA_VERSION = '1'
+    BATCH_SIZE = 10000
+
+    # metadata keys
+    SCHEMA_KEY = 'schema_version'
+    SOURCE_PATH_KEY = 'source_path'
+    SOURCE_MTIME_KEY = 'source_mtime_ns'
+    SOURCE_SIZE_KEY = 'source_size'
+    TOTAL_ROWS_KEY = 'total_rows'
+
+    def __init__(self, index_path, log_level=logging.WARNING, log_path=None):
+        self.log_level = log_level
+        self.log_path = log_path
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.index_path = index_path
+
+    @staticmethod
+    def get_default_index_path(provenance_path):
+        """Index path from the environment variable if set; otherwise next to the FPR"""
+        env_path = os.environ.get(provenance_store.INDEX_PATH_VAR)
+        if env_path:
+            return env_path
+        else:
+            return provenance_path+provenance_store.INDEX_SUFFIX
+
+    @staticmethod
+    def get_source_stats(provenance_path):
+        stat = os.stat(provenance_path)
+        return {
+            provenance_store.SOURCE_MTIME_KEY: str(stat.st_mtime_ns),
+            provenance_store.SOURCE_SIZE_KEY: str(stat.st_size)
+        }
+
+    def build(self, provenance_path):
+        """
+        Build the store from the FPR
+        Writes to a temporary file and then renames it, so readers never see a partial store
+        """
+        self.logger.info('Building provenance index {0} from {1}'.format(
+            self.index_path, provenance_path))
+        # take stats *before* reading, so a concurrent FPR update makes the store stale
+        stats = self.get_source_stats(provenance_path)
+        tmp_path = '{0}.tmp.{1}'.format(self.index_path, os.getpid())
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        total = 0
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute('PRAGMA journal_mode=OFF')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute('CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT)')
+            conn.execute('CREATE TABLE provenance '+\
+                         '(study_title TEXT, root_sample_name TEXT, '+\
+                         'workflow_name TEXT, row_json TEXT)')
+            insert = 'INSERT INTO provenance VALUES (?, ?, ?, ?)'
+            batch = []
+            with gzip.open(provenance_path, 'rt') as in_file:
+                for row in csv.reader(in_file, delimiter="\t"):
+                    batch.append((
+                        row[index.STUDY_TITLE],
+                        row[index.ROOT_SAMPLE_NAME],
+                        row[index.WORKFLOW_NAME],
+                        json.dumps(row)
+                    ))
+                    total += 1
+                    if len(batch) >= self.BATCH_SIZE:
+                        conn.executemany(insert, batch)
+                        batch = []
+                    if total % 1000000 == 0:
+                        self.logger.debug("Indexed {0} input rows".format(total))
+            if len(batch) > 0:
+                conn.executemany(insert, batch)
+            conn.execute('CREATE INDEX donor_index ON provenance '+\
+                         '(study_title, root_sample_name, workflow_name)')
+            metadata = {
+                self.SCHEMA_KEY: self.SCHEMA_VERSION,
+                self.SOURCE_PATH_KEY: os.path.abspath(provenance_path),
+                self.TOTAL_ROWS_KEY: str(total)
+            }
+            metadata.update(stats)
+            conn.executemany('INSERT INTO metadata VALUES (?, ?)', metadata.items())
+            conn.commit()
+        except Exception:
+            conn.close()
+            os.remove(tmp_path)
+            raise
+        conn.close()
+        os.replace(tmp_path, self.index_path)
+        self.logger.info('Finished provenance index: {0} rows'.format(total))
+        return total
+
+    def exists(self):
+        return os.path.isfile(self.index_path)
+
+    def get_metadata(self):
+        with self._connect() as conn:
+            rows = conn.execute('SELECT key, value FROM metadata').fetchall()
+        return {key: value for (key, value) in rows}
+
+    def is_current(self, provenance_path):
+        """Check the store exists, and matches the current state of the FPR"""
+        if not self.exists():
+            self.logger.debug("Provenance index {0} not found".format(self.index_path))
+            return False
+        try:
+            metadata = self.get_metadata()
+        except sqlite3.Error as err:
+            msg = "Cannot read provenance index {0}: {1}".format(self.index_path, err)
+            self.logger.warning(msg)
+            return False
+        if metadata.get(self.SOURCE_PATH_KEY) != os.path.abspath(provenance_path):
+            msg = "Provenance index {0} was not built from {1}".format(
+                self.index_path, provenance_path)
+            self.logger.debug(msg)
+            return False
+        current = metadata.get(self.SCHEMA_KEY) == self.SCHEMA_VERSION
+        for key, value in self.get_source_stats(provenance_path).items():
+            if metadata.get(key) != value:
+                current = False
+        if not current:
+            msg = "Provenance index {0} is stale relative to {1}".format(
+                self.index_path, provenance_path)
+            self.logger.warning(msg)
+        return current
+
+    def read_rows(self, study, donor):
+        """Return a list of FPR rows for the given study and donor"""
+        query = 'SELECT row_json FROM provenance '+\
+            'WHERE study_title = ? AND root_sample_name = ? ORDER BY rowid'
+        with self._connect() as conn:
+            rows = [json.loads(x[0]) for x in conn.execute(query, (study, donor))]
+        self.logger.debug("Found {0} rows in provenance index".format(len(rows)))
+        return rows
+
+    def _connect(self):
+        # open read-only; the store is only written by build()
+        # sqlite3 connection context managers do not close the connection, so use closing()
+        uri = 'file:{0}?mode=ro'.format(quote(os.path.abspath(self.index_path)))
+        return closing(sqlite3.connect(uri, uri=True))
+
+
+def read_donor_rows(provenance_path, study, donor, log_level=logging.WARNING, log_path=None):
+    """
+    Get FPR rows for a study and donor
+    Use the indexed store if it is current; otherwise, fall back to a scan of the FPR
+    """
+    key = (study, donor)
+    return read_multiple_donor_rows(provenance_path, [key, ], log_level, log_path)[key]
+
+def read_multiple_donor_rows(provenance_path, keys, log_level=logging.WARNING, log_path=None):
+    """
+    Get FPR rows for multiple donors; keys is an iterable of (study, donor) pairs
+    Returns a dictionary of lists of rows, indexed by (study, donor)
+    Use the indexed store if it is current; otherwise, make a *single* scan of the FPR
+    """
+    rows = {key: [] for key in keys}
+    index_path = provenance_store.get_default_index_path(provenance_path)
+    store = provenance_store(index_path, log_level, log_path)
+    if store.is_current(provenance_path):
+        store.logger.info('Reading provenance rows from index {0}'.format(index_path))
+        for (study, donor) in rows.keys():
+            rows[(study, donor)] = store.read_rows(study, donor)
+    else:
+        store.logger.info('Reading provenance rows from {0}'.format(provenance_path))
+        total = 0
+        with gzip.open(provenance_path, 'rt') as in_file:
+            for row in csv.reader(in_file, delimiter="\t"):
+                total += 1
+                if total % 1000000 == 0:
+                    store.logger.debug("Read {0} input rows".format(total))
+                donor_rows = rows.get((row[index.STUDY_TITLE], row[index.ROOT_SAMPLE_NAME]))
+                if donor_rows != None:
+                    donor_rows.append(row)
+        store.logger.debug("Read {0} input rows in total".format(total))
+    return rows
@@ -0,0 +1,211 @@
+"""
+Process-wide registry of parsed reference data: cytobands, OncoKB gene summaries, OncoTree
+
+Several plugins in the same report (and reports in the same batch) read the same reference
+tables; the registry parses each file once per process, on first use. Each entry has a
+signature of modification time and size; if the file changes on disk, it is parsed again.
+
+Optionally, parsed data is also written to a directory given by the DJERBA_REFERENCE_CACHE_DIR
+environment variable, as a pickle file named by the SHA-256 checksum of the input. A new
+process then loads the pickle instead of parsing the input. Pickle files are trusted, so the
+directory must only be writable by Djerba users.
+
+Returned objects are shared by all callers in the process, and must not be modified.
+"""
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import djerba.util.oncokb.constants as oncokb
+from djerba.util.environment import directory_finder
+from djerba.util.logger import logger
+
+class reference_data(logger):
+
+    CYTOBAND_FILE = 'cytoBand.txt'
+    # names of resources; also used in pickle file names
+    CYTOBANDS = 'cytobands'
+    CYTOBAND_TABLE = 'cytoband_table'
+    GENE_SUMMARIES = 'gene_summaries'
+    ONCOTREE_INDEX = 'oncotree_index'
+    # increment if the parsed form of any resource changes, to ignore old pickle files
+    PICKLE_VERSION = 1
+
+    # process-wide state, shared by all instances
+    # resources are indexed by (name, real path); values are (signature, resource)
+    _resources = {}
+    # one lock for each resource, so it is parsed by only one thread
+    _resource_locks = {}
+    _lock = threading.Lock()
+    _stats = {'hits': 0, 'misses': 0, 'pickle_hits': 0}
+
+    def __init__(self, log_level=logging.WARNING, log_path=None):
+        self.log_level = log_level
+        self.log_path = log_path
+        self.logger = self.get_logger(log_level, __name__, log_path)
+        self.finder = directory_finder(log_level, log_path)
+        if self.finder.has_valid_reference_cache_dir():
+            self.cache_dir = self.finder.get_reference_cache_dir()
+        else:
+            self.cache_dir = None
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._resources.clear()
+            cls._resource_locks.clear()
+            cls._stats.update({'hits': 0, 'misses': 0, 'pickle_hits': 0})
+
+    @classmethod
+    def get_cache_stats(cls):
+        """Return counts of hits and misses in memory, and misses loaded from pickle files"""
+        with cls._lock:
+            stats = dict(cls._stats)
+            stats['resources'] = len(cls._resources)
+        return stats
+
+    def get(self, name, path, parse_function):
+        """
+        Return the parsed resource for the given name and input path
+        - parse_function: input a path, return the parsed resource
+        """
+        key = (name, os.path.realpath(path))
+        try:
+            stat = os.stat(path)
+        except OSError as err:
+            msg = "Cannot read reference data file {0}: {1}".format(path, err)
+            self.logger.error(msg)
+            raise DjerbaReferenceDataError(msg) from err
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._resources.get(key)
+            if entry != None and entry[0] == signature:
+                self._stats['hits'] += 1
+                return entry[1]
+            resource_lock = self._resource_locks.setdefault(key, threading.Lock())
+        with resource_lock:
+            # another thread may have loaded the resource while we were waiting
+            with self._lock:
+                entry = self._resources.get(key)
+                if entry != None and entry[0] == signature:
+                    self._stats['hits'] += 1
+                    return entry[1]
+                self._stats['misses'] += 1
+            resource = self._load(name, path, parse_function)
+            with self._lock:
+                self._resources[key] = (signature, resource)
+        return resource
+
+    def get_cytobands(self, data_dir=None):
+        """Return a dictionary of cytobands, indexed by gene"""
+        path = self._get_cytoband_path(data_dir)
+        return self.get(self.CYTOBANDS, path, self._read_cytobands)
+
+    def get_cytoband_table(self, data_dir=None):
+        """Return the cytoband file as a pandas DataFrame, with Hugo_Symbol and Chromosome"""
+        path = self._get_cytoband_path(data_dir)
+        return self.get(self.CYTOBAND_TABLE, path, self._read_table)
+
+    def get_gene_summaries(self):
+        """Return a dictionary of OncoKB gene summaries, indexed by gene"""
+        oncokb_dir = os.path.dirname(os.path.realpath(oncokb.__file__))
+        path = os.path.join(oncokb_dir, oncokb.ALL_CURATED_GENES)
+        return self.get(self.GENE_SUMMARIES, path, self._read_gene_summaries)
+
+    def get_oncotree_index(self, oncotree_path):
+        """
+        Return a dictionary of values in OncoTree JSON, indexed by key; eg. an OncoTree code.
+        If a key occurs in more than one object, the value from the outermost (or, at the same
+        depth, the last) object is used.
+        """
+        return self.get(self.ONCOTREE_INDEX, oncotree_path, self._read_oncotree_index)
+
+    def _get_cytoband_path(self, data_dir):
+        if data_dir == None:
+            data_dir = self.finder.get_data_dir()
+        return os.path.join(data_dir, self.CYTOBAND_FILE)
+
+    def _load(self, name, path, parse_function):
+        """Load from a pickle file if available; otherwise parse, and write the pickle file"""
+        if self.cache_dir == None:
+            self.logger.debug("Parsing {0} from {1}".format(name, path))
+            return parse_function(path)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as in_file:
+            for block in iter(lambda: in_file.read(1024*1024), b''):
+                digest.update(block)
+        pickle_name = '{0}.v{1}.{2}.pickle'.format(name, self.PICKLE_VERSION, digest.hexdigest())
+        pickle_path = os.path.join(self.cache_dir, pickle_name)
+        if os.path.isfile(pickle_path):
+            try:
+                with open(pickle_path, 'rb') as pickle_file:
+                    resource = pickle.load(pickle_file)
+            except (OSError, EOFError, pickle.UnpicklingError) as err:
+                msg = "Cannot load {0}, parsing {1} instead: {2}".format(pickle_path, path, err)
+                self.logger.warning(msg)
+            else:
+                with self._lock:
+                    self._stats['pickle_hits'] += 1
+                self.logger.debug("Loaded {0} from {1}".format(name, pickle_path))
+                return resource
+        self.logger.debug("Parsing {0} from {1}".format(name, path))
+        resource = parse_function(path)
+        # write to a temporary file and rename, so other processes never read a partial file
+        try:
+            with tempfile.NamedTemporaryFile(
+                    dir=self.cache_dir, prefix='.'+pickle_name, delete=False) as tmp_file:
+                pickle.dump(resource, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file.name, pickle_path)
+        except OSError as err:
+            msg = "Cannot write {0}, continuing without it: {1}".format(pickle_path, err)
+            self.logger.warning(msg)
+        else:
+            self.logger.debug("Wrote {0} to {1}".format(name, pickle_path))
+        return resource
+
+    @staticmethod
+    def _read_cytobands(path):
+        cytobands = {}
+        with open(path) as input_file:
+            reader = csv.DictReader(input_file, delimiter="\t")
+            for row in reader:
+                cytobands[row['Hugo_Symbol']] = row['Chromosome']
+        return cytobands
+
+    @staticmethod
+    def _read_gene_summaries(path):
+        summaries = {}
+        with open(path) as in_file:
+            for row in csv.DictReader(in_file, delimiter="\t"):
+                summaries[row['hugoSymbol']] = row['summary']
+        return summaries
+
+    @staticmethod
+    def _read_oncotree_index(path):
+        index = {}
+        def update_index(value):
+            # inner objects first, so values from outer objects take precedence
+            if isinstance(value, dict):
+                for item in value.values():
+                    update_index(item)
+                index.update(value)
+            elif isinstance(value, list):
+                for item in value:
+                    update_index(item)
+        with open(path) as tree_file:
+            update_index(json.load(tree_file))
+        return index
+
+    @staticmethod
+    def _read_table(path):
+        import pandas as pd # slow to import, so only import when needed
+        return pd.read_csv(path, sep="\t")
+
+
+class DjerbaReferenceDataError(Exception):
+    pass
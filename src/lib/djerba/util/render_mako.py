@@ -1,22 +1,97 @@
+"""
+Render HTML from Mako templates
 
+Compiled templates are cached in a process-wide TemplateLookup for each template directory,
+so repeated renders (eg. document headers/footers, or plugins in update and batch runs) skip
+compilation. Mako checks the modification time of each template file, and recompiles it if
+the file has changed.
+
+Optionally, compiled template modules are also written to a directory given by the
+DJERBA_TEMPLATE_CACHE_DIR environment variable, and reused by later processes. Modules are
+Python code which is imported, so the directory must only be writable by Djerba users.
+"""
+
+import hashlib
 import logging
+import os
+import threading
 import traceback
 from mako.lookup import TemplateLookup
+import djerba.core.constants as core_constants
+from djerba.util.environment import directory_finder
 from djerba.util.logger import logger
 
 class mako_renderer(logger):
 
+    # process-wide state, shared by all instances
+    # lookups are indexed by (real path of template directory, module directory)
+    # templates are indexed by (real path of template directory, filename)
+    _lookups = {}
+    _templates = {}
+    _lock = threading.Lock()
+    _stats = {'hits': 0, 'misses': 0}
+
     def __init__(self, template_dir, log_level=logging.INFO, log_path=None):
         self.log_level = log_level
         self.log_path = log_path
         self.logger = self.get_logger(log_level, __name__, log_path)
         self.template_dir = template_dir
+        finder = directory_finder(log_level, log_path)
+        if finder.has_valid_template_cache_dir():
+            self.module_dir = finder.get_template_cache_dir()
+        else:
+            self.module_dir = None
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._lookups.clear()
+            cls._templates.clear()
+            cls._stats.update({'hits': 0, 'misses': 0})
+
+    @classmethod
+    def get_cache_stats(cls):
+        """Return counts of hits and misses (ie. compilations) for templates"""
+        with cls._lock:
+            stats = dict(cls._stats)
+            stats['templates'] = len(cls._templates)
+        return stats
+
+    def _get_lookup(self, template_dir):
+        real_dir = os.path.realpath(template_dir)
+        key = (real_dir, self.module_dir)
+        with self._lock:
+            lookup = self._lookups.get(key)
+            if lookup == None:
+                if self.module_dir == None:
+                    module_directory = None
+                else:
+                    # Mako names modules by template filename; one subdirectory for each
+                    # template directory, so templates with the same name do not collide
+                    dir_id = hashlib.sha256(real_dir.encode(core_constants.TEXT_ENCODING))
+                    module_directory = os.path.join(self.module_dir, dir_id.hexdigest()[0:16])
+                # strict_undefined=True provides an informative error for missing variables in JSON
+                # see https://docs.makotemplates.org/en/latest/runtime.html#context-variables
+                lookup = TemplateLookup(
+                    directories=[real_dir, ],
+                    module_directory=module_directory,
+                    strict_undefined=True
+                )
+                self._lookups[key] = lookup
+        return lookup
 
     def get_template(self, template_dir, filename):
-        # strict_undefined=True provides an informative error for missing variables in JSON
-        # see https://docs.makotemplates.org/en/latest/runtime.html#context-variables
-        report_lookup = TemplateLookup(directories=[template_dir, ], strict_undefined=True)
-        return report_lookup.get_template(filename)
+        # the lookup compiles the template on first use, or if the file has been modified
+        template = self._get_lookup(template_dir).get_template(filename)
+        key = (os.path.realpath(template_dir), filename)
+        with self._lock:
+            if self._templates.get(key) is template:
+                self._stats['hits'] += 1
+            else:
+                self._stats['misses'] += 1
+                self._templates[key] = template
+                self.logger.debug("Compiled Mako template {0}".format(template.filename))
+        return template
 
     def render_template(self, mako_template, args):
         try:
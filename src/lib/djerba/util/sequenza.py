@@ -7,38 +7,34 @@ import math
 import os
 import re
 import sys
-import tempfile
-import zipfile
 
 import djerba.util.constants as constants
+from djerba.util.archive import zip_archive
 from djerba.util.logger import logger
 
 class sequenza_reader(logger):
 
     def __init__(self, zip_path, log_level=logging.WARNING, log_path=None):
         """
-        Decompress the zip archive to a temporary directory
-        Read values for gamma and purity/ploidy; find default gamma
+        Read values for gamma and purity/ploidy from the zip archive; find default gamma
         """
         self.zip_path = zip_path
         self.logger = self.get_logger(log_level, __name__, log_path)
+        self.archive = zip_archive(zip_path, log_level, log_path)
         self.segment_counts = {}
         self.purity = {}
         self.ploidy = {}
         self.cn_seg_archive = {} # archive paths to CN.seg files
         self.segments_text_archive = {} # archive paths to _segments.txt files
-        tempdir = tempfile.TemporaryDirectory(prefix='djerba_sequenza_')
-        tmp = tempdir.name
-        # zip archives are large (~500 MB) -- only extract the files we need
+        # zip archives are large (~500 MB) -- only read the files we need, as streams
         # Sequenza archives *should* have correct file contents, but we do some basic sanity checking
         #
         # Sequenza outputs one or more solutions for each value of the gamma parameter
         # We define a solution ID, designated 'sol_id'
         # 'sol_id' is the value of gamma, plus the solution designator ('_primary_', 'sol2_0.49', etc.)
-        zf = zipfile.ZipFile(self.zip_path)
         sol_id_set = set()
         # zeroth pass -- get the list of filenames, excluding directories
-        name_list = [x for x in zf.namelist() if not re.search('/$', x)]
+        name_list = self.archive.get_names()
         # first pass -- populate the canonical set of gamma IDs
         for name in name_list:
             if re.search('/$', name):
@@ -56,11 +52,13 @@ class sequenza_reader(logger):
                     msg = "Multiple _segments.txt for sol_id {0}".format(sol_id)
                     self.logger.error(msg)
                     raise SequenzaError(msg)
-                self.segment_counts[sol_id] = self._count_segments(zf.extract(name, tmp))
+                with self.archive.open_text(name) as seg:
+                    self.segment_counts[sol_id] = self._count_segments(seg)
                 self.segments_text_archive[sol_id] = name
             elif re.search('_alternative_solutions\.txt$', name) and self._is_primary(sol_id):
                 # Only one distinct alternative_solutions.txt for each value of gamma
-                self._update_purity_ploidy(gamma, zf.extract(name, tmp))
+                with self.archive.open_text(name) as input_file:
+                    self._update_purity_ploidy(gamma, input_file, self.archive.get_path(name))
             elif re.search('_Total_CN.seg', name) and self._is_primary(sol_id):
                 # Only one .seg file for each value of gamma
                 if gamma in self.cn_seg_archive:
@@ -80,7 +78,6 @@ class sequenza_reader(logger):
             if msg:
                 self.logger.error(msg)
                 raise SequenzaError(msg)
-        tempdir.cleanup()
         # find important values of sol_id
         [self.default_sol_id, self.sol_id_selection_table] = self._find_default_sol_id()
         [self.min_purity, self.max_purity, self.min_purity_sol_id, self.max_purity_sol_id] = self._find_minmax_purity_sol_id()
@@ -105,10 +102,9 @@ class sequenza_reader(logger):
             raise SequenzaError(msg)
         return sol_id
 
-    def _count_segments(self, seg_path):
-        """Count the number of segments; equal to length of file, excluding the header"""
-        with open(seg_path) as seg:
-            length = len(seg.readlines())
+    def _count_segments(self, seg):
+        """Count the number of segments in an open file; equal to its length, excluding the header"""
+        length = sum(1 for line in seg)
         return length - 1
 
     def _find_default_sol_id(self):
@@ -210,32 +206,31 @@ class sequenza_reader(logger):
             reformatted[key[0]][key[1]] = metrics[key]
         return reformatted
 
-    def _update_purity_ploidy(self, gamma, input_path):
+    def _update_purity_ploidy(self, gamma, input_file, input_path):
         """
-        Update purity and ploidy for the given gamma and alternative_solutions.txt file
+        Update purity and ploidy for the given gamma and open alternative_solutions.txt file
         alternative_solutions.txt is identical for all solution folders; contains purity/ploidy solutions for the given gamma
         Non-primary solution names are of the form sol${COUNT}_${PURITY}
         where $COUNT is the line in the alternative_solutions.txt file (header = 0, primary solution = 1)
         Record the purity and ploidy by sol_id
         """
         count = 0
-        with open(input_path, 'rt') as input_file:
-            reader = csv.reader(input_file, delimiter="\t")
-            for row in reader:
-                if count > 0: # ignore the header row
-                    [purity, ploidy, slpp] = [float(x) for x in row]
-                    if count == 1:
-                        solution = constants.SEQUENZA_PRIMARY_SOLUTION
-                    elif purity == 1:
-                        # annoying quirk of Sequenza output naming
-                        solution = "sol{0}_1".format(count)
-                    else:
-                        solution = "sol{0}_{1}".format(count, purity)
-                    sol_id = self._construct_sol_id(gamma, solution)
-                    self.purity[sol_id] = purity
-                    self.ploidy[sol_id] = ploidy
-                count += 1
-        msg = "Found purity & ploidy for gamma={0}, input={1}".format(gamma, input_file)
+        reader = csv.reader(input_file, delimiter="\t")
+        for row in reader:
+            if count > 0: # ignore the header row
+                [purity, ploidy, slpp] = [float(x) for x in row]
+                if count == 1:
+                    solution = constants.SEQUENZA_PRIMARY_SOLUTION
+                elif purity == 1:
+                    # annoying quirk of Sequenza output naming
+                    solution = "sol{0}_1".format(count)
+                else:
+                    solution = "sol{0}_{1}".format(count, purity)
+                sol_id = self._construct_sol_id(gamma, solution)
+                self.purity[sol_id] = purity
+                self.ploidy[sol_id] = ploidy
+            count += 1
+        msg = "Found purity & ploidy for gamma={0}, input={1}".format(gamma, input_path)
         self.logger.debug(msg)
 
     def extract_cn_seg_file(self, dest_dir, gamma=None):
@@ -246,8 +241,7 @@ class sequenza_reader(logger):
         The .seg file is further processed downstream, before input to singleSample.R
         """
         sol_id = self._construct_sol_id(gamma) # supplies defaults and checks validity of gamma
-        zf = zipfile.ZipFile(self.zip_path)
-        extracted = zf.extract(self.cn_seg_archive[sol_id[0]], dest_dir)
+        extracted = self.archive.extract(self.cn_seg_archive[sol_id[0]], dest_dir)
         return extracted
 
     def extract_segments_text_file(self, dest_dir, gamma=None, solution=None):
@@ -258,8 +252,7 @@ class sequenza_reader(logger):
         The aratio_segments.txt file is further processed downstream, before input to singleSample.R
         """
         sol_id = self._construct_sol_id(gamma, solution)
-        zf = zipfile.ZipFile(self.zip_path)
-        extracted = zf.extract(self.segments_text_archive[sol_id], dest_dir)
+        extracted = self.archive.extract(self.segments_text_archive[sol_id], dest_dir)
         return extracted
 
     def get_default_sol_id(self):
@@ -0,0 +1,74 @@
+"""
+Profile import time at startup of a Djerba script
+
+Runs the script in a subprocess with 'python -X importtime', and summarizes the output:
+total import time, and the slowest top-level imports by cumulative time.
+"""
+
+import logging
+import re
+import sys
+from djerba.util.logger import logger
+from djerba.util.subprocess_runner import subprocess_runner
+
+class startup_profiler(logger):
+
+    # eg. 'import time:       517 |     436385 |   pandas'
+    IMPORTTIME_PATTERN = r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$'
+    MODULE = 'module'
+    SELF_US = 'self_us'
+    CUMULATIVE_US = 'cumulative_us'
+    DEPTH = 'depth'
+
+    def __init__(self, log_level=logging.WARNING, log_path=None):
+        self.log_level = log_level
+        self.log_path = log_path
+        self.logger = self.get_logger(log_level, __name__, log_path)
+
+    def parse(self, stderr):
+        """
+        Parse STDERR from 'python -X importtime'
+        Returns a list of import records, and a list of other lines in STDERR
+        """
+        records = []
+        other = []
+        for line in stderr.splitlines():
+            match = re.match(self.IMPORTTIME_PATTERN, line)
+            if match:
+                records.append({
+                    self.MODULE: match.group(4),
+                    self.SELF_US: int(match.group(1)),
+                    self.CUMULATIVE_US: int(match.group(2)),
+                    # nested imports are indented by 2 spaces per level
+                    self.DEPTH: (len(match.group(3))-1)//2
+                })
+            elif not line.startswith('import time:'):
+                other.append(line)
+        return records, other
+
+    def run(self, command):
+        """Run a command (without the interpreter) with import time profiling"""
+        full_command = [sys.executable, '-X', 'importtime']
+        full_command.extend(command)
+        runner = subprocess_runner(self.log_level, self.log_path)
+        result = runner.run(full_command, 'profiled command', raise_err=False, truncate=False)
+        records, other = self.parse(result.stderr)
+        return result, records, other
+
+    def summarize(self, records, top=20):
+        """Return a string summarizing import times, in seconds"""
+        total = self.get_total_seconds(records)
+        top_level = [x for x in records if x[self.DEPTH] == 0]
+        top_level.sort(key=lambda x: x[self.CUMULATIVE_US], reverse=True)
+        lines = [
+            "Total import time: {0:.3f}s for {1} modules".format(total, len(records)),
+            "Slowest top-level imports (cumulative seconds):"
+        ]
+        for record in top_level[0:top]:
+            lines.append("{0:>10.3f}  {1}".format(
+                record[self.CUMULATIVE_US]/1e6, record[self.MODULE]))
+        return "\n".join(lines)
+
+    @staticmethod
+    def get_total_seconds(records):
+        return sum([x[startup_profiler.SELF_US] for x in records])/1e6
@@ -2,10 +2,19 @@
 
 import logging
 import subprocess
+import threading
+import time
 from collections.abc import Iterable
 from djerba.util.logger import logger
 import djerba.util.constants as constants
 
+# total wall-clock time spent in subprocesses, for each thread; see djerba.util.timing
+_usage = threading.local()
+
+def get_subprocess_seconds():
+    """Total time in subprocesses run by subprocess_runner, in the current thread"""
+    return getattr(_usage, 'seconds', 0.0)
+
 class subprocess_runner(logger):
 
     def __init__(self, log_level=logging.WARNING, log_path=None):
@@ -28,12 +37,14 @@ class subprocess_runner(logger):
         else:
             logged_command = ' '.join(command)
         self.logger.info("Running {0}: '{1}'".format(description, logged_command))        
+        start = time.perf_counter()
         result = subprocess.run(
             command,
             input = stdin,
             capture_output=True,
             encoding=constants.TEXT_ENCODING,
         )
+        _usage.seconds = get_subprocess_seconds() + time.perf_counter() - start
         stdout = str(result.stdout)
         stderr = str(result.stderr)
         if len(stdout) > 10000 and truncate:
@@ -0,0 +1,40 @@
+"""
+Measure time and memory used by a function call, eg. a component configure/extract/render
+
+Measurements are:
+- wall_seconds: elapsed wall-clock time
+- cpu_seconds: CPU time of the current process (all threads)
+- subprocess_seconds: wall-clock time in subprocesses run by subprocess_runner, in this thread
+- peak_rss_delta_kb: increase in peak resident set size of the current process
+
+CPU time and peak RSS are process-wide; so if components run concurrently in threads, their
+values overlap. Subprocess time is recorded per thread, so it is not affected.
+"""
+
+import resource
+import time
+from djerba.util.subprocess_runner import get_subprocess_seconds
+
+WALL_SECONDS = 'wall_seconds'
+CPU_SECONDS = 'cpu_seconds'
+SUBPROCESS_SECONDS = 'subprocess_seconds'
+PEAK_RSS_DELTA_KB = 'peak_rss_delta_kb'
+
+def get_peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def measure(function, *args, **kwargs):
+    """Run a function; return its result, and a dictionary of measurements"""
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    subprocess_start = get_subprocess_seconds()
+    rss_start = get_peak_rss_kb()
+    result = function(*args, **kwargs)
+    measurements = {
+        WALL_SECONDS: round(time.perf_counter() - wall_start, 3),
+        CPU_SECONDS: round(time.process_time() - cpu_start, 3),
+        SUBPROCESS_SECONDS: round(get_subprocess_seconds() - subprocess_start, 3),
+        PEAK_RSS_DELTA_KB: get_peak_rss_kb() - rss_start
+    }
+    return result, measurements
@@ -1,13 +1,12 @@
 """Names and sorting methods for variant fields"""
 
-import csv
 import logging
-import os
 import re
 import djerba.core.constants as core_constants
 from djerba.util.environment import directory_finder
 from djerba.util.logger import logger
 from djerba.util.oncokb.tools import levels as oncokb_levels
+from djerba.util.reference_data import reference_data
 
 
 class variant_sorter(logger):
@@ -42,13 +41,9 @@ class variant_sorter(logger):
         self.data_dir = directory_finder(log_level, log_path).get_data_dir()
 
     def cytoband_lookup(self):
-        cytoband_path = os.path.join(self.data_dir, 'cytoBand.txt')
-        cytobands = {}
-        with open(cytoband_path) as input_file:
-            reader = csv.DictReader(input_file, delimiter="\t")
-            for row in reader:
-                cytobands[row['Hugo_Symbol']] = row['Chromosome']
-        return cytobands
+        # parsed once per process, and shared; do not modify
+        ref_data = reference_data(self.log_level, self.log_path)
+        return ref_data.get_cytobands(self.data_dir)
 
     def cytoband_sort_order(self, cb_input):
         """
@@ -7,6 +7,7 @@ import jsonschema
 import logging
 import os
 import re
+import shutil
 import tempfile
 import time
 import unittest
@@ -15,6 +16,7 @@ import djerba.util.ini_fields as ini
 from configparser import ConfigParser
 from copy import copy
 from glob import glob
+from PyPDF2 import PdfReader, PdfWriter
 from string import Template
 
 from djerba.core.configure import config_wrapper, core_configurer, DjerbaConfigError
@@ -22,10 +24,15 @@ from djerba.core.html_cache import html_cache, DjerbaHtmlCacheError
 from djerba.core.ini_generator import ini_generator
 from djerba.core.json_validator import plugin_json_validator
 from djerba.core.loaders import plugin_loader, core_config_loader, DjerbaLoadError
-from djerba.core.main import main, arg_processor, DjerbaDependencyError, DjerbaHtmlCacheError
+from djerba.core.main import main, arg_processor, DjerbaBatchError, \
+    DjerbaDependencyError, DjerbaHtmlCacheError
+from djerba.core.render import pdf_renderer
 from djerba.core.workspace import workspace
 from djerba.util.activity import activity_tracker, DjerbaActivityTrackerError
+from djerba.util.startup_profiler import startup_profiler
 from djerba.util.subprocess_runner import subprocess_runner
+from djerba.util.timing import measure, WALL_SECONDS, CPU_SECONDS, SUBPROCESS_SECONDS, \
+    PEAK_RSS_DELTA_KB
 from djerba.util.testing.tools import TestBase
 from djerba.util.validator import path_validator
 import djerba.core.constants as core_constants
@@ -38,7 +45,7 @@ class TestCore(TestBase):
     SIMPLE_REPORT_JSON = 'simple_report_expected.json'
     SIMPLE_REPORT_UPDATE_JSON = 'simple_report_for_update.json'
     SIMPLE_REPORT_UPDATE_FAILED_JSON = 'simple_report_for_update_failed.json'
-    SIMPLE_CONFIG_MD5 = '2311145c9d6782334c05816058d3623f'
+    SIMPLE_CONFIG_MD5 = '82839e48becb14e457855d9b148ba550'
     SIMPLE_REPORT_MD5 = '596d3cef47785aa2a1163a179a18093f'
 
     class mock_args:
@@ -212,6 +219,78 @@ class TestArgs(TestCore):
         main(work_dir, log_level=logging.ERROR).run(args)
         self.assertSimpleReport(json, html)
 
+class TestBatch(TestCore):
+
+    def test_batch(self):
+        ini_path = os.path.join(self.test_source_dir, 'config.ini')
+        with open(ini_path) as in_file:
+            ini_string = in_file.read()
+        ini_dir = os.path.join(self.tmp_dir, 'ini')
+        os.mkdir(ini_dir)
+        for name in ['report_1', 'report_2']:
+            with open(os.path.join(ini_dir, name+'.ini'), 'w') as out_file:
+                out_file.write(ini_string)
+        manifest_path = os.path.join(self.tmp_dir, 'manifest.txt')
+        with open(manifest_path, 'w') as out_file:
+            out_file.write("# comment\nini/report_1.ini\nini/report_2.ini\n")
+        for (input_path, workers) in [(ini_dir, 1), (manifest_path, 2)]:
+            out_dir = os.path.join(self.tmp_dir, 'out_{0}'.format(workers))
+            os.mkdir(out_dir)
+            djerba_main = main(self.tmp_dir, log_level=logging.ERROR)
+            results = djerba_main.batch(input_path, out_dir, workers=workers)
+            self.assertEqual([x[2] for x in results], ['OK', 'OK'])
+            for name in ['report_1', 'report_2']:
+                json_path = os.path.join(out_dir, name, 'placeholder_report.json')
+                self.assertSimpleJSON(json_path)
+            summary_path = os.path.join(out_dir, main.BATCH_SUMMARY_FILENAME)
+            with open(summary_path) as in_file:
+                self.assertEqual(len(in_file.readlines()), 3)
+        # a failed report is recorded in the summary, and does not stop the batch
+        with open(os.path.join(ini_dir, 'report_3.ini'), 'w') as out_file:
+            out_file.write("[core]\n\n[nonexistent_plugin]\n")
+        out_dir = os.path.join(self.tmp_dir, 'out_failed')
+        os.mkdir(out_dir)
+        djerba_main = main(self.tmp_dir, log_level=logging.CRITICAL)
+        with self.assertRaises(DjerbaBatchError):
+            djerba_main.batch(ini_dir, out_dir)
+        summary_path = os.path.join(out_dir, main.BATCH_SUMMARY_FILENAME)
+        with open(summary_path) as in_file:
+            statuses = [re.split("\t", x)[2] for x in in_file.readlines()[1:]]
+        self.assertEqual(statuses, ['OK', 'OK', 'FAILED'])
+
+    def test_batch_state(self):
+        # reports with different plugins; timings and component counts are for each report
+        ini_dir = os.path.join(self.tmp_dir, 'ini')
+        os.mkdir(ini_dir)
+        shutil.copy(os.path.join(self.test_source_dir, 'config.ini'), ini_dir)
+        with open(os.path.join(ini_dir, 'demo1_only.ini'), 'w') as out_file:
+            out_file.write("[core]\nreport_id = placeholder\n\n[demo1]\n"+\
+                           "question = What do you get if you multiply six by nine?\n"+\
+                           "dummy_file = /path/of/dummy/file\n")
+        out_dir = os.path.join(self.tmp_dir, 'out')
+        os.mkdir(out_dir)
+        djerba_main = main(self.tmp_dir, log_level=logging.ERROR)
+        results = djerba_main.batch(ini_dir, out_dir)
+        self.assertEqual([x[2] for x in results], ['OK', 'OK'])
+        expected = {
+            'config': {'core', 'demo1', 'demo2', 'gene_information_merger'},
+            'demo1_only': {'core', 'demo1'}
+        }
+        for (name, components) in expected.items():
+            timings_path = os.path.join(out_dir, name, core_constants.TIMINGS_FILENAME)
+            with open(timings_path) as timings_file:
+                timings = json.load(timings_file)
+            self.assertEqual(set(timings.keys()), components)
+        # component reuse is counted for each report, as for a report in a new process
+        ini_path = os.path.join(ini_dir, 'demo1_only.ini')
+        single_dir = os.path.join(self.tmp_dir, 'single')
+        os.mkdir(single_dir)
+        single_main = main(self.tmp_dir, log_level=logging.ERROR)
+        single_main.run_batch_report(ini_path, single_dir)
+        djerba_main.run_batch_report(ini_path, os.path.join(out_dir, 'demo1_only'))
+        self.assertTrue(single_main.component_reuse > 0)
+        self.assertEqual(djerba_main.component_reuse, single_main.component_reuse)
+
 class TestConfigExpected(TestCore):
     """Test generation of an expected config file"""
 
@@ -612,6 +691,27 @@ class TestLoader(TestCore):
         if original:
             os.environ[var] = original
 
+    def test_cache(self):
+        plugin_loader.clear_cache()
+        loader = plugin_loader(log_level=logging.WARNING)
+        plugin_1 = loader.load('demo1', workspace(self.tmp_dir))
+        plugin_2 = plugin_loader(log_level=logging.WARNING).load('demo1', workspace(self.tmp_dir))
+        # module is cached, but each call makes a new instance
+        self.assertIsNot(plugin_1, plugin_2)
+        stats = plugin_loader.get_cache_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertTrue(stats['seconds_saved'] > 0)
+        # main reuses component instances across steps
+        ini_path = os.path.join(self.test_source_dir, 'config.ini')
+        djerba_main = main(self.tmp_dir, log_level=logging.ERROR)
+        config = djerba_main.configure(ini_path)
+        demo1 = djerba_main.components['demo1']
+        data = djerba_main.extract(config)
+        djerba_main.render(data)
+        self.assertIs(demo1, djerba_main.components['demo1'])
+        self.assertTrue(djerba_main.component_reuse > 0)
+
 class TestMainScript(TestCore):
     """Test the main djerba.py script"""
 
@@ -782,6 +882,28 @@ class TestModuleDir(TestCore):
         self.assertTrue(os.path.isdir(module_dir))
         self.assertTrue(os.path.isfile(os.path.join(module_dir, 'plugin.py')))
 
+class TestPdfRenderer(TestCore):
+
+    def test_merge(self):
+        # wkhtmltopdf may not be available, so test merging with pre-existing PDFs
+        inputs = []
+        futures = []
+        executor = pdf_renderer._get_executor()
+        for i in range(3):
+            writer = PdfWriter()
+            for j in range(i+1):
+                writer.add_blank_page(width=72, height=72)
+            pdf_path = os.path.join(self.tmp_dir, 'input_{0}.pdf'.format(i))
+            def write_pdf(writer=writer, pdf_path=pdf_path):
+                with open(pdf_path, 'wb') as out_file:
+                    writer.write(out_file)
+                return pdf_path
+            inputs.append(pdf_path)
+            futures.append(executor.submit(write_pdf))
+        out_path = os.path.join(self.tmp_dir, 'merged.pdf')
+        pdf_renderer.merge_pdfs(inputs, out_path, futures)
+        self.assertEqual(len(PdfReader(out_path).pages), 6)
+
 class TestPriority(TestCore):
     """Test controlling the configure/extract/render order with priority levels"""
 
@@ -860,6 +982,57 @@ class TestPriority(TestCore):
             msg = template.format(prefix, name, order)
             self.assertIn(msg, log_context.output)
 
+    def test_parallel_configure(self):
+        ini_path = os.path.join(self.test_source_dir, 'config.ini')
+        djerba_main = main(self.tmp_dir, log_level=logging.ERROR)
+        config = djerba_main.read_ini_path(ini_path)
+        config.set('core', core_constants.CONFIGURE_WORKERS, '3')
+        config.set('demo1', core_constants.CONFIGURE_PRIORITY, '200')
+        config.set('demo2', core_constants.CONFIGURE_PRIORITY, '200')
+        ini_path_2 = os.path.join(self.tmp_dir, 'config_parallel.ini')
+        with open(ini_path_2, 'w') as out_file:
+            config.write(out_file)
+        out_path_serial = os.path.join(self.tmp_dir, 'config_serial_out.ini')
+        out_path_parallel = os.path.join(self.tmp_dir, 'config_parallel_out.ini')
+        config.set('core', core_constants.CONFIGURE_WORKERS, '1')
+        djerba_main.configure_from_parser(config, out_path_serial)
+        djerba_main.configure(ini_path_2, out_path_parallel)
+        with open(out_path_serial) as serial_file, open(out_path_parallel) as parallel_file:
+            # output is identical, apart from the number of workers
+            serial = serial_file.read().replace('configure_workers = 1', 'configure_workers = 3')
+            self.assertEqual(serial, parallel_file.read())
+
+    def test_parallel_extract(self):
+        ini_path = os.path.join(self.test_source_dir, 'config_full.ini')
+        djerba_main = main(self.tmp_dir, log_level=logging.ERROR)
+        config = ConfigParser()
+        config.read(ini_path)
+        data_serial = djerba_main.extract(config)
+        # equal priorities, so demo1 and demo2 may be extracted concurrently
+        config.set('core', core_constants.EXTRACT_WORKERS, '2')
+        config.set('demo1', core_constants.EXTRACT_PRIORITY, '200')
+        config.set('demo2', core_constants.EXTRACT_PRIORITY, '200')
+        data_parallel = djerba_main.extract(config)
+        self.assertEqual(list(data_parallel['plugins'].keys()), ['demo1', 'demo2'])
+        for name in ['demo1', 'demo2']:
+            self.assertEqual(
+                data_serial['plugins'][name]['results'],
+                data_parallel['plugins'][name]['results']
+            )
+        # demo1 depends on demo2, so demo2 is submitted first
+        config.set('demo1', core_constants.DEPENDS_EXTRACT, 'demo2')
+        config.set('demo1', core_constants.EXTRACT_PRIORITY, '300')
+        with self.assertLogs('djerba.core.main', level=logging.DEBUG) as log_context:
+            data_parallel = djerba_main.extract(config)
+        prefix = 'DEBUG:djerba.core.main:Submitting component {0}'
+        pos1 = log_context.output.index(prefix.format('demo1'))
+        pos2 = log_context.output.index(prefix.format('demo2'))
+        self.assertTrue(pos2 < pos1)
+        self.assertEqual(list(data_parallel['plugins'].keys()), ['demo2', 'demo1'])
+        config.set('core', core_constants.EXTRACT_WORKERS, '0')
+        with self.assertRaises(ValueError):
+            djerba_main.extract(config)
+
     def test_render_priority(self):
         json_path = os.path.join(self.test_source_dir, self.SIMPLE_REPORT_JSON)
         djerba_main = main(self.tmp_dir, log_level=logging.ERROR)
@@ -942,6 +1115,77 @@ class TestJSONValidator(TestCore):
         bad_path = os.path.join(self.test_source_dir, self.SIMPLE_REPORT_JSON)
         self.assertEqual(self.run_script(bad_path), 3)
 
+class TestStartup(TestCore):
+    """Regression test for startup time of the main script"""
+
+    # generous budget for total import time; typical value is well under 1 second
+    STARTUP_BUDGET_SECONDS = 2.0
+    # slow to import, and not needed for setup/configure
+    HEAVY_MODULES = [
+        'matplotlib', 'numpy', 'pandas', 'pdfkit', 'plotnine', 'PyPDF2',
+        'requests', 'scipy', 'seaborn', 'statsmodels'
+    ]
+
+    def assert_startup_ok(self, command):
+        profiler = startup_profiler(log_level=logging.WARNING)
+        result, records, other = profiler.run(command)
+        self.assertEqual(result.returncode, 0)
+        imported = set([x[profiler.MODULE] for x in records])
+        for name in self.HEAVY_MODULES:
+            self.assertNotIn(name, imported)
+        total = profiler.get_total_seconds(records)
+        self.assertTrue(total < self.STARTUP_BUDGET_SECONDS, profiler.summarize(records))
+
+    def test_setup(self):
+        script = shutil.which('djerba.py')
+        ini_path = os.path.join(self.tmp_dir, 'setup.ini')
+        self.assert_startup_ok([script, '--quiet', 'setup', '--assay', 'WGTS', '--ini', ini_path])
+
+    def test_configure(self):
+        script = shutil.which('djerba.py')
+        ini_path = os.path.join(self.test_source_dir, 'config.ini')
+        out_path = os.path.join(self.tmp_dir, 'config_out.ini')
+        cmd = [
+            script, '--quiet', 'configure',
+            '--ini', ini_path,
+            '--ini-out', out_path,
+            '--work-dir', self.tmp_dir
+        ]
+        self.assert_startup_ok(cmd)
+
+class TestTiming(TestCore):
+
+    def test_timings(self):
+        ini_path = os.path.join(self.test_source_dir, 'config.ini')
+        out_path = os.path.join(self.tmp_dir, 'config_out.ini')
+        djerba_main = main(self.tmp_dir, log_level=logging.ERROR)
+        config = djerba_main.configure(ini_path, out_path)
+        data = djerba_main.extract(config)
+        self.assertNotIn(core_constants.TIMINGS, data['core'])
+        djerba_main.render(data)
+        timings_path = os.path.join(self.tmp_dir, core_constants.TIMINGS_FILENAME)
+        self.assertTrue(os.path.isfile(timings_path))
+        with open(timings_path) as timings_file:
+            timings = json.load(timings_file)
+        for step in [core_constants.CONFIGURE, core_constants.EXTRACT, core_constants.RENDER]:
+            measurements = timings['demo1'][step]
+            for key in [WALL_SECONDS, CPU_SECONDS, SUBPROCESS_SECONDS, PEAK_RSS_DELTA_KB]:
+                self.assertTrue(measurements[key] >= 0)
+        self.assertIn(core_constants.CONFIGURE, timings['core'])
+        # optional summary in the report JSON
+        config.set('core', core_constants.TIMING_SUMMARY, 'True')
+        data = djerba_main.extract(config)
+        summary = data['core'][core_constants.TIMINGS]
+        for step in [core_constants.CONFIGURE, core_constants.EXTRACT]:
+            self.assertTrue(summary['demo1'][step] >= 0)
+
+    def test_measure(self):
+        runner = subprocess_runner(log_level=logging.ERROR)
+        result, measurements = measure(runner.run, ['sleep', '0.1'])
+        self.assertEqual(result.returncode, 0)
+        self.assertTrue(measurements[WALL_SECONDS] >= 0.1)
+        self.assertTrue(measurements[SUBPROCESS_SECONDS] >= 0.1)
+
 class TestWorkspace(TestCore):
 
     def test(self):
@@ -1,10 +1,35 @@
 #! /usr/bin/env python3
 
+import csv
+import gzip
+import json
 import mako
 import os
+import sqlite3
 import unittest
+import zipfile
+from contextlib import closing
+from unittest import mock
 
+import djerba.util.provenance_index as index
+from djerba.helpers.provenance_helper.helper import main as provenance_helper, \
+    write_provenance_subsets
+from djerba.util.archive import zip_archive, DjerbaArchiveError
+from djerba.util.benchmark.oncokb_cache import oncokb_cache_benchmark
+from djerba.util.environment import directory_finder
+from djerba.util.oncokb.annotator import oncokb_annotator
+from djerba.util.oncokb.cache import oncokb_cache, oncokb_cache_params
+from djerba.util.oncokb.cache_checker import oncokb_cache_checker
+from djerba.util.oncokb.cache_manager import oncokb_cache_manager
+from djerba.util.oncokb.cache_store import oncokb_cache_store
+from djerba.util.oncokb.client import oncokb_client, DjerbaOncokbClientError
+from djerba.util.oncokb.mock_server import mock_oncokb_server
+from djerba.util.provenance_reader import provenance_reader, sample_name_container
+from djerba.util.provenance_store import provenance_store, read_donor_rows, \
+    read_multiple_donor_rows
+from djerba.util.reference_data import reference_data, DjerbaReferenceDataError
 from djerba.util.render_mako import mako_renderer
+from djerba.util.sequenza import sequenza_reader
 from djerba.util.testing.tools import TestBase
 
 class TestMakoRenderer(TestBase):
@@ -27,6 +52,740 @@ class TestMakoRenderer(TestBase):
         html_2 = mrend.render_name('mako_template.html', args)
         self.assertEqual(html_2.strip(), expected_html.strip())
 
+    def test_cache(self):
+        template_path = os.path.join(self.tmp_dir, 'template.html')
+        with open(template_path, 'w') as out_file:
+            out_file.write("<p>${greeting}</p>")
+        module_dir = os.path.join(self.tmp_dir, 'modules')
+        os.mkdir(module_dir)
+        with mock.patch.dict(os.environ, {directory_finder.DJERBA_TEMPLATE_CACHE_DIR_VAR: module_dir}):
+            mako_renderer.clear_cache()
+            html = mako_renderer(self.tmp_dir).render_name('template.html', {'greeting': 'Hello'})
+            self.assertEqual(html, "<p>Hello</p>")
+            # a second instance uses the compiled template
+            html = mako_renderer(self.tmp_dir).render_name('template.html', {'greeting': 'Hi'})
+            self.assertEqual(html, "<p>Hi</p>")
+            self.assertEqual(mako_renderer.get_cache_stats(), {'hits': 1, 'misses': 1, 'templates': 1})
+            modules = [x for (_, _, names) in os.walk(module_dir) for x in names]
+            self.assertEqual(modules, ['template.html.py'])
+            # a modified template is compiled again
+            with open(template_path, 'w') as out_file:
+                out_file.write("<h1>${greeting}</h1>")
+            mtime = os.stat(template_path).st_mtime + 10
+            os.utime(template_path, (mtime, mtime))
+            html = mako_renderer(self.tmp_dir).render_name('template.html', {'greeting': 'Hello'})
+            self.assertEqual(html, "<h1>Hello</h1>")
+            self.assertEqual(mako_renderer.get_cache_stats()['misses'], 2)
+            mako_renderer.clear_cache()
+
+class TestOncokbCache(TestBase):
+
+    ONCOTREE_CODE = 'PAAD'
+    MAF_HEADER = ['Hugo_Symbol', 'Chromosome', 'Start_Position', 'Reference_Allele',
+                  'Tumor_Seq_Allele2', 'HGVSp_Short']
+    MAF_ROWS = [
+        ['KRAS', 'chr12', '25245350', 'C', 'T', 'p.G12D'],
+        ['TP53', 'chr17', '7675088', 'C', 'T', 'p.R175H'],
+        ['ABC1', 'chr1', '1000', 'G', 'A', 'p.X1Y']
+    ]
+
+    def get_annotations(self, gene):
+        annotations = ['']*len(oncokb_cache.ANNOTATION_HEADERS)
+        annotations[0:3] = ['True', 'True', 'True']
+        annotations[5] = 'Oncogenic'
+        annotations[13] = gene
+        return annotations
+
+    def write_maf(self, path, annotated):
+        with open(path, 'w') as out_file:
+            header = self.MAF_HEADER.copy()
+            if annotated:
+                header.extend(oncokb_cache.ANNOTATION_HEADERS)
+            print("\t".join(header), file=out_file)
+            for row in self.MAF_ROWS:
+                row = row.copy()
+                if annotated:
+                    row.extend(self.get_annotations(row[0]))
+                print("\t".join(row), file=out_file)
+
+    def read_annotations(self, path):
+        with open(path) as in_file:
+            rows = list(csv.reader(in_file, delimiter="\t"))
+        return {row[0]: row[len(self.MAF_HEADER):] for row in rows[1:]}
+
+    def test_concurrent_update(self):
+        # many writer processes update a new cache, and migrate a legacy cache, concurrently
+        benchmark = oncokb_cache_benchmark(self.tmp_dir)
+        results = benchmark.stress_update(16, [200])
+        [writers, rows, expected, found, seconds] = results[0]
+        self.assertEqual(expected, 1700)
+        self.assertEqual(found, expected)
+        # legacy annotations are migrated only once
+        cache = oncokb_cache(os.path.join(self.tmp_dir, 'stress_200'), benchmark.ONCOTREE_CODE)
+        self.assertTrue(cache.store.is_migrated())
+        self.assertEqual(cache.store.migrate(cache.cache_dir), {})
+        self.assertTrue(cache.store.compact())
+
+    def test_keys(self):
+        cache = oncokb_cache(self.tmp_dir, self.ONCOTREE_CODE)
+        boundary = len(self.MAF_HEADER)
+        key_func = cache._get_key_function(oncokb_cache_store.MAF, self.MAF_HEADER)
+        key = key_func(self.MAF_ROWS[0], boundary)
+        self.assertEqual(key, "v2\tpaad\tchr12\t25245350\tC\tT\tKRAS\tp.G12D")
+        # versioned keys do not depend on other columns, and sort outside the legacy range
+        header = self.MAF_HEADER + ['Tumor_Sample_Barcode']
+        other_func = cache._get_key_function(oncokb_cache_store.MAF, header)
+        self.assertEqual(other_func(self.MAF_ROWS[0]+['TUMOUR'], boundary+1), key)
+        legacy_key = cache._make_legacy_maf_key(self.MAF_ROWS[0], boundary)
+        [low, high] = cache.LEGACY_MAF_KEY_RANGE
+        self.assertTrue(low <= legacy_key < high)
+        self.assertFalse(low <= key < high)
+        # MAF without variant columns, eg. biomarkers, uses legacy keys
+        header = ['HUGO_SYMBOL', 'SAMPLE_ID', 'ALTERATION']
+        key_func = cache._get_key_function(oncokb_cache_store.MAF, header)
+        self.assertEqual(key_func, cache._make_legacy_maf_key)
+        # benchmark on a small synthetic input
+        benchmark = oncokb_cache_benchmark(self.tmp_dir, columns=50)
+        results = benchmark.compare_keys([100])
+        self.assertEqual([x[2] for x in results], [benchmark.LEGACY, benchmark.VERSIONED])
+
+    def test_legacy_migration(self):
+        cache_dir = os.path.join(self.tmp_dir, self.ONCOTREE_CODE.lower())
+        os.mkdir(cache_dir)
+        cache = oncokb_cache(self.tmp_dir, self.ONCOTREE_CODE)
+        # legacy JSON cache has KRAS and TP53, with legacy keys
+        maf_cache = {}
+        for row in self.MAF_ROWS[0:2]:
+            key = cache._make_legacy_maf_key(row, len(self.MAF_HEADER))
+            maf_cache[key] = self.get_annotations(row[0])
+        cna_cache = {'KRAS': {'Amplification': self.get_annotations('KRAS')}}
+        with open(os.path.join(cache_dir, 'maf_cache.json'), 'w') as out_file:
+            out_file.write(json.dumps(maf_cache))
+        with open(os.path.join(cache_dir, 'cna_cache.json'), 'w') as out_file:
+            out_file.write(json.dumps(cna_cache))
+        maf_path = os.path.join(self.tmp_dir, 'input.maf')
+        self.write_maf(maf_path, annotated=False)
+        out_legacy = os.path.join(self.tmp_dir, 'annotated_legacy.maf')
+        cache.annotate_maf(maf_path, out_legacy)
+        self.assertFalse(cache.store.exists())
+        # migrate; annotation from the store is identical
+        totals = cache.store.migrate(cache_dir)
+        self.assertEqual(totals, {'maf': 2, 'cna': 1})
+        out_store = os.path.join(self.tmp_dir, 'annotated_store.maf')
+        cache.annotate_maf(maf_path, out_store)
+        with open(out_legacy) as legacy_file, open(out_store) as store_file:
+            self.assertEqual(legacy_file.read(), store_file.read())
+        annotations = self.read_annotations(out_store)
+        self.assertEqual(annotations['KRAS'], self.get_annotations('KRAS'))
+        self.assertEqual(annotations['ABC1'], oncokb_cache.DEFAULT_MAF_ANNOTATIONS)
+        cna_key = cache.store.make_cna_key('KRAS', 'Amplification')
+        result = cache.store.get_many(oncokb_cache_store.CNA, [cna_key, 'foo'])
+        self.assertEqual(result, {cna_key: self.get_annotations('KRAS')})
+        # updates use versioned keys; legacy keys are still found
+        annotated_path = os.path.join(self.tmp_dir, 'annotated.maf')
+        self.write_maf(annotated_path, annotated=True)
+        cache.write_maf_cache(annotated_path)
+        self.assertEqual(cache.store.count(oncokb_cache_store.MAF), 5)
+        cache.annotate_maf(maf_path, out_store)
+        self.assertEqual(self.read_annotations(out_store)['ABC1'], self.get_annotations('ABC1'))
+
+    def test_read_during_migration(self):
+        oncokb_cache_manager.clear_cache()
+        cache_dir = os.path.join(self.tmp_dir, self.ONCOTREE_CODE.lower())
+        os.mkdir(cache_dir)
+        writer = oncokb_cache(self.tmp_dir, self.ONCOTREE_CODE)
+        maf_cache = {}
+        for row in self.MAF_ROWS[0:2]:
+            key = writer._make_legacy_maf_key(row, len(self.MAF_HEADER))
+            maf_cache[key] = self.get_annotations(row[0])
+        with open(os.path.join(cache_dir, 'maf_cache.json'), 'w') as out_file:
+            out_file.write(json.dumps(maf_cache))
+        maf_path = os.path.join(self.tmp_dir, 'input.maf')
+        self.write_maf(maf_path, annotated=False)
+        out_path = os.path.join(self.tmp_dir, 'output.maf')
+        # writer has created an empty store, and holds the write lock to migrate
+        self.assertFalse(writer.store.is_migrated())
+        conn = sqlite3.connect(writer.store.db_path)
+        conn.execute('BEGIN IMMEDIATE')
+        writer.store._import_json(conn, oncokb_cache_store.MAF, writer.maf_cache, True)
+        try:
+            # reader uses the legacy JSON, not the empty store
+            reader = oncokb_cache(self.tmp_dir, self.ONCOTREE_CODE)
+            self.assertFalse(reader.store.exists())
+            reader.annotate_maf(maf_path, out_path)
+            self.assertEqual(self.read_annotations(out_path)['KRAS'], self.get_annotations('KRAS'))
+        finally:
+            conn.rollback()
+            conn.close()
+        # after migration, the reader uses the store
+        writer.store.migrate(cache_dir)
+        self.assertTrue(reader.store.exists())
+        reader.annotate_maf(maf_path, out_path)
+        self.assertEqual(self.read_annotations(out_path)['TP53'], self.get_annotations('TP53'))
+
+    def test_manager(self):
+        oncokb_cache_manager.clear_cache()
+        cache = oncokb_cache(self.tmp_dir, self.ONCOTREE_CODE)
+        annotated_path = os.path.join(self.tmp_dir, 'annotated.maf')
+        self.write_maf(annotated_path, annotated=True)
+        cache.write_maf_cache(annotated_path)
+        maf_path = os.path.join(self.tmp_dir, 'input.maf')
+        self.write_maf(maf_path, annotated=False)
+        out_path = os.path.join(self.tmp_dir, 'output.maf')
+        cache.annotate_maf(maf_path, out_path)
+        stats = oncokb_cache_manager.get_cache_stats()
+        self.assertEqual([stats['hits'], stats['misses'], stats['entries']], [0, 3, 3])
+        # another cache instance for the same directory reads from memory
+        cache_2 = oncokb_cache(self.tmp_dir, self.ONCOTREE_CODE)
+        cache_2.annotate_maf(maf_path, out_path)
+        stats = oncokb_cache_manager.get_cache_stats()
+        self.assertEqual([stats['hits'], stats['misses']], [3, 3])
+        for row in self.MAF_ROWS:
+            self.assertEqual(self.read_annotations(out_path)[row[0]], self.get_annotations(row[0]))
+        # updating the store on disk invalidates the in-memory entries
+        self.MAF_ROWS = [['NRAS', 'chr1', '114716126', 'C', 'T', 'p.G12D']] + self.MAF_ROWS[1:]
+        self.write_maf(annotated_path, annotated=True)
+        cache.write_maf_cache(annotated_path)
+        self.write_maf(maf_path, annotated=False)
+        cache_2.annotate_maf(maf_path, out_path)
+        stats = oncokb_cache_manager.get_cache_stats()
+        self.assertEqual([stats['misses'], stats['invalidations']], [6, 1])
+        self.assertEqual(self.read_annotations(out_path)['NRAS'], self.get_annotations('NRAS'))
+        # least-recently-used entries are evicted
+        manager = oncokb_cache_manager()
+        manager.MAX_ENTRIES = 2
+        read_function = lambda keys: {key: [key] for key in keys}
+        self.assertEqual(manager.get_many('dir', 'maf', ['a'], None, read_function), {'a': ['a']})
+        manager.get_many('dir', 'maf', ['b', 'c'], None, read_function)
+        stats = oncokb_cache_manager.get_cache_stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertTrue(stats['evictions'] > 0)
+        oncokb_cache_manager.clear_cache()
+
+    def test_streaming(self):
+        cache = oncokb_cache(self.tmp_dir, self.ONCOTREE_CODE)
+        annotated_path = os.path.join(self.tmp_dir, 'annotated.maf')
+        self.write_maf(annotated_path, annotated=True)
+        cache.write_maf_cache(annotated_path)
+        maf_path = os.path.join(self.tmp_dir, 'input.maf')
+        self.write_maf(maf_path, annotated=False)
+        out_path = os.path.join(self.tmp_dir, 'output.maf')
+        cache.annotate_maf(maf_path, out_path)
+        # multiple chunks, gzip output
+        cache.CHUNK_SIZE = 2
+        out_path_gz = os.path.join(self.tmp_dir, 'output.maf.gz')
+        cache.annotate_maf(maf_path, out_path_gz)
+        with open(out_path) as out_file, gzip.open(out_path_gz, 'rt') as out_file_gz:
+            self.assertEqual(out_file.read(), out_file_gz.read())
+        # benchmark on a small synthetic input
+        benchmark = oncokb_cache_benchmark(self.tmp_dir, hit_fraction=0.5)
+        results = benchmark.run([100])
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][0], 100)
+
+    def test_update(self):
+        cache = oncokb_cache(self.tmp_dir, self.ONCOTREE_CODE)
+        annotated_path = os.path.join(self.tmp_dir, 'annotated.maf')
+        self.write_maf(annotated_path, annotated=True)
+        store_path = cache.write_maf_cache(annotated_path)
+        self.assertTrue(os.path.isfile(store_path))
+        self.assertEqual(cache.store.count(oncokb_cache_store.MAF), 3)
+        # updating again with the same input does not add annotations
+        cache.write_maf_cache(annotated_path)
+        self.assertEqual(cache.store.count(oncokb_cache_store.MAF), 3)
+        maf_path = os.path.join(self.tmp_dir, 'input.maf')
+        self.write_maf(maf_path, annotated=False)
+        out_path = os.path.join(self.tmp_dir, 'output.maf')
+        cache.annotate_maf(maf_path, out_path)
+        annotations = self.read_annotations(out_path)
+        for row in self.MAF_ROWS:
+            self.assertEqual(annotations[row[0]], self.get_annotations(row[0]))
+        # rows in memory are annotated as for a file
+        [header, rows] = cache.annotate_maf_rows(self.MAF_HEADER, self.MAF_ROWS)
+        with open(out_path) as out_file:
+            self.assertEqual([header]+rows, list(csv.reader(out_file, delimiter="\t")))
+        self.assertTrue(cache.store.compact())
+        # store uses the rollback journal; a store in WAL mode is reverted when opened
+        wal_path = os.path.join(self.tmp_dir, 'wal.db')
+        with closing(sqlite3.connect(wal_path)) as conn:
+            self.assertEqual(conn.execute('PRAGMA journal_mode=WAL').fetchone()[0], 'wal')
+        store = oncokb_cache_store(wal_path)
+        self.assertEqual(store.count(oncokb_cache_store.MAF), 0)
+        with closing(sqlite3.connect(wal_path)) as conn:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+        with closing(sqlite3.connect(store_path)) as conn:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+
+class TestOncokbCacheChecker(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        oncokb_cache_manager.clear_cache()
+
+    def tearDown(self):
+        oncokb_cache_manager.clear_cache()
+        super().tearDown()
+
+    def write_inputs(self, report_dir):
+        os.mkdir(report_dir)
+        contents = {
+            'oncokb_clinical_info.txt': [
+                ['SAMPLE_ID', 'ONCOTREE_CODE'],
+                ['TUMOUR', 'PAAD']
+            ],
+            'filtered_maf.tsv': [
+                TestOncokbClient.MAF_HEADER,
+                TestOncokbClient.MAF_ROWS[0],
+                TestOncokbClient.MAF_ROWS[1],
+                TestOncokbClient.MAF_ROWS[2]
+            ],
+            'data_CNA_oncoKBgenes_nonDiploid.txt': [
+                ['Hugo_Symbol', 'TUMOUR'],
+                ['ERBB2', '2'],
+                ['TP53', '-2'],
+                ['BRCA2', '1']
+            ],
+            'data_fusions_oncokb.txt': [
+                ['Tumor_Sample_Barcode', 'Fusion'],
+                ['TUMOUR', 'NTRK1-TPM3']
+            ]
+        }
+        for (name, rows) in contents.items():
+            with open(os.path.join(report_dir, name), 'w') as out_file:
+                for row in rows:
+                    print("\t".join(row), file=out_file)
+
+    def test(self):
+        cache_base = os.path.join(self.tmp_dir, 'cache')
+        os.mkdir(cache_base)
+        report_dir = os.path.join(self.tmp_dir, 'report')
+        self.write_inputs(report_dir)
+        checker = oncokb_cache_checker(cache_base)
+        results = checker.check([report_dir])
+        # MAF, CNA, fusion, and total for the OncoTree code
+        self.assertEqual([x[1] for x in results], ['maf', 'cna', 'fusion', 'all'])
+        self.assertEqual([x[3] for x in results], [3, 2, 1, 6])
+        self.assertEqual([x[4] for x in results], [0, 0, 0, 0])
+        self.assertEqual(results[3][0], 'PAAD')
+        self.assertEqual(results[3][5], '0.000')
+        # pre-warm the cache; MAF annotations are only cached for genes in OncoKB
+        token_path = os.path.join(self.tmp_dir, 'token.txt')
+        with mock_oncokb_server() as server:
+            with open(token_path, 'w') as token_file:
+                token_file.write(server.TOKEN)
+            env = {
+                oncokb_client.URL_VARIABLE: server.url,
+                oncokb_cache_checker.ONCOKB_TOKEN_VARIABLE: token_path
+            }
+            with mock.patch.dict(os.environ, env):
+                results = checker.check([report_dir], prewarm=True)
+            self.assertEqual(len(server.requests), 3)
+        self.assertEqual([x[4] for x in results], [2, 2, 1, 5])
+        self.assertEqual(results[3][5], '0.833')
+        # OncoTree code given explicitly; cache for a different code is empty
+        results = checker.check([report_dir], oncotree_code='LUAD')
+        self.assertEqual(results[3][:5], ['LUAD', 'all', 'TOTAL', 6, 0])
+        out_path = os.path.join(self.tmp_dir, 'results.tsv')
+        with open(out_path, 'w') as out_file:
+            checker.write_results(results, out_file)
+        with open(out_path) as in_file:
+            rows = list(csv.reader(in_file, delimiter="\t"))
+        self.assertEqual(rows[0], oncokb_cache_checker.HEADER)
+        self.assertEqual(len(rows), 5)
+
+
+class TestOncokbClient(TestBase):
+
+    MAF_HEADER = ['Hugo_Symbol', 'Chromosome', 'Start_Position', 'End_Position',
+                  'Reference_Allele', 'Tumor_Seq_Allele1', 'Tumor_Seq_Allele2', 'NCBI_Build']
+    MAF_ROWS = [
+        ['KRAS', 'chr12', '25245350', '25245350', 'C', 'C', 'T', 'GRCh38'],
+        ['BRAF', 'chr7', '140753336', '140753336', 'A', 'A', 'T', 'GRCh38'],
+        ['ABC1', 'chr1', '1000', '1000', 'G', 'G', 'A', 'GRCh38'],
+        ['KRAS', 'chr12', '25245350', '25245350', 'C', 'C', 'T', 'GRCh38']
+    ]
+
+    def setUp(self):
+        super().setUp()
+        oncokb_cache_manager.clear_cache()
+
+    def tearDown(self):
+        oncokb_cache_manager.clear_cache()
+        super().tearDown()
+
+    def read_rows(self, path):
+        with open(path) as in_file:
+            rows = list(csv.DictReader(in_file, delimiter="\t"))
+        return rows
+
+    def write_maf(self, path):
+        with open(path, 'w') as out_file:
+            print("\t".join(self.MAF_HEADER), file=out_file)
+            for row in self.MAF_ROWS:
+                print("\t".join(row), file=out_file)
+
+    def test_client(self):
+        maf_path = os.path.join(self.tmp_dir, 'input.maf')
+        self.write_maf(maf_path)
+        out_path = os.path.join(self.tmp_dir, 'output.maf')
+        with mock_oncokb_server(fail_first=1) as server:
+            client = oncokb_client(server.TOKEN, server.url)
+            client.BACKOFF_FACTOR = 0.01
+            client.annotate_maf(maf_path, out_path, 'PAAD')
+            # one failed request, retried; 3 unique queries in one batch
+            expected_requests = [(oncokb_client.GENOMIC_CHANGE, 3)]*2
+            self.assertEqual(server.requests, expected_requests)
+            rows = self.read_rows(out_path)
+            self.assertEqual(len(rows), 4)
+            self.assertEqual(rows[0]['ONCOGENIC'], 'Oncogenic')
+            self.assertEqual(rows[0]['LEVEL_1'], 'KRAS inhibitor+Drug B')
+            self.assertEqual(rows[0]['HIGHEST_LEVEL'], 'LEVEL_1')
+            self.assertEqual(rows[0]['MUTATION_EFFECT_CITATIONS'], '10000001')
+            self.assertEqual(rows[2]['VARIANT_IN_ONCOKB'], 'False')
+            self.assertEqual(rows[3], rows[0])
+            # queries already made are not sent again
+            client.annotate_maf(maf_path, out_path, 'PAAD')
+            self.assertEqual(len(server.requests), 2)
+            # protein change, CNA and fusion annotation
+            biomarkers_path = os.path.join(self.tmp_dir, 'biomarkers.maf')
+            with open(biomarkers_path, 'w') as out_file:
+                print("HUGO_SYMBOL\tSAMPLE_ID\tALTERATION", file=out_file)
+                print("ERBB2\tTUMOUR\tAmplification", file=out_file)
+            client.annotate_maf(biomarkers_path, out_path, 'PAAD', genomic_change=False)
+            self.assertEqual(self.read_rows(out_path)[0]['ONCOGENIC'], 'Oncogenic')
+            cna_path = os.path.join(self.tmp_dir, 'cna.txt')
+            with open(cna_path, 'w') as out_file:
+                print("Hugo_Symbol\tTUMOUR", file=out_file)
+                for (gene, state) in [('ERBB2', 2), ('TP53', -2), ('BRCA2', 1)]:
+                    print("{0}\t{1}".format(gene, state), file=out_file)
+            client.annotate_cna(cna_path, out_path, 'TUMOUR', 'PAAD')
+            rows = self.read_rows(out_path)
+            self.assertEqual([x['ALTERATION'] for x in rows], ['Amplification', 'Deletion'])
+            self.assertEqual([x['ONCOGENIC'] for x in rows], ['Oncogenic', 'Unknown'])
+            fusion_path = os.path.join(self.tmp_dir, 'fusion.txt')
+            with open(fusion_path, 'w') as out_file:
+                print("Tumor_Sample_Barcode\tFusion", file=out_file)
+                print("TUMOUR\tNTRK1-TPM3", file=out_file)
+            client.annotate_fusion(fusion_path, out_path, 'PAAD')
+            self.assertEqual(self.read_rows(out_path)[0]['HIGHEST_LEVEL'], 'LEVEL_1')
+        # bad token
+        with mock_oncokb_server() as server:
+            client = oncokb_client('bad-token', server.url)
+            with self.assertRaises(DjerbaOncokbClientError):
+                client.annotate_maf(maf_path, out_path, 'PAAD')
+
+    def test_annotator(self):
+        token_path = os.path.join(self.tmp_dir, 'token.txt')
+        with open(token_path, 'w') as token_file:
+            token_file.write(mock_oncokb_server.TOKEN)
+        maf_path = os.path.join(self.tmp_dir, 'input.maf')
+        self.write_maf(maf_path)
+        cache_dir = os.path.join(self.tmp_dir, 'cache')
+        os.mkdir(cache_dir)
+        cache_params = oncokb_cache_params(cache_dir, update_cache=True)
+        env_keys = [oncokb_annotator.ONCOKB_TOKEN_VARIABLE, oncokb_client.URL_VARIABLE]
+        env_original = {key: os.environ.get(key) for key in env_keys}
+        try:
+            with mock_oncokb_server() as server:
+                os.environ[oncokb_annotator.ONCOKB_TOKEN_VARIABLE] = token_path
+                os.environ[oncokb_client.URL_VARIABLE] = server.url
+                annotator = oncokb_annotator(
+                    'TUMOUR', 'PAAD', self.tmp_dir, cache_params=cache_params, use_client=True
+                )
+                out_path = annotator.annotate_maf(maf_path)
+                self.assertEqual(self.read_rows(out_path)[1]['LEVEL_1'], 'BRAF inhibitor+Drug B')
+                # rows in memory are annotated as for a file, and written for reference
+                with open(out_path) as out_file:
+                    expected = list(csv.reader(out_file, delimiter="\t"))
+                os.remove(out_path)
+                [header, rows] = annotator.annotate_maf_rows(self.MAF_HEADER, self.MAF_ROWS)
+                self.assertEqual([header]+rows, expected)
+                self.assertEqual(self.read_rows(out_path)[1]['LEVEL_1'], 'BRAF inhibitor+Drug B')
+                self.assertEqual(len(self.MAF_ROWS[0]), len(self.MAF_HEADER))
+        finally:
+            for (key, value) in env_original.items():
+                if value == None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+        # annotations are written through to the cache; except ABC1, which is not in OncoKB
+        cache = oncokb_cache(cache_dir, 'PAAD')
+        self.assertEqual(cache.store.count(oncokb_cache_store.MAF), 2)
+
+class TestProvenanceStore(TestBase):
+
+    def write_provenance(self, path, donors):
+        # write a minimal FPR with one row per (study, donor, workflow)
+        width = index.LIMS_LAST_MODIFIED + 1
+        with gzip.open(path, 'wt') as out_file:
+            writer = csv.writer(out_file, delimiter="\t")
+            for (study, donor) in donors:
+                for workflow in ['mavis', 'purple']:
+                    row = ['']*width
+                    row[index.STUDY_TITLE] = study
+                    row[index.ROOT_SAMPLE_NAME] = donor
+                    row[index.WORKFLOW_NAME] = workflow
+                    row[index.FILE_PATH] = '/{0}/{1}/{2}.txt'.format(study, donor, workflow)
+                    writer.writerow(row)
+
+    def test(self):
+        fpr_path = os.path.join(self.tmp_dir, 'fpr.tsv.gz')
+        donors = [('PROJ1', 'DONOR_1'), ('PROJ1', 'DONOR_2'), ('PROJ2', 'DONOR_1')]
+        self.write_provenance(fpr_path, donors)
+        expected = read_donor_rows(fpr_path, 'PROJ1', 'DONOR_2')
+        self.assertEqual(len(expected), 2)
+        index_path = provenance_store.get_default_index_path(fpr_path)
+        store = provenance_store(index_path)
+        self.assertFalse(store.is_current(fpr_path))
+        self.assertEqual(store.build(fpr_path), 6)
+        self.assertTrue(store.is_current(fpr_path))
+        self.assertEqual(store.read_rows('PROJ1', 'DONOR_2'), expected)
+        self.assertEqual(read_donor_rows(fpr_path, 'PROJ1', 'DONOR_2'), expected)
+        self.assertEqual(store.read_rows('PROJ3', 'DONOR_1'), [])
+        # a modified FPR makes the store stale; lookups fall back to reading the FPR
+        self.write_provenance(fpr_path, donors[0:1])
+        self.assertFalse(store.is_current(fpr_path))
+        self.assertEqual(read_donor_rows(fpr_path, 'PROJ1', 'DONOR_2'), [])
+
+    def test_multiple_donors(self):
+        fpr_path = os.path.join(self.tmp_dir, 'fpr.tsv.gz')
+        donors = [('PROJ1', 'DONOR_1'), ('PROJ1', 'DONOR_2'), ('PROJ2', 'DONOR_1')]
+        self.write_provenance(fpr_path, donors)
+        rows = read_multiple_donor_rows(fpr_path, donors[1:])
+        self.assertEqual(sorted(rows.keys()), donors[1:])
+        for (study, donor) in donors[1:]:
+            self.assertEqual(rows[(study, donor)], read_donor_rows(fpr_path, study, donor))
+        targets = []
+        for (study, donor) in donors:
+            work_dir = os.path.join(self.tmp_dir, study+'_'+donor)
+            os.mkdir(work_dir)
+            targets.append((study, donor, work_dir))
+        self.assertEqual(write_provenance_subsets(fpr_path, targets), 3)
+        subset_name = provenance_helper.PROVENANCE_OUTPUT
+        for (study, donor, work_dir) in targets:
+            with gzip.open(os.path.join(work_dir, subset_name), 'rt') as subset_file:
+                subset = list(csv.reader(subset_file, delimiter="\t"))
+            self.assertEqual(subset, read_donor_rows(fpr_path, study, donor))
+        # existing subsets are not overwritten
+        self.assertEqual(write_provenance_subsets(fpr_path, targets), 0)
+
+class TestProvenanceReader(TestBase):
+
+    PROJECT = 'PROJ1'
+    DONOR = 'PROJ_0001'
+
+    def get_row(self, modified, sample, attributes, workflow, metatype, path):
+        row = ['']*(index.LIMS_LAST_MODIFIED + 1)
+        row[index.LAST_MODIFIED] = modified
+        row[index.STUDY_TITLE] = self.PROJECT
+        row[index.ROOT_SAMPLE_NAME] = self.DONOR
+        row[index.SAMPLE_NAME] = sample
+        row[index.PARENT_SAMPLE_ATTRIBUTES] = attributes
+        row[index.WORKFLOW_NAME] = workflow
+        row[index.FILE_META_TYPE] = metatype
+        row[index.FILE_PATH] = path
+        return row
+
+    def test_indexed_lookup(self):
+        normal = 'PROJ_0001_Ly_R_WG'
+        tumour = 'PROJ_0001_Pa_P_WG'
+        common = 'geo_external_name=EX01;geo_tissue_origin=Pa'
+        attrs_n = common+';geo_tissue_type=R;geo_library_source_template_type=WG;geo_group_id=N1'
+        attrs_t = common+';geo_tissue_type=P;geo_library_source_template_type=WG;geo_group_id=T1'
+        maf_mt = 'application/txt-gz'
+        bam_mt = 'application/bam'
+        vep = 'variantEffectPredictor_matched'
+        bmpp = 'bamMergePreprocessing_by_sample'
+        rows = [
+            self.get_row('2024-01-02', tumour, attrs_t, vep, maf_mt, '/old/t.mutect2.filtered.maf.gz'),
+            self.get_row('2024-03-01', tumour, attrs_t, vep, maf_mt, '/new/t.mutect2.filtered.maf.gz'),
+            self.get_row('2024-05-01', tumour, attrs_t, vep, maf_mt, '/newest/t.other.maf.gz'),
+            self.get_row('2024-02-01', tumour, attrs_t, vep, maf_mt, '/mid/t.mutect2.filtered.maf.gz'),
+            self.get_row('2024-02-01', normal, attrs_n, bmpp, bam_mt,
+                         '/n/n.filter.deduped.realigned.recalibrated.bam'),
+            self.get_row('2024-02-01', tumour, attrs_t, bmpp, bam_mt,
+                         '/t/t.filter.deduped.realigned.recalibrated.bam')
+        ]
+        fpr_path = os.path.join(self.tmp_dir, 'fpr.tsv.gz')
+        with gzip.open(fpr_path, 'wt') as out_file:
+            csv.writer(out_file, delimiter="\t").writerows(rows)
+        reader = provenance_reader(fpr_path, self.PROJECT, self.DONOR, 'WGTS',
+                                   sample_name_container())
+        self.assertEqual(reader.tumour_id, 'T1')
+        self.assertEqual(reader.normal_id, 'N1')
+        self.assertEqual(reader.parse_maf_path(), '/new/t.mutect2.filtered.maf.gz')
+        self.assertEqual(reader.parse_wg_bam_path(), '/t/t.filter.deduped.realigned.recalibrated.bam')
+        self.assertEqual(reader.parse_wg_bam_ref_path(), '/n/n.filter.deduped.realigned.recalibrated.bam')
+        self.assertIsNone(reader.parse_mavis_path())
+        # indexed lookup is consistent with filtering the full list of rows
+        iterrows = reader._filter_workflow(vep)
+        iterrows = reader._filter_metatype(reader.MT_TXT_GZ, iterrows)
+        iterrows = reader._filter_file_path('\\.mutect2\\.filtered\\.maf\\.gz$', iterrows)
+        expected = reader._get_most_recent_row(iterrows)[index.FILE_PATH]
+        self.assertEqual(reader.parse_maf_path(), expected)
+
+class TestReferenceData(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        reference_data.clear_cache()
+
+    def tearDown(self):
+        reference_data.clear_cache()
+        super().tearDown()
+
+    def write_cytobands(self, rows):
+        with open(os.path.join(self.tmp_dir, 'cytoBand.txt'), 'w') as out_file:
+            out_file.write("Hugo_Symbol\tChromosome\n")
+            for row in rows:
+                out_file.write("\t".join(row)+"\n")
+
+    def test_cytobands(self):
+        self.write_cytobands([['BRAF', '7q34'], ['KRAS', '12p12.1']])
+        with mock.patch.dict(os.environ):
+            os.environ.pop(directory_finder.DJERBA_REFERENCE_CACHE_DIR_VAR, None)
+            ref_data = reference_data()
+            cytobands = ref_data.get_cytobands(self.tmp_dir)
+            self.assertEqual(cytobands, {'BRAF': '7q34', 'KRAS': '12p12.1'})
+            # a second instance uses the parsed data
+            self.assertIs(reference_data().get_cytobands(self.tmp_dir), cytobands)
+            stats = reference_data.get_cache_stats()
+            self.assertEqual(stats, {'hits': 1, 'misses': 1, 'pickle_hits': 0, 'resources': 1})
+            # if the file changes, it is parsed again
+            self.write_cytobands([['BRAF', '7q34'], ['KRAS', '12p12.1'], ['MYC', '8q24.21']])
+            self.assertEqual(ref_data.get_cytobands(self.tmp_dir).get('MYC'), '8q24.21')
+            self.assertEqual(reference_data.get_cache_stats()['misses'], 2)
+            with self.assertRaises(DjerbaReferenceDataError):
+                ref_data.get_cytobands(os.path.join(self.tmp_dir, 'missing'))
+
+    def test_oncotree_index(self):
+        tree = {
+            'TISSUE': {'code': 'TISSUE', 'mainType': None, 'children': {
+                'OVARY': {'code': 'OVARY', 'mainType': 'Ovarian Cancer', 'children': {
+                    'HGSOC': {'code': 'HGSOC', 'mainType': 'Ovarian Cancer', 'children': {}}
+                }},
+                'PANCREAS': {'code': 'PANCREAS', 'mainType': None, 'children': {
+                    'PAAD': {'code': 'PAAD', 'mainType': 'Pancreatic Cancer', 'children': {}}
+                }}
+            }}
+        }
+        tree_path = os.path.join(self.tmp_dir, 'OncoTree.json')
+        with open(tree_path, 'w') as out_file:
+            json.dump(tree, out_file)
+        tree_index = reference_data().get_oncotree_index(tree_path)
+        self.assertEqual(tree_index['HGSOC']['mainType'], 'Ovarian Cancer')
+        self.assertEqual(tree_index['PAAD']['mainType'], 'Pancreatic Cancer')
+        self.assertNotIn('LUAD', tree_index)
+
+    def test_pickle_cache(self):
+        self.write_cytobands([['BRAF', '7q34']])
+        cache_dir = os.path.join(self.tmp_dir, 'reference_cache')
+        os.mkdir(cache_dir)
+        with mock.patch.dict(os.environ, {directory_finder.DJERBA_REFERENCE_CACHE_DIR_VAR: cache_dir}):
+            summaries = reference_data().get_gene_summaries()
+            self.assertTrue(summaries['BRAF'].startswith('BRAF'))
+            self.assertEqual(reference_data().get_cytobands(self.tmp_dir), {'BRAF': '7q34'})
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            # a new process would load from the pickle files
+            reference_data.clear_cache()
+            self.assertEqual(reference_data().get_gene_summaries(), summaries)
+            self.assertEqual(reference_data().get_cytobands(self.tmp_dir), {'BRAF': '7q34'})
+            self.assertEqual(reference_data.get_cache_stats()['pickle_hits'], 2)
+            # an unreadable pickle file is ignored
+            for name in os.listdir(cache_dir):
+                with open(os.path.join(cache_dir, name), 'w') as out_file:
+                    out_file.write('not a pickle')
+            reference_data.clear_cache()
+            self.assertEqual(reference_data().get_cytobands(self.tmp_dir), {'BRAF': '7q34'})
+            self.assertEqual(reference_data.get_cache_stats()['pickle_hits'], 0)
+
+class TestSequenzaReader(TestBase):
+
+    GAMMAS = [50, 100, 200, 400, 800]
+    ALTERNATIVE_SOLUTIONS = "cellularity\tploidy\tSLPP\n0.8\t2.1\t-10\n0.49\t3.0\t-12\n"
+
+    def write_archive(self, zip_path):
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            for (i, gamma) in enumerate(self.GAMMAS):
+                gamma_dir = 'gammas/{0}'.format(gamma)
+                segments = 900 // (i+1)
+                zf.writestr(gamma_dir+'/', '')
+                zf.writestr(gamma_dir+'/s_alternative_solutions.txt', self.ALTERNATIVE_SOLUTIONS)
+                zf.writestr(gamma_dir+'/s_segments.txt', 'header\n'+'segment\n'*segments)
+                zf.writestr(gamma_dir+'/s_Total_CN.seg', 'header\n')
+                zf.writestr(gamma_dir+'/sol2_0.49/s_segments.txt', 'header\n'+'segment\n'*3)
+
+    def test(self):
+        zip_path = os.path.join(self.tmp_dir, 'sequenza.zip')
+        self.write_archive(zip_path)
+        zip_archive.clear_cache()
+        reader = sequenza_reader(zip_path)
+        self.assertEqual(reader.get_segment_counts()[(100, '_primary_')], 450)
+        self.assertEqual(reader.get_segment_counts()[(100, 'sol2_0.49')], 3)
+        self.assertEqual(reader.get_default_sol_id(), (400, '_primary_'))
+        self.assertEqual(reader.get_purity(), 0.8)
+        self.assertEqual(reader.get_ploidy(400, 'sol2_0.49'), 3.0)
+        # members are read as streams; only requested files are extracted
+        out_dir = os.path.join(self.tmp_dir, 'out')
+        os.mkdir(out_dir)
+        seg_path = reader.extract_cn_seg_file(out_dir, 400)
+        self.assertEqual(seg_path, os.path.join(out_dir, 'gammas/400/s_Total_CN.seg'))
+        self.assertEqual(os.listdir(out_dir), ['gammas'])
+        self.assertEqual(os.listdir(os.path.join(out_dir, 'gammas')), ['400'])
+        # central directory was read once, for the reader and the extraction
+        self.assertEqual(zip_archive.get_cache_stats(), {'hits': 0, 'misses': 1, 'archives': 1})
+
+class TestZipArchive(TestBase):
+
+    def test(self):
+        zip_path = os.path.join(self.tmp_dir, 'archive.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            zf.writestr('results/', '')
+            zf.writestr('results/sample.purple.purity.tsv', "purity\tploidy\n0.62\t3.1\n")
+            zf.writestr('results/sample.purple.purity.range.tsv', "purity\n0.62\n")
+        zip_archive.clear_cache()
+        archive = zip_archive(zip_path)
+        self.assertEqual(len(archive.get_names()), 2)
+        name = archive.find_name(r'purple\.purity\.tsv$')
+        self.assertEqual(name, 'results/sample.purple.purity.tsv')
+        self.assertIsNone(archive.find_name(r'purple\.segment\.tsv$'))
+        with archive.open_text(name) as in_file:
+            rows = list(csv.DictReader(in_file, delimiter="\t"))
+        self.assertEqual(rows, [{'purity': '0.62', 'ploidy': '3.1'}])
+        # a second instance uses the cached central directory
+        self.assertEqual(zip_archive(zip_path).get_names(), archive.get_names())
+        self.assertEqual(zip_archive.get_cache_stats(), {'hits': 1, 'misses': 1, 'archives': 1})
+        # if the archive changes, it is read again
+        with zipfile.ZipFile(zip_path, 'a') as zf:
+            zf.writestr('results/sample.purple.segment.tsv', "chromosome\n")
+        self.assertEqual(len(zip_archive(zip_path).get_names()), 3)
+        self.assertEqual(zip_archive.get_cache_stats()['misses'], 2)
+        with self.assertRaises(DjerbaArchiveError):
+            zip_archive(os.path.join(self.tmp_dir, 'missing.zip'))
+        zip_archive.clear_cache()
+
+    def test_limit(self):
+        zip_archive.clear_cache()
+        archives = []
+        for i in range(zip_archive.MAX_ARCHIVES+1):
+            zip_path = os.path.join(self.tmp_dir, 'archive_{0}.zip'.format(i))
+            with zipfile.ZipFile(zip_path, 'w') as zf:
+                zf.writestr('member.txt', "archive {0}\n".format(i))
+            archives.append(zip_archive(zip_path))
+            if i == 1:
+                # first archive is used again, so the second is least recently used
+                zip_archive(archives[0].zip_path)
+        self.assertEqual(zip_archive.get_cache_stats()['archives'], zip_archive.MAX_ARCHIVES)
+        self.assertIsNotNone(archives[0].zf.fp)
+        self.assertIsNone(archives[1].zf.fp)
+        # an instance with a closed archive reopens it
+        with archives[1].open_text('member.txt') as in_file:
+            self.assertEqual(in_file.read(), "archive 1\n")
+        self.assertIsNone(archives[0].zf.fp)
+        self.assertIsNotNone(archives[2].zf.fp)
+        self.assertEqual(zip_archive.get_cache_stats()['archives'], zip_archive.MAX_ARCHIVES)
+        zip_archive.clear_cache()
+
 if __name__ == '__main__':
     unittest.main()
 